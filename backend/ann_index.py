@@ -0,0 +1,210 @@
+"""
+Approximate Nearest Neighbour Index - IVF (inverted file) search
+Partitions unit-length job embeddings into cells around k-means centroids so
+a query only scores the vectors in its closest few cells
+"""
+
+import os
+import logging
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Below this many vectors brute force is both exact and fast enough
+ANN_MIN_VECTORS = int(os.getenv("ANN_MIN_VECTORS", "5000"))
+# Number of cells scanned per query; higher means better recall, more latency
+ANN_NPROBE = int(os.getenv("ANN_NPROBE", "16"))
+# Where the trained quantizer (centroids) is persisted between restarts
+ANN_INDEX_PATH = os.getenv("ANN_INDEX_PATH", "ann_index.npz")
+
+_TRAINING_SAMPLE_PER_CELL = 64
+_TRAINING_ITERATIONS = 10
+
+
+def default_cell_count(n_vectors: int) -> int:
+    """Rule of thumb: about sqrt(N) cells, clamped to a sane range."""
+    return int(min(1024, max(8, np.sqrt(n_vectors))))
+
+
+class _Cell:
+    """Growable contiguous block of vectors belonging to one centroid."""
+
+    def __init__(self, dimension: int):
+        self.ids = np.empty(0, dtype=np.int64)
+        self.vectors = np.empty((0, dimension), dtype=np.float32)
+        self.deadlines = np.empty(0, dtype=np.float64)
+        self.size = 0
+
+    def append(self, item_id: int, vector: np.ndarray, deadline: float) -> int:
+        if self.size == self.ids.shape[0]:
+            capacity = max(16, 2 * self.size)
+            ids = np.empty(capacity, dtype=np.int64)
+            vectors = np.empty((capacity, self.vectors.shape[1]), dtype=np.float32)
+            deadlines = np.empty(capacity, dtype=np.float64)
+            ids[:self.size] = self.ids[:self.size]
+            vectors[:self.size] = self.vectors[:self.size]
+            deadlines[:self.size] = self.deadlines[:self.size]
+            self.ids, self.vectors, self.deadlines = ids, vectors, deadlines
+        row = self.size
+        self.ids[row] = item_id
+        self.vectors[row] = vector
+        self.deadlines[row] = deadline
+        self.size += 1
+        return row
+
+    def pop(self, row: int) -> Optional[int]:
+        """Remove a row by swapping the last row in. Returns the moved id."""
+        last = self.size - 1
+        moved = None
+        if row != last:
+            moved = int(self.ids[last])
+            self.ids[row] = self.ids[last]
+            self.vectors[row] = self.vectors[last]
+            self.deadlines[row] = self.deadlines[last]
+        self.size = last
+        return moved
+
+
+class IVFIndex:
+    """
+    Inverted-file index over unit-length vectors using inner product.
+
+    Centroids come from spherical k-means. Each vector lives in the cell of
+    its nearest centroid; search scores the ``nprobe`` nearest cells only.
+    Adds and removals are incremental; only training is a batch step.
+    """
+
+    def __init__(self, dimension: int, centroids: Optional[np.ndarray] = None):
+        self.dimension = dimension
+        self.centroids = centroids
+        self.trained_size = 0
+        self._cells: List[_Cell] = []
+        self._locations: Dict[int, Tuple[int, int]] = {}
+        if centroids is not None:
+            self._cells = [_Cell(dimension) for _ in range(centroids.shape[0])]
+
+    def __len__(self) -> int:
+        return len(self._locations)
+
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids is not None
+
+    def train(self, vectors: np.ndarray, n_cells: Optional[int] = None, seed: int = 0):
+        """Fit centroids with spherical k-means on (a sample of) ``vectors``."""
+        n_cells = min(n_cells or default_cell_count(len(vectors)), len(vectors))
+        rng = np.random.default_rng(seed)
+
+        sample_size = min(len(vectors), n_cells * _TRAINING_SAMPLE_PER_CELL)
+        sample = vectors[rng.choice(len(vectors), sample_size, replace=False)]
+        centroids = sample[rng.choice(sample_size, n_cells, replace=False)].copy()
+
+        for _ in range(_TRAINING_ITERATIONS):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, sample)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            empty = norms[:, 0] == 0
+            # Re-seed empty cells from random sample points
+            if empty.any():
+                sums[empty] = sample[rng.choice(sample_size, int(empty.sum()), replace=False)]
+                norms[empty] = 1.0
+            centroids = (sums / norms).astype(np.float32)
+
+        self.centroids = centroids
+        self.trained_size = len(vectors)
+        self._cells = [_Cell(self.dimension) for _ in range(n_cells)]
+        self._locations = {}
+
+    def assign(self, vectors: np.ndarray) -> np.ndarray:
+        """Nearest centroid for each row of ``vectors``."""
+        return np.argmax(vectors @ self.centroids.T, axis=1)
+
+    def add_batch(self, ids: np.ndarray, vectors: np.ndarray, deadlines: np.ndarray):
+        for item_id, cell, vector, deadline in zip(ids.tolist(), self.assign(vectors).tolist(), vectors, deadlines.tolist()):
+            self._insert(item_id, int(cell), vector, deadline)
+
+    def add(self, item_id: int, vector: np.ndarray, deadline: float = np.inf):
+        """Insert or replace one vector."""
+        self.remove(item_id)
+        cell = int(np.argmax(self.centroids @ vector))
+        self._insert(item_id, cell, vector, deadline)
+
+    def _insert(self, item_id: int, cell: int, vector: np.ndarray, deadline: float):
+        row = self._cells[cell].append(item_id, vector, deadline)
+        self._locations[item_id] = (cell, row)
+
+    def remove(self, item_id: int) -> bool:
+        location = self._locations.pop(item_id, None)
+        if location is None:
+            return False
+        cell, row = location
+        moved = self._cells[cell].pop(row)
+        if moved is not None:
+            self._locations[moved] = (cell, row)
+        return True
+
+    def search(
+        self,
+        query: np.ndarray,
+        k: int,
+        nprobe: int = ANN_NPROBE,
+        min_score: float = 0.0,
+        now_ts: Optional[float] = None
+    ) -> List[Tuple[int, float]]:
+        """
+        Approximate top-k by inner product.
+
+        Returns:
+            List of (id, score) sorted by score (descending)
+        """
+        if not self.is_trained or not self._locations or k <= 0:
+            return []
+
+        nprobe = min(nprobe, len(self._cells))
+        probe = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+        cells = [self._cells[c] for c in probe if self._cells[c].size]
+        if not cells:
+            return []
+
+        ids = np.concatenate([c.ids[:c.size] for c in cells])
+        scores = np.concatenate([c.vectors[:c.size] @ query for c in cells])
+        np.clip(scores, 0.0, 1.0, out=scores)
+        keep = scores >= min_score
+        if now_ts is not None:
+            keep &= np.concatenate([c.deadlines[:c.size] for c in cells]) > now_ts
+
+        candidates = np.flatnonzero(keep)
+        if candidates.size > k:
+            candidates = candidates[np.argpartition(scores[candidates], -k)[-k:]]
+        order = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return [(int(ids[i]), float(scores[i])) for i in order]
+
+    def save(self, path: str = ANN_INDEX_PATH):
+        """Persist the trained quantizer; cell contents are rebuilt from the database."""
+        if not self.is_trained:
+            return
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(tmp_path, centroids=self.centroids, trained_size=self.trained_size)
+        os.replace(tmp_path, path)
+        logger.info(f"Saved ANN quantizer ({self.centroids.shape[0]} cells) to {path}")
+
+    @classmethod
+    def load(cls, dimension: int, path: str = ANN_INDEX_PATH) -> Optional["IVFIndex"]:
+        """Load a persisted quantizer, or None if missing or incompatible."""
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path) as data:
+                centroids = data["centroids"].astype(np.float32)
+                trained_size = int(data["trained_size"])
+        except Exception as e:
+            logger.warning(f"Could not load ANN quantizer from {path}: {e}")
+            return None
+        if centroids.ndim != 2 or centroids.shape[1] != dimension:
+            return None
+        index = cls(dimension, centroids)
+        index.trained_size = trained_size
+        return index
@@ -0,0 +1,69 @@
+"""
+Benchmark the IVF semantic search index against exact brute force
+Reports recall@k and per-query latency for a range of nprobe values
+
+Usage:
+    python benchmark_ann_index.py [--jobs 50000] [--dim 384] [--queries 200] [--k 10]
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from ann_index import IVFIndex
+
+
+def make_clustered_embeddings(n: int, dim: int, n_topics: int, rng) -> np.ndarray:
+    """Unit vectors scattered around random topic centres, like real job text."""
+    topics = rng.normal(size=(n_topics, dim)).astype(np.float32)
+    vectors = topics[rng.integers(0, n_topics, n)] + 0.6 * rng.normal(size=(n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def brute_force(matrix: np.ndarray, query: np.ndarray, k: int):
+    scores = matrix @ query
+    top = np.argpartition(scores, -k)[-k:]
+    return top[np.argsort(-scores[top])]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--jobs", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    print(f"🧪 Generating {args.jobs} job embeddings (dim={args.dim})...")
+    matrix = make_clustered_embeddings(args.jobs, args.dim, max(16, args.jobs // 250), rng)
+    queries = make_clustered_embeddings(args.queries, args.dim, max(16, args.jobs // 250), rng)
+    ids = np.arange(args.jobs, dtype=np.int64)
+
+    start = time.perf_counter()
+    truth = [brute_force(matrix, q, args.k) for q in queries]
+    brute_ms = (time.perf_counter() - start) * 1000 / args.queries
+    print(f"📏 Brute force: {brute_ms:.3f} ms/query")
+
+    index = IVFIndex(args.dim)
+    start = time.perf_counter()
+    index.train(matrix)
+    index.add_batch(ids, matrix, np.full(args.jobs, np.inf))
+    print(f"🏗️  IVF build: {time.perf_counter() - start:.2f}s, {len(index.centroids)} cells\n")
+
+    print(f"{'nprobe':>7} {'recall@' + str(args.k):>10} {'ms/query':>10} {'speedup':>8}")
+    for nprobe in (1, 2, 4, 8, 16, 32, 64):
+        if nprobe > len(index.centroids):
+            break
+        start = time.perf_counter()
+        results = [index.search(q, args.k, nprobe=nprobe) for q in queries]
+        ann_ms = (time.perf_counter() - start) * 1000 / args.queries
+
+        hits = sum(len(set(t.tolist()) & {job_id for job_id, _ in r}) for t, r in zip(truth, results))
+        recall = hits / (args.k * args.queries)
+        print(f"{nprobe:>7} {recall:>10.3f} {ann_ms:>10.3f} {brute_ms / ann_ms:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
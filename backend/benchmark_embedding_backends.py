@@ -0,0 +1,96 @@
+"""
+Benchmark embedding backends: PyTorch vs ONNX fp32 vs ONNX int8
+Each backend runs in its own process so load time and peak resident memory
+are measured in isolation
+
+Usage:
+    python benchmark_embedding_backends.py [--texts 512] [--batch-size 32] [--single 100]
+"""
+
+import sys
+import json
+import time
+import argparse
+import resource
+import subprocess
+
+MODEL_NAME = "all-MiniLM-L6-v2"
+BACKENDS = ["torch", "onnx-fp32", "onnx-int8"]
+
+
+def make_texts(n):
+    skills = ["Python", "React", "SQL", "Figma", "AWS", "Accounting", "SEO", "Docker", "Swift", "Excel"]
+    return [
+        f"Job Title: {skills[i % 10]} specialist | Skills Required: {skills[i % 10]}, {skills[(i * 3) % 10]} | "
+        f"Description: Role number {i} working with {skills[(i * 7) % 10]} on client projects"
+        for i in range(n)
+    ]
+
+
+def load_backend(backend):
+    if backend == "torch":
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(MODEL_NAME, device="cpu")
+    from onnx_encoder import OnnxSentenceEncoder, model_export_dir, FP32_FILE, INT8_FILE
+    return OnnxSentenceEncoder(model_export_dir(MODEL_NAME), model_file=INT8_FILE if backend == "onnx-int8" else FP32_FILE)
+
+
+def run_worker(backend, n_texts, batch_size, n_single):
+    """Measure one backend and print a JSON line of results."""
+    start = time.perf_counter()
+    model = load_backend(backend)
+    load_s = time.perf_counter() - start
+
+    texts = make_texts(n_texts)
+    model.encode(texts[:batch_size], batch_size=batch_size, normalize_embeddings=True)  # warm-up
+
+    latencies = []
+    for text in texts[:n_single]:
+        start = time.perf_counter()
+        model.encode(text, batch_size=1, normalize_embeddings=True)
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+
+    start = time.perf_counter()
+    model.encode(texts, batch_size=batch_size, normalize_embeddings=True)
+    throughput = n_texts / (time.perf_counter() - start)
+
+    print(json.dumps({
+        "backend": backend,
+        "load_s": round(load_s, 2),
+        "p50_ms": round(latencies[len(latencies) // 2], 2),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1], 2),
+        "texts_per_s": round(throughput, 1),
+        # ru_maxrss is reported in KB on Linux
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--texts", type=int, default=512, help="Texts for the throughput run")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--single", type=int, default=100, help="Single-text encodes for latency")
+    parser.add_argument("--worker", choices=BACKENDS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker, args.texts, args.batch_size, args.single)
+        return
+
+    print(f"{'backend':<10} {'load s':>7} {'p50 ms':>7} {'p95 ms':>7} {'texts/s':>8} {'peak RSS MB':>12}")
+    for backend in BACKENDS:
+        result = subprocess.run(
+            [sys.executable, __file__, "--worker", backend, "--texts", str(args.texts),
+             "--batch-size", str(args.batch_size), "--single", str(args.single)],
+            capture_output=True, text=True
+        )
+        if result.returncode != 0:
+            print(f"{backend:<10} ❌ failed: {result.stderr.strip().splitlines()[-1] if result.stderr else 'unknown error'}")
+            continue
+        r = json.loads(result.stdout.strip().splitlines()[-1])
+        print(f"{backend:<10} {r['load_s']:>7} {r['p50_ms']:>7} {r['p95_ms']:>7} {r['texts_per_s']:>8} {r['peak_rss_mb']:>12}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Benchmark pooled SMTP sessions against one connection per email
+Runs a local aiosmtpd server (pip install aiosmtpd) that adds a fixed delay
+to every SMTP command to stand in for the round trip to a real provider, then
+reports per-message latency for each sending strategy. Also checks that the
+pool recovers when the server drops its sessions.
+
+Usage:
+    python benchmark_smtp_pool.py [--messages 50] [--latency-ms 20] [--port 8025]
+"""
+
+import argparse
+import asyncio
+import smtplib
+import time
+from email.mime.text import MIMEText
+
+from services.smtp_pool import SMTPConnectionPool
+
+try:
+    from aiosmtpd.controller import Controller
+except ImportError:
+    raise SystemExit("aiosmtpd is required: pip install aiosmtpd")
+
+SENDER = "noreply@prolinq.test"
+
+
+class SlowSink:
+    """aiosmtpd handler that accepts everything after a simulated round trip."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.received = 0
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        await asyncio.sleep(self.latency)
+        session.host_name = hostname
+        return responses
+
+    async def handle_NOOP(self, server, session, envelope, arg):
+        await asyncio.sleep(self.latency)
+        return "250 OK"
+
+    async def handle_MAIL(self, server, session, envelope, address, mail_options):
+        await asyncio.sleep(self.latency)
+        envelope.mail_from = address
+        return "250 OK"
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        await asyncio.sleep(self.latency)
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        await asyncio.sleep(self.latency)
+        self.received += 1
+        return "250 Message accepted for delivery"
+
+
+def make_messages(n: int):
+    messages = []
+    for i in range(n):
+        to = f"user{i}@prolinq.test"
+        msg = MIMEText(f"Benchmark message {i}", "plain", _charset="utf-8")
+        msg["Subject"] = f"Benchmark {i}"
+        msg["From"] = SENDER
+        msg["To"] = to
+        messages.append((SENDER, to, msg.as_string()))
+    return messages
+
+
+def send_fresh_connections(host: str, port: int, messages):
+    """The old SMTPService behaviour: connect, EHLO, send and QUIT per email."""
+    for from_addr, to, message in messages:
+        server = smtplib.SMTP(host, port)
+        server.ehlo()
+        server.sendmail(from_addr, to, message)
+        server.quit()
+
+
+def report(name: str, elapsed: float, count: int, baseline: float = None):
+    per_message = elapsed * 1000 / count
+    speedup = f"{baseline / per_message:>7.1f}x" if baseline else f"{'':>8}"
+    print(f"{name:<28} {per_message:>10.2f} {speedup}")
+    return per_message
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=50)
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="Delay added to every SMTP command")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8025)
+    args = parser.parse_args()
+
+    sink = SlowSink(args.latency_ms / 1000)
+    controller = Controller(sink, hostname=args.host, port=args.port)
+    controller.start()
+    messages = make_messages(args.messages)
+    print(f"📬 aiosmtpd on {args.host}:{args.port}, {args.latency_ms:.0f} ms per command, {args.messages} messages\n")
+    print(f"{'strategy':<28} {'ms/message':>10} {'speedup':>8}")
+
+    try:
+        start = time.perf_counter()
+        send_fresh_connections(args.host, args.port, messages)
+        baseline = report("connection per email", time.perf_counter() - start, args.messages)
+
+        pool = SMTPConnectionPool(args.host, args.port, starttls=False, size=2)
+        start = time.perf_counter()
+        for from_addr, to, message in messages:
+            pool.send(from_addr, to, message)
+        report("pool.send (one at a time)", time.perf_counter() - start, args.messages, baseline)
+
+        start = time.perf_counter()
+        errors = pool.send_many(messages)
+        report("pool.send_many (batch)", time.perf_counter() - start, args.messages, baseline)
+        assert not any(errors), errors
+
+        expected = args.messages * 3
+        print(f"\n✅ Server received {sink.received}/{expected} messages; pool stats: {pool.stats}")
+        assert sink.received == expected
+
+        # Drop every session server-side; the next send has to reconnect by itself
+        controller.stop()
+        controller = Controller(sink, hostname=args.host, port=args.port)
+        controller.start()
+        pool.send(*messages[0])
+        errors = pool.send_many(messages[:5])
+        assert not any(errors), errors
+        print(f"🔁 Recovered after server restart; pool stats: {pool.stats}")
+        pool.close_all()
+    finally:
+        controller.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+"""
+Campaign Engine - admin broadcast messages written in the background
+Recipients are read in keyset-paged chunks of (id, name, username, email),
+templates are compiled once, and each chunk's AdminMessage and notification
+rows go in with one multi-row INSERT each and a single commit, together with
+the campaign's progress counters in bulk_campaigns
+"""
+
+import os
+import re
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Mapping, Optional
+
+from sqlalchemy import insert, func, case
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from models import User, AdminMessage, BulkCampaign
+
+logger = logging.getLogger(__name__)
+
+CAMPAIGN_CHUNK_SIZE = int(os.getenv("CAMPAIGN_CHUNK_SIZE", "1000"))
+
+# Placeholder -> (user field, value when the field is empty)
+PLACEHOLDERS = {
+    "full_name": ("full_name", "User"),
+    "username": ("username", ""),
+    "email": ("email", ""),
+}
+_PLACEHOLDER_RE = re.compile(r"\{\{(" + "|".join(PLACEHOLDERS) + r")\}\}")
+
+
+def compile_template(template: str) -> Callable[[Mapping[str, Any]], str]:
+    """
+    Split a template into literal and placeholder parts once, so rendering
+    a recipient is a single join instead of one replace per placeholder.
+    Unknown {{placeholders}} are left as they are.
+    """
+    parts: List[Any] = []
+    position = 0
+    for match in _PLACEHOLDER_RE.finditer(template):
+        parts.append(template[position:match.start()])
+        parts.append(PLACEHOLDERS[match.group(1)])
+        position = match.end()
+    parts.append(template[position:])
+
+    if len(parts) == 1:
+        return lambda recipient: template
+
+    def render(recipient: Mapping[str, Any]) -> str:
+        return "".join(
+            part if isinstance(part, str) else (str(recipient[part[0]]) if recipient[part[0]] else part[1])
+            for part in parts
+        )
+    return render
+
+
+def recipient_filter(query, admin_id: int, include_all: bool = False, recipient_ids: Optional[List[int]] = None,
+                     filter_role: Optional[str] = None, filter_verified: Optional[bool] = None):
+    """Apply the bulk request's audience selection to a User query."""
+    if include_all:
+        # Send to all users except the admin
+        return query.filter(User.id != admin_id)
+    if recipient_ids:
+        return query.filter(User.id.in_(recipient_ids))
+    if filter_role:
+        query = query.filter(User.primary_role == filter_role)
+    if filter_verified is not None:
+        query = query.filter(User.is_verified == filter_verified)
+    return query
+
+
+def register_campaign(db: Session, campaign_id: str, admin_id: int, campaign_name: str, total: int) -> BulkCampaign:
+    """Record a queued campaign so any worker can report its progress."""
+    campaign = BulkCampaign(
+        id=campaign_id,
+        admin_id=admin_id,
+        name=campaign_name,
+        status="queued",
+        total=total,
+        processed=0,
+        failed=0
+    )
+    db.add(campaign)
+    db.commit()
+    return campaign
+
+
+def _update_progress(db: Session, campaign_id: str, commit: bool = True, **values):
+    db.query(BulkCampaign).filter(BulkCampaign.id == campaign_id).update(values, synchronize_session=False)
+    if commit:
+        db.commit()
+
+
+def campaign_stats(db: Session, campaign_id: str, admin_id: int) -> Optional[Dict[str, Any]]:
+    """
+    Delivery and read counts for a campaign from one aggregate query, merged
+    with its progress row. Only the admin who started it can see it.
+    """
+    total_sent, read_count = db.query(
+        func.count(AdminMessage.id),
+        func.coalesce(func.sum(case((AdminMessage.is_read == True, 1), else_=0)), 0)
+    ).filter(
+        AdminMessage.bulk_campaign_id == campaign_id,
+        AdminMessage.admin_id == admin_id
+    ).one()
+    progress = db.query(BulkCampaign).filter(
+        BulkCampaign.id == campaign_id,
+        BulkCampaign.admin_id == admin_id
+    ).first()
+    if not total_sent and not progress:
+        return None
+
+    stats = {
+        "campaign_id": campaign_id,
+        "total_sent": total_sent,
+        "read_count": read_count,
+        "unread_count": total_sent - read_count,
+        "read_percentage": (read_count / total_sent * 100) if total_sent else 0
+    }
+    if progress:
+        stats["status"] = progress.status
+        stats["progress"] = {
+            "total": progress.total,
+            "processed": progress.processed,
+            "failed": progress.failed,
+            "percentage": (progress.processed / progress.total * 100) if progress.total else 100.0,
+            "started_at": progress.started_at.isoformat() if progress.started_at else None,
+            "finished_at": progress.finished_at.isoformat() if progress.finished_at else None
+        }
+        if progress.error:
+            stats["error"] = progress.error
+    return stats
+
+
+def _log_emit_error(future):
+    if not future.cancelled() and future.exception() is not None:
+        logger.error(f"Campaign notification broadcast failed: {future.exception()}")
+
+
+def run_campaign(
+    campaign_id: str,
+    admin_id: int,
+    content: str,
+    campaign_name: str,
+    include_all: bool = False,
+    recipient_ids: Optional[List[int]] = None,
+    filter_role: Optional[str] = None,
+    filter_verified: Optional[bool] = None,
+    chunk_size: int = CAMPAIGN_CHUNK_SIZE,
+    loop: Optional[asyncio.AbstractEventLoop] = None
+):
+    """
+    Write a broadcast campaign chunk by chunk. Runs as a FastAPI background
+    task in the threadpool with its own session.
+
+    Args:
+        loop: Event loop to emit Socket.IO notifications on; None skips emitting
+    """
+    from routes.notification_helpers import create_notifications_bulk, notification_payload, emit_notifications
+
+    render = compile_template(content)
+    db = SessionLocal()
+    try:
+        _update_progress(db, campaign_id, status="running", started_at=datetime.utcnow())
+        query = recipient_filter(
+            db.query(User.id, User.full_name, User.username, User.email),
+            admin_id, include_all, recipient_ids, filter_role, filter_verified
+        )
+        processed = failed = 0
+        last_id = 0
+        while True:
+            recipients = query.filter(User.id > last_id).order_by(User.id).limit(chunk_size).all()
+            if not recipients:
+                break
+            last_id = recipients[-1].id
+            now = datetime.utcnow()
+
+            rows = [
+                {
+                    "admin_id": admin_id,
+                    "receiver_id": recipient.id,
+                    "content": render(recipient._mapping),
+                    "is_bulk": True,
+                    "bulk_campaign_id": campaign_id,
+                    "bulk_campaign_name": campaign_name,
+                    "is_read": False,
+                    "is_deleted_by_user": False,
+                    "created_at": now
+                }
+                for recipient in recipients
+            ]
+            try:
+                message_ids = db.execute(
+                    insert(AdminMessage).returning(AdminMessage.id, sort_by_parameter_order=True), rows
+                ).scalars().all()
+                notifications = [
+                    {
+                        "user_id": row["receiver_id"],
+                        "title": "New Admin Message",
+                        "message": f"You have a new message from admin: {row['content'][:100]}...",
+                        "type": "admin_message",
+                        "data": {"admin_message_id": message_id, "admin_id": admin_id, "bulk_campaign_id": campaign_id},
+                        "created_at": now,
+                        "updated_at": now
+                    }
+                    for message_id, row in zip(message_ids, rows)
+                ]
+                notification_ids = create_notifications_bulk(db, notifications, return_ids=True, commit=False)
+                # Counters commit with the chunk they count
+                _update_progress(db, campaign_id, commit=False, processed=processed + len(rows))
+                db.commit()
+                processed += len(rows)
+            except Exception as e:
+                db.rollback()
+                failed += len(rows)
+                logger.error(f"Campaign {campaign_id}: chunk after user {recipients[0].id} failed: {e}")
+                _update_progress(db, campaign_id, failed=failed)
+                continue
+
+            if loop is not None:
+                payloads = [notification_payload(i, row) for i, row in zip(notification_ids, notifications)]
+                asyncio.run_coroutine_threadsafe(emit_notifications(payloads), loop).add_done_callback(_log_emit_error)
+
+        _update_progress(db, campaign_id, status="completed", finished_at=datetime.utcnow())
+        logger.info(f"Campaign {campaign_id} ({campaign_name}): {processed} sent, {failed} failed")
+    except Exception as e:
+        logger.error(f"Campaign {campaign_id} failed: {e}")
+        db.rollback()
+        try:
+            _update_progress(db, campaign_id, status="failed", error=str(e), finished_at=datetime.utcnow())
+        except Exception as update_error:
+            logger.error(f"Campaign {campaign_id}: could not record failure: {update_error}")
+    finally:
+        db.close()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Check that the ONNX embedding backend stays close to the PyTorch model
+Encodes a fixed corpus with both backends and reports per-text cosine drift
+and nearest-neighbour agreement; exits non-zero if drift exceeds the limit
+
+Usage:
+    python check_onnx_parity.py [--model-file model_int8.onnx] [--min-cosine 0.98]
+"""
+
+import sys
+import json
+import argparse
+
+import numpy as np
+from sentence_transformers import SentenceTransformer
+
+from embedding_model import SkillsMatchingModel
+from onnx_encoder import OnnxSentenceEncoder, model_export_dir, ONNX_MODEL_FILE
+
+MODEL_NAME = "all-MiniLM-L6-v2"
+
+SAMPLE_QUERIES = [
+    "python developer", "remote react frontend", "data scientist machine learning",
+    "graphic designer logo branding", "accountant part time", "devops kubernetes aws",
+    "mobile app ios swift", "content writer seo", "customer support agent", "video editor",
+]
+
+
+def build_corpus():
+    """Prepared job/user texts plus short queries, exactly as the app embeds them."""
+    prep = SkillsMatchingModel.__new__(SkillsMatchingModel)
+    with open("example_job.json") as f:
+        job = json.load(f)
+    with open("example_user.json") as f:
+        user = json.load(f)
+    job = {**job, 'description': job.get('job_description'), 'skills_required': job.get('required_skills')}
+
+    texts = [prep._prepare_job_text(job), prep._prepare_user_text(user)]
+    for query in SAMPLE_QUERIES:
+        texts.append(prep._prepare_job_text({'title': query.title(), 'skills_required': query, 'location': 'Remote'}))
+        texts.append(prep._prepare_user_text({'professional_title': query.title(), 'skills': query, 'bio': f"I work as a {query}."}))
+    return texts + SAMPLE_QUERIES
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model-file", default=ONNX_MODEL_FILE)
+    parser.add_argument("--min-cosine", type=float, default=0.98, help="Fail if any text drifts below this")
+    parser.add_argument("--top-k", type=int, default=5)
+    args = parser.parse_args()
+
+    texts = build_corpus()
+    print(f"🧪 Encoding {len(texts)} texts with both backends ({args.model_file})...")
+
+    reference = SentenceTransformer(MODEL_NAME, device="cpu").encode(texts, normalize_embeddings=True)
+    onnx = OnnxSentenceEncoder(model_export_dir(MODEL_NAME), model_file=args.model_file)
+    candidate = onnx.encode(texts, normalize_embeddings=True)
+
+    cosines = np.sum(reference * candidate, axis=1)
+    print(f"📏 Cosine vs PyTorch: min {cosines.min():.5f}, mean {cosines.mean():.5f}, max {cosines.max():.5f}")
+
+    # Does each text see the same nearest neighbours under both backends?
+    k = min(args.top_k, len(texts) - 1)
+    ref_sim, cand_sim = reference @ reference.T, candidate @ candidate.T
+    np.fill_diagonal(ref_sim, -np.inf)
+    np.fill_diagonal(cand_sim, -np.inf)
+    ref_top = np.argsort(-ref_sim, axis=1)[:, :k]
+    cand_top = np.argsort(-cand_sim, axis=1)[:, :k]
+    overlap = np.mean([len(set(a) & set(b)) / k for a, b in zip(ref_top, cand_top)])
+    print(f"🔗 Top-{k} neighbour overlap: {overlap:.3f}")
+
+    worst = int(np.argmin(cosines))
+    if cosines[worst] < args.min_cosine:
+        print(f"❌ Drift too large ({cosines[worst]:.5f} < {args.min_cosine}) for: {texts[worst][:80]!r}")
+        sys.exit(1)
+    print("✅ ONNX backend is within tolerance")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,327 @@
+"""
+Conversation Summary - materialized inbox rows for the messages page
+Each user pair has one row in `conversations` holding its last message,
+message count and per-participant unread counters. The message routes keep
+it current in the same transaction as the message write, so the inbox and
+unread badge never aggregate over the messages table
+"""
+
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, case, func, or_, select, union_all
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from models import Conversation, Message, User
+
+logger = logging.getLogger(__name__)
+
+
+def conversation_key(user_a: int, user_b: int) -> Tuple[int, int]:
+    """Ordered (low, high) pair identifying a conversation."""
+    return (user_a, user_b) if user_a <= user_b else (user_b, user_a)
+
+
+def _pair_filter(user_a: int, user_b: int):
+    return or_(
+        and_(Message.sender_id == user_a, Message.receiver_id == user_b),
+        and_(Message.sender_id == user_b, Message.receiver_id == user_a)
+    )
+
+
+def _unread_column(conversation_low: int, reader_id: int):
+    """Counter column holding the reader's unread messages."""
+    return Conversation.unread_count_low if reader_id == conversation_low else Conversation.unread_count_high
+
+
+def get_or_create_conversation(db: Session, user_a: int, user_b: int) -> Conversation:
+    low, high = conversation_key(user_a, user_b)
+    conversation = db.query(Conversation).filter(
+        Conversation.user_low_id == low, Conversation.user_high_id == high
+    ).first()
+    if conversation:
+        return conversation
+
+    try:
+        # Savepoint so losing a race with a concurrent first message only
+        # rolls back this insert, not the caller's message
+        with db.begin_nested():
+            conversation = Conversation(user_low_id=low, user_high_id=high)
+            db.add(conversation)
+    except IntegrityError:
+        conversation = db.query(Conversation).filter(
+            Conversation.user_low_id == low, Conversation.user_high_id == high
+        ).one()
+    return conversation
+
+
+def record_message(db: Session, message: Message):
+    """
+    Account for a newly flushed message. Counters are bumped with SQL
+    expressions so concurrent sends in one conversation don't lose updates.
+    """
+    conversation = get_or_create_conversation(db, message.sender_id, message.receiver_id)
+    values = {
+        Conversation.message_count: Conversation.message_count + 1,
+        Conversation.last_message_id: case(
+            (or_(Conversation.last_message_at.is_(None), Conversation.last_message_at <= message.created_at), message.id),
+            else_=Conversation.last_message_id
+        ),
+        Conversation.last_message_at: case(
+            (or_(Conversation.last_message_at.is_(None), Conversation.last_message_at <= message.created_at), message.created_at),
+            else_=Conversation.last_message_at
+        ),
+        Conversation.updated_at: datetime.utcnow()
+    }
+    if not message.is_read:
+        unread = _unread_column(conversation.user_low_id, message.receiver_id)
+        values[unread] = unread + 1
+    db.query(Conversation).filter(Conversation.id == conversation.id).update(values, synchronize_session=False)
+
+
+def mark_message_read(db: Session, message: Message):
+    """Decrement the reader's counter for one message that was unread."""
+    low, high = conversation_key(message.sender_id, message.receiver_id)
+    unread = _unread_column(low, message.receiver_id)
+    db.query(Conversation).filter(
+        Conversation.user_low_id == low, Conversation.user_high_id == high
+    ).update({
+        unread: case((unread > 0, unread - 1), else_=0),
+        Conversation.updated_at: datetime.utcnow()
+    }, synchronize_session=False)
+
+
+def mark_conversation_read(db: Session, reader_id: int, partner_id: int) -> int:
+    """Mark every message from partner to reader read and zero the reader's counter."""
+    marked = db.query(Message).filter(
+        Message.sender_id == partner_id,
+        Message.receiver_id == reader_id,
+        Message.is_read == False  # noqa: E712
+    ).update({Message.is_read: True}, synchronize_session=False)
+
+    low, high = conversation_key(reader_id, partner_id)
+    db.query(Conversation).filter(
+        Conversation.user_low_id == low, Conversation.user_high_id == high
+    ).update({
+        _unread_column(low, reader_id): 0,
+        Conversation.updated_at: datetime.utcnow()
+    }, synchronize_session=False)
+    return marked
+
+
+def refresh_conversation(db: Session, user_a: int, user_b: int):
+    """
+    Recompute one conversation row from its messages, e.g. after a delete.
+    Only touches the pair's messages, which the (sender_id, receiver_id,
+    created_at) index covers.
+    """
+    low, high = conversation_key(user_a, user_b)
+    pair = _pair_filter(low, high)
+    last = db.query(Message.id, Message.created_at).filter(pair).order_by(
+        Message.created_at.desc(), Message.id.desc()
+    ).first()
+    conversation_query = db.query(Conversation).filter(
+        Conversation.user_low_id == low, Conversation.user_high_id == high
+    )
+    if last is None:
+        conversation_query.delete(synchronize_session=False)
+        return
+
+    message_count = db.query(func.count(Message.id)).filter(pair).scalar()
+    unread = dict(db.query(Message.receiver_id, func.count(Message.id)).filter(
+        pair, Message.is_read == False  # noqa: E712
+    ).group_by(Message.receiver_id).all())
+
+    conversation = get_or_create_conversation(db, low, high)
+    conversation.last_message_id = last.id
+    conversation.last_message_at = last.created_at
+    conversation.message_count = message_count
+    conversation.unread_count_low = unread.get(low, 0)
+    conversation.unread_count_high = unread.get(high, 0) if high != low else 0
+
+
+def delete_conversation_messages(db: Session, user_a: int, user_b: int) -> int:
+    """Delete all messages between two users along with their conversation row."""
+    low, high = conversation_key(user_a, user_b)
+    db.query(Conversation).filter(
+        Conversation.user_low_id == low, Conversation.user_high_id == high
+    ).delete(synchronize_session=False)
+    return db.query(Message).filter(_pair_filter(low, high)).delete(synchronize_session=False)
+
+
+def unread_total(db: Session, user_id: int) -> int:
+    """Sum of the user's unread counters across conversations."""
+    total = db.query(func.coalesce(func.sum(case(
+        (Conversation.user_low_id == user_id, Conversation.unread_count_low),
+        else_=Conversation.unread_count_high
+    )), 0)).filter(
+        or_(Conversation.user_low_id == user_id, Conversation.user_high_id == user_id)
+    ).scalar()
+    return int(total or 0)
+
+
+def _user_conversations(user_id: int):
+    """
+    The user's conversation rows with the partner and the user's own unread
+    counter. Two UNION ALL branches so each side uses its own index.
+    """
+    columns = [Conversation.last_message_id, Conversation.last_message_at]
+    as_low = select(
+        Conversation.user_high_id.label("partner_id"),
+        Conversation.unread_count_low.label("unread_count"),
+        *columns
+    ).where(Conversation.user_low_id == user_id)
+    as_high = select(
+        Conversation.user_low_id.label("partner_id"),
+        Conversation.unread_count_high.label("unread_count"),
+        *columns
+    ).where(
+        Conversation.user_high_id == user_id,
+        # A conversation with oneself is already in the first branch
+        Conversation.user_low_id != user_id
+    )
+    return union_all(as_low, as_high).subquery("user_conversations")
+
+
+def conversation_summaries(
+    db: Session,
+    current_user: User,
+    limit: Optional[int] = None,
+    before: Optional[datetime] = None,
+    before_id: Optional[int] = None
+) -> List[Dict[str, Any]]:
+    """
+    List the user's conversations, most recently active first.
+
+    Args:
+        db: Database session
+        current_user: User whose inbox is listed
+        limit: Maximum conversations to return (all if None)
+        before: Keyset cursor - only conversations whose last message is older
+        before_id: Message id of the cursor row, breaks ties on created_at
+
+    Returns:
+        Conversation dicts in the shape the frontend inbox expects
+    """
+    conversations = _user_conversations(current_user.id)
+    query = (
+        select(
+            conversations.c.partner_id,
+            conversations.c.unread_count,
+            conversations.c.last_message_id,
+            conversations.c.last_message_at,
+            Message.content,
+            User.full_name,
+            User.profile_photo
+        )
+        .join(User, User.id == conversations.c.partner_id)
+        .outerjoin(Message, Message.id == conversations.c.last_message_id)
+        .where(conversations.c.last_message_at.isnot(None))
+        .order_by(conversations.c.last_message_at.desc(), conversations.c.last_message_id.desc())
+    )
+    if before is not None:
+        if before_id is not None:
+            query = query.where(or_(
+                conversations.c.last_message_at < before,
+                and_(conversations.c.last_message_at == before, conversations.c.last_message_id < before_id)
+            ))
+        else:
+            query = query.where(conversations.c.last_message_at < before)
+    if limit is not None:
+        query = query.limit(limit)
+
+    me = {
+        "id": current_user.id,
+        "full_name": current_user.full_name,
+        "profile_photo": current_user.profile_photo
+    }
+    return [
+        {
+            "id": f"{current_user.id}_{row.partner_id}",  # Unique conversation ID
+            "user1_id": current_user.id,
+            "user2_id": row.partner_id,
+            "user1": me,
+            "user2": {
+                "id": row.partner_id,
+                "full_name": row.full_name,
+                "profile_photo": row.profile_photo
+            },
+            "last_message": row.content,
+            "last_message_id": row.last_message_id,
+            "last_message_at": row.last_message_at.isoformat() if row.last_message_at else None,
+            "unread_count": row.unread_count or 0
+        }
+        for row in db.execute(query)
+    ]
+
+
+def user_message_totals(db: Session) -> Dict[int, Dict[str, Any]]:
+    """
+    Per-user totals over all of a user's conversations, for admin monitoring:
+    message count, unread count and the id/time of the latest message.
+    """
+    sides = union_all(
+        select(
+            Conversation.user_low_id.label("user_id"),
+            Conversation.unread_count_low.label("unread_count"),
+            Conversation.message_count,
+            Conversation.last_message_id,
+            Conversation.last_message_at
+        ),
+        select(
+            Conversation.user_high_id.label("user_id"),
+            Conversation.unread_count_high.label("unread_count"),
+            Conversation.message_count,
+            Conversation.last_message_id,
+            Conversation.last_message_at
+        ).where(Conversation.user_high_id != Conversation.user_low_id)
+    ).subquery("sides")
+
+    ranked = select(
+        sides,
+        func.sum(sides.c.unread_count).over(partition_by=sides.c.user_id).label("unread_total"),
+        func.sum(sides.c.message_count).over(partition_by=sides.c.user_id).label("message_total"),
+        func.row_number().over(
+            partition_by=sides.c.user_id,
+            order_by=(sides.c.last_message_at.desc(), sides.c.last_message_id.desc())
+        ).label("rank")
+    ).subquery("ranked")
+
+    rows = db.execute(
+        select(
+            ranked.c.user_id, ranked.c.unread_total, ranked.c.message_total,
+            ranked.c.last_message_id, ranked.c.last_message_at
+        ).where(ranked.c.rank == 1)
+    )
+    return {
+        row.user_id: {
+            "unread_count": int(row.unread_total or 0),
+            "total_messages": int(row.message_total or 0),
+            "last_message_id": row.last_message_id,
+            "last_message_at": row.last_message_at
+        }
+        for row in rows
+    }
+
+
+def rebuild_conversations(db: Session) -> int:
+    """
+    Rebuild every conversation row from the messages table, for rows
+    written outside the message routes (seed scripts, manual fixes).
+
+    Returns:
+        Number of conversations written
+    """
+    db.query(Conversation).delete(synchronize_session=False)
+    low = case((Message.sender_id <= Message.receiver_id, Message.sender_id), else_=Message.receiver_id)
+    high = case((Message.sender_id <= Message.receiver_id, Message.receiver_id), else_=Message.sender_id)
+    pairs = db.query(low.label("low"), high.label("high")).filter(
+        Message.sender_id.isnot(None), Message.receiver_id.isnot(None)
+    ).distinct().all()
+    for pair in pairs:
+        refresh_conversation(db, pair.low, pair.high)
+    db.commit()
+    logger.info(f"Rebuilt {len(pairs)} conversations")
+    return len(pairs)
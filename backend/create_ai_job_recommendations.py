@@ -129,8 +129,9 @@ def create_ai_job_recommendations():
                     
                     cursor.execute("""
                         INSERT INTO notifications 
-                        (user_id, title, message, type, is_read, data, created_at, updated_at)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                        (user_id, title, message, type, is_read, data,
+                         related_job_id, related_entity_type, related_entity_id, created_at, updated_at)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
                     """, (
                         user_id,
                         f'Job Recommendation #{i} 🔍',
@@ -138,6 +139,9 @@ def create_ai_job_recommendations():
                         'job_recommendation',
                         0,  # unread
                         f'{{"job_id": {job_match["job_id"]}, "similarity_score": {job_match["similarity_score"]:.3f}, "match_percentage": {similarity_percent}, "company": "Based on AI matching"}}',
+                        job_match["job_id"],
+                        'job',
+                        job_match["job_id"],
                         datetime.now().isoformat(),
                         datetime.now().isoformat()
                     ))
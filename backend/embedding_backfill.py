@@ -0,0 +1,280 @@
+"""
+Embedding Backfill - bulk (re)generation of user and job embeddings
+Streams rows with keyset pagination, encodes them in large batches and
+writes each batch back in a single transaction
+"""
+
+import os
+import hashlib
+import logging
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from models import User, Job
+from embedding_model import get_model, embedding_to_string, EMBEDDING_BACKEND
+
+logger = logging.getLogger(__name__)
+
+BACKFILL_BATCH_SIZE = int(os.getenv("EMBEDDING_BACKFILL_BATCH_SIZE", "128"))
+BACKFILL_MIN_BATCH_SIZE = 64
+BACKFILL_MAX_BATCH_SIZE = 256
+
+# Columns read for each kind; the embedding blob itself is never loaded
+USER_SOURCE_COLUMNS = ['bio', 'skills', 'location', 'professional_title', 'primary_role', 'company_name']
+JOB_SOURCE_COLUMNS = [
+    'title', 'location', 'job_type', 'category', 'description', 'skills_required',
+    'experience_required', 'qualifications', 'responsibilities', 'benefits', 'budget'
+]
+
+
+def user_embedding_data(user: Any) -> Dict[str, Any]:
+    """Profile fields fed to SkillsMatchingModel._prepare_user_text."""
+    return {
+        'bio': user.bio,
+        'skills': user.skills,
+        'location': user.location,
+        'experience': None,  # Experience field not in current model
+        'education': None,   # Education field not in current model
+        'professional_title': user.professional_title,
+        'primary_role': user.primary_role,
+        'company_name': user.company_name
+    }
+
+
+def job_embedding_data(job: Any) -> Dict[str, Any]:
+    """Job fields fed to SkillsMatchingModel._prepare_job_text."""
+    return {
+        'title': job.title,
+        'location': job.location,
+        'job_type': job.job_type,
+        'category': job.category,
+        'description': job.description,
+        'skills_required': job.skills_required,
+        'experience_required': job.experience_required,
+        'qualifications': job.qualifications,
+        'responsibilities': job.responsibilities,
+        'benefits': job.benefits,
+        'budget': job.budget
+    }
+
+
+def embedding_model_tag(model: Any) -> str:
+    """
+    What produces the embeddings: model name, inference backend and dimension.
+    Part of embedding_source_hash, so switching any of them re-embeds every row.
+
+    Raises:
+        RuntimeError: If the model did not load; its fallback vectors are
+                      placeholders that must never be stored as current
+    """
+    if model.model is None:
+        raise RuntimeError(f"Embedding model {model.model_name} is not loaded ({model.load_error or 'unknown error'})")
+    return f"{model.model_name}:{EMBEDDING_BACKEND}:{model.model.get_sentence_embedding_dimension()}"
+
+
+def embedding_source_hash(model_tag: str, text: str) -> str:
+    """Hash of the text an embedding was generated from (and what generated it, see embedding_model_tag)."""
+    return hashlib.sha256(f"{model_tag}\x00{text}".encode("utf-8")).hexdigest()
+
+
+def _clamp_batch_size(batch_size: int) -> int:
+    return max(BACKFILL_MIN_BATCH_SIZE, min(BACKFILL_MAX_BATCH_SIZE, batch_size))
+
+
+# Process pool workers each load their own copy of the model
+def _init_worker(threads_per_worker: int):
+    try:
+        import torch
+        torch.set_num_threads(threads_per_worker)
+    except ImportError:
+        pass
+    get_model()
+
+
+def _encode_in_worker(model_tag: str, texts: List[str]) -> List[bytes]:
+    model = get_model()
+    # A worker that failed to load the model (or loaded another one) must not hand back fallback vectors
+    if embedding_model_tag(model) != model_tag:
+        raise RuntimeError(f"Encoder process loaded {embedding_model_tag(model)}, expected {model_tag}")
+    return [embedding_to_string(embedding) for embedding in model.encode_texts(texts)]
+
+
+def backfill_embeddings(
+    kind: str,
+    batch_size: int = BACKFILL_BATCH_SIZE,
+    force: bool = False,
+    workers: int = 1,
+    open_jobs_only: bool = True,
+    progress: Optional[Callable[[Dict[str, Any]], None]] = None
+) -> Dict[str, Any]:
+    """
+    Generate embeddings for every user or job whose source text changed.
+
+    Args:
+        kind: "users" or "jobs"
+        batch_size: Rows per page / encode batch (clamped to 64-256)
+        force: Re-embed rows even if their source text hash is unchanged
+        workers: Number of encoder processes; 1 encodes in this process
+        open_jobs_only: Only embed jobs with status "open"
+        progress: Optional callback receiving the running stats after each batch
+
+    Returns:
+        Stats dict with scanned, embedded, skipped and failed counts
+
+    Raises:
+        RuntimeError: If the embedding model is not loaded
+    """
+    if kind == "users":
+        entity, embedding_column, source_columns, to_data = User, 'profile_embedding', USER_SOURCE_COLUMNS, user_embedding_data
+    elif kind == "jobs":
+        entity, embedding_column, source_columns, to_data = Job, 'job_embedding', JOB_SOURCE_COLUMNS, job_embedding_data
+    else:
+        raise ValueError(f"Unknown backfill kind: {kind}")
+
+    batch_size = _clamp_batch_size(batch_size)
+    model = get_model()
+    model_tag = embedding_model_tag(model)
+    prepare = model._prepare_user_text if kind == "users" else model._prepare_job_text
+    stats = {
+        "kind": kind, "scanned": 0, "embedded": 0, "skipped": 0, "failed": 0,
+        "started_at": datetime.utcnow().isoformat(), "finished_at": None
+    }
+
+    pool = None
+    if workers > 1:
+        threads_per_worker = max(1, (os.cpu_count() or workers) // workers)
+        pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(threads_per_worker,)
+        )
+
+    db: Session = SessionLocal()
+    # Batches waiting on the pool: (ids, hashes, future)
+    in_flight: deque = deque()
+
+    def write_batch(ids: List[int], hashes: List[str], blobs: List[bytes]):
+        now = datetime.utcnow()
+        db.bulk_update_mappings(entity, [
+            {'id': row_id, embedding_column: blob, 'embedding_source_hash': source_hash, 'embedding_updated_at': now}
+            for row_id, source_hash, blob in zip(ids, hashes, blobs)
+        ])
+        db.commit()
+        stats["embedded"] += len(ids)
+
+    def drain(limit: int):
+        while len(in_flight) > limit:
+            ids, hashes, future = in_flight.popleft()
+            try:
+                write_batch(ids, hashes, future.result())
+            except Exception as e:
+                db.rollback()
+                stats["failed"] += len(ids)
+                logger.error(f"Failed to embed {kind} batch starting at id {ids[0]}: {e}")
+            if progress:
+                progress(stats)
+
+    try:
+        query = db.query(
+            entity.id,
+            entity.embedding_source_hash,
+            getattr(entity, embedding_column).isnot(None).label('has_embedding'),
+            *[getattr(entity, column) for column in source_columns]
+        )
+        if kind == "jobs" and open_jobs_only:
+            query = query.filter(Job.status == "open")
+
+        last_id = 0
+        while True:
+            rows = query.filter(entity.id > last_id).order_by(entity.id).limit(batch_size).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+            stats["scanned"] += len(rows)
+
+            ids, hashes, texts = [], [], []
+            for row in rows:
+                text = prepare(to_data(row))
+                source_hash = embedding_source_hash(model_tag, text)
+                if not force and row.has_embedding and row.embedding_source_hash == source_hash:
+                    stats["skipped"] += 1
+                    continue
+                ids.append(row.id)
+                hashes.append(source_hash)
+                texts.append(text)
+            if not ids:
+                continue
+
+            if pool is not None:
+                in_flight.append((ids, hashes, pool.submit(_encode_in_worker, model_tag, texts)))
+                # Keep every worker busy while bounding memory
+                drain(2 * workers)
+                continue
+
+            try:
+                write_batch(ids, hashes, [embedding_to_string(e) for e in model.encode_texts(texts)])
+            except Exception as e:
+                db.rollback()
+                stats["failed"] += len(ids)
+                logger.error(f"Failed to embed {kind} batch starting at id {ids[0]}: {e}")
+            if progress:
+                progress(stats)
+
+        drain(0)
+
+        if kind == "jobs" and stats["embedded"]:
+            # Bulk updates skip the ORM events that keep the job index in sync
+            from embedding_index import get_job_index
+            get_job_index(db).load(db)
+    finally:
+        db.close()
+        if pool is not None:
+            pool.shutdown()
+
+    stats["finished_at"] = datetime.utcnow().isoformat()
+    logger.info(f"Embedding backfill for {kind}: {stats}")
+    return stats
+
+
+# State of the backfill started from the admin API (one at a time per process)
+_backfill_lock = threading.Lock()
+_backfill_status: Dict[str, Any] = {"running": False, "runs": []}
+
+
+def get_backfill_status() -> Dict[str, Any]:
+    return _backfill_status
+
+
+def run_backfill_job(kinds: List[str], batch_size: int, force: bool, workers: int) -> bool:
+    """
+    Run backfills for several kinds, recording progress for the admin API.
+
+    Returns:
+        False if another backfill is already running
+    """
+    if not _backfill_lock.acquire(blocking=False):
+        return False
+    try:
+        _backfill_status["running"] = True
+        _backfill_status["runs"] = []
+        for kind in kinds:
+            current: Dict[str, Any] = {"kind": kind}
+            _backfill_status["runs"].append(current)
+            try:
+                current.update(backfill_embeddings(kind, batch_size=batch_size, force=force,
+                                                   workers=workers, progress=current.update))
+            except Exception as e:
+                logger.error(f"Embedding backfill for {kind} failed: {e}")
+                current["error"] = str(e)
+        return True
+    finally:
+        _backfill_status["running"] = False
+        _backfill_lock.release()
@@ -0,0 +1,480 @@
+"""
+Job Embedding Index - In-memory vectorized matching
+Keeps every open job's embedding in one contiguous float32 matrix so that
+scoring a user against the whole catalogue is a single matrix-vector product
+"""
+
+import os
+import threading
+import time
+import logging
+from datetime import datetime
+from typing import List, Optional, Tuple, Iterable
+
+import numpy as np
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from models import Job
+from embedding_model import string_to_embedding
+from ann_index import IVFIndex, ANN_MIN_VECTORS, ANN_NPROBE, ANN_INDEX_PATH
+
+logger = logging.getLogger(__name__)
+
+# Rebuild from the database after this many seconds so that jobs embedded by
+# other processes (scripts, other workers) eventually show up
+JOB_INDEX_RELOAD_SECONDS = int(os.getenv("JOB_INDEX_RELOAD_SECONDS", "600"))
+
+_NO_DEADLINE = np.inf
+
+
+def _deadline_to_timestamp(deadline: Optional[datetime]) -> float:
+    """Convert an optional naive UTC deadline to a sortable float."""
+    if deadline is None:
+        return _NO_DEADLINE
+    return deadline.timestamp()
+
+
+def _normalize(vector: np.ndarray) -> Optional[np.ndarray]:
+    """Return a float32 unit vector, or None for empty/zero vectors."""
+    vector = np.asarray(vector, dtype=np.float32).ravel()
+    if vector.size == 0:
+        return None
+    norm = float(np.linalg.norm(vector))
+    if norm == 0.0:
+        return None
+    return vector / norm
+
+
+class JobEmbeddingIndex:
+    """
+    Process-wide matrix of open job embeddings.
+
+    Rows are L2-normalized on insert so cosine similarity is a plain dot
+    product. Removal swaps the last row into the freed slot, keeping the
+    live rows contiguous at the front of the buffer.
+
+    Once the index holds ANN_MIN_VECTORS jobs an IVF index is maintained
+    alongside the matrix for sub-linear semantic search.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._dimension: Optional[int] = None
+        self._matrix = np.empty((0, 0), dtype=np.float32)
+        self._job_ids = np.empty(0, dtype=np.int64)
+        self._deadlines = np.empty(0, dtype=np.float64)
+        self._positions = {}
+        self._size = 0
+        self._loaded_at: Optional[float] = None
+        self._ann: Optional[IVFIndex] = None
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def dimension(self) -> Optional[int]:
+        return self._dimension
+
+    def _reset(self, dimension: Optional[int], capacity: int = 0):
+        self._dimension = dimension
+        self._matrix = np.empty((capacity, dimension or 0), dtype=np.float32)
+        self._job_ids = np.empty(capacity, dtype=np.int64)
+        self._deadlines = np.empty(capacity, dtype=np.float64)
+        self._positions = {}
+        self._size = 0
+        self._ann = None
+
+    def _grow(self, min_capacity: int):
+        capacity = max(min_capacity, 2 * self._matrix.shape[0], 64)
+        matrix = np.empty((capacity, self._dimension), dtype=np.float32)
+        matrix[:self._size] = self._matrix[:self._size]
+        job_ids = np.empty(capacity, dtype=np.int64)
+        job_ids[:self._size] = self._job_ids[:self._size]
+        deadlines = np.empty(capacity, dtype=np.float64)
+        deadlines[:self._size] = self._deadlines[:self._size]
+        self._matrix, self._job_ids, self._deadlines = matrix, job_ids, deadlines
+
+    def load(self, db: Session) -> int:
+        """
+        Rebuild the index from every open job that has an embedding.
+
+        Returns:
+            Number of jobs indexed
+        """
+        rows = db.query(Job.id, Job.job_embedding, Job.deadline).filter(
+            Job.job_embedding.isnot(None),
+            Job.status == "open"
+        ).all()
+
+        vectors, job_ids, deadlines = [], [], []
+        dimension = None
+        for job_id, embedding_str, deadline in rows:
+            vector = _normalize(string_to_embedding(embedding_str))
+            if vector is None:
+                continue
+            if dimension is None:
+                dimension = vector.size
+            elif vector.size != dimension:
+                logger.warning(f"Skipping job {job_id}: embedding dimension {vector.size} != {dimension}")
+                continue
+            vectors.append(vector)
+            job_ids.append(job_id)
+            deadlines.append(_deadline_to_timestamp(deadline))
+
+        with self._lock:
+            self._reset(dimension, len(vectors))
+            if vectors:
+                self._matrix[:] = np.stack(vectors)
+                self._job_ids[:] = job_ids
+                self._deadlines[:] = deadlines
+                self._positions = {job_id: row for row, job_id in enumerate(job_ids)}
+                self._size = len(vectors)
+            self._build_ann()
+            self._loaded_at = time.monotonic()
+
+        logger.info(f"Job embedding index loaded: {self._size} jobs, dimension {dimension}")
+        return self._size
+
+    def ensure_loaded(self, db: Session):
+        """Load the index on first use and periodically thereafter."""
+        loaded_at = self._loaded_at
+        if loaded_at is None or time.monotonic() - loaded_at > JOB_INDEX_RELOAD_SECONDS:
+            self.load(db)
+
+    def upsert(self, job_id: int, embedding, deadline: Optional[datetime] = None) -> bool:
+        """
+        Insert or replace a job's embedding.
+
+        Returns:
+            True if the job is now indexed, False if the embedding was rejected
+        """
+        vector = _normalize(embedding)
+        if vector is None:
+            self.remove(job_id)
+            return False
+
+        with self._lock:
+            if self._dimension is None or (self._size == 0 and vector.size != self._dimension):
+                self._reset(vector.size)
+            elif vector.size != self._dimension:
+                logger.warning(f"Not indexing job {job_id}: embedding dimension {vector.size} != {self._dimension}")
+                self.remove(job_id)
+                return False
+
+            row = self._positions.get(job_id)
+            if row is None:
+                if self._size == self._matrix.shape[0]:
+                    self._grow(self._size + 1)
+                row = self._size
+                self._size += 1
+                self._positions[job_id] = row
+                self._job_ids[row] = job_id
+
+            self._matrix[row] = vector
+            self._deadlines[row] = _deadline_to_timestamp(deadline)
+            if self._ann is not None:
+                self._ann.add(job_id, vector, self._deadlines[row])
+            return True
+
+    def remove(self, job_id: int) -> bool:
+        """Drop a job from the index. Returns True if it was present."""
+        with self._lock:
+            row = self._positions.pop(job_id, None)
+            if row is None:
+                return False
+            if self._ann is not None:
+                self._ann.remove(job_id)
+
+            last = self._size - 1
+            if row != last:
+                moved_id = int(self._job_ids[last])
+                self._matrix[row] = self._matrix[last]
+                self._job_ids[row] = moved_id
+                self._deadlines[row] = self._deadlines[last]
+                self._positions[moved_id] = row
+            self._size = last
+            return True
+
+    def top_k(
+        self,
+        user_embedding,
+        k: int,
+        min_score: float = 0.0,
+        now: Optional[datetime] = None,
+        exclude: Optional[Iterable[int]] = None
+    ) -> List[Tuple[int, float]]:
+        """
+        Score every indexed job against a user embedding.
+
+        Args:
+            user_embedding: User (or query) embedding vector
+            k: Maximum number of matches to return
+            min_score: Minimum cosine similarity to include
+            now: If given, jobs whose deadline has passed are skipped
+            exclude: Job IDs to leave out of the result
+
+        Returns:
+            List of (job_id, similarity_score) sorted by score (descending)
+        """
+        query = _normalize(user_embedding)
+        if query is None or k <= 0:
+            return []
+
+        with self._lock:
+            if self._size == 0 or query.size != self._dimension:
+                return []
+
+            # Same 0..1 clamp as SkillsMatchingModel.calculate_similarity
+            scores = np.clip(self._matrix[:self._size] @ query, 0.0, 1.0)
+            keep = scores >= min_score
+            if now is not None:
+                keep &= self._deadlines[:self._size] > now.timestamp()
+            if exclude:
+                keep &= ~np.isin(self._job_ids[:self._size], np.fromiter(exclude, dtype=np.int64))
+
+            candidates = np.flatnonzero(keep)
+            if candidates.size > k:
+                best = np.argpartition(scores[candidates], -k)[-k:]
+                candidates = candidates[best]
+            order = candidates[np.argsort(-scores[candidates], kind="stable")]
+
+            return [(int(self._job_ids[row]), float(scores[row])) for row in order]
+
+    def _build_ann(self):
+        """(Re)build the IVF index over the current rows. Caller holds the lock."""
+        if self._size < ANN_MIN_VECTORS:
+            self._ann = None
+            return
+
+        live = slice(0, self._size)
+        ann = IVFIndex.load(self._dimension, ANN_INDEX_PATH)
+        # Retrain when the catalogue has drifted far from the training size
+        if ann is None or not (ann.trained_size / 4 <= self._size <= ann.trained_size * 4):
+            ann = IVFIndex(self._dimension)
+            ann.train(self._matrix[live])
+            try:
+                ann.save(ANN_INDEX_PATH)
+            except OSError as e:
+                logger.warning(f"Could not persist ANN quantizer: {e}")
+        ann.add_batch(self._job_ids[live], self._matrix[live], self._deadlines[live])
+        self._ann = ann
+        logger.info(f"ANN index built over {self._size} jobs ({len(ann.centroids)} cells)")
+
+    def search(
+        self,
+        query_embedding,
+        k: int,
+        min_score: float = 0.0,
+        now: Optional[datetime] = None,
+        nprobe: int = ANN_NPROBE
+    ) -> List[Tuple[int, float]]:
+        """
+        Top-k semantic search.
+
+        Uses the IVF index when the catalogue is large enough, otherwise an
+        exact brute-force scan via top_k().
+
+        Returns:
+            List of (job_id, similarity_score) sorted by score (descending)
+        """
+        with self._lock:
+            if self._ann is None and self._size >= ANN_MIN_VECTORS:
+                self._build_ann()
+            if self._ann is None:
+                return self.top_k(query_embedding, k, min_score=min_score, now=now)
+
+            query = _normalize(query_embedding)
+            if query is None or query.size != self._dimension:
+                return []
+            return self._ann.search(
+                query,
+                k,
+                nprobe=nprobe,
+                min_score=min_score,
+                now_ts=now.timestamp() if now is not None else None
+            )
+
+    def snapshot(self, now: Optional[datetime] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Copy out the live rows for long-running batch work.
+
+        Args:
+            now: If given, jobs whose deadline has passed are left out
+
+        Returns:
+            (job_ids, matrix) where matrix rows are unit-length job embeddings
+        """
+        with self._lock:
+            live = slice(0, self._size)
+            if now is None:
+                return self._job_ids[live].copy(), self._matrix[live].copy()
+            keep = self._deadlines[live] > now.timestamp()
+            return self._job_ids[live][keep], self._matrix[live][keep]
+
+
+def build_embedding_matrix(embeddings: List, dimension: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Stack decoded embeddings into a normalized float32 matrix.
+
+    Args:
+        embeddings: Decoded embedding vectors
+        dimension: Required vector length; other lengths are skipped
+
+    Returns:
+        (row_positions, matrix) where row_positions maps each matrix row back
+        to its position in ``embeddings``
+    """
+    positions, rows = [], []
+    for position, embedding in enumerate(embeddings):
+        vector = _normalize(embedding)
+        if vector is not None and vector.size == dimension:
+            positions.append(position)
+            rows.append(vector)
+    if not rows:
+        return np.empty(0, dtype=np.int64), np.empty((0, dimension), dtype=np.float32)
+    return np.asarray(positions, dtype=np.int64), np.stack(rows)
+
+
+# Upper bound on the number of float32 scores held in memory at once (~64 MB)
+MAX_SCORE_BLOCK_ELEMENTS = int(os.getenv("MAX_SCORE_BLOCK_ELEMENTS", str(16 * 1024 * 1024)))
+
+
+def batch_top_k(
+    user_matrix: np.ndarray,
+    job_ids: np.ndarray,
+    job_matrix: np.ndarray,
+    k: int,
+    min_score: float = 0.0,
+    chunk_size: int = 1024
+) -> List[List[Tuple[int, float]]]:
+    """
+    Top-k jobs for every user, scored in (users-chunk x jobs) blocks.
+
+    Both matrices must hold unit-length rows of the same dimension. The
+    chunk is shrunk as needed so a score block never exceeds
+    MAX_SCORE_BLOCK_ELEMENTS.
+
+    Returns:
+        One list of (job_id, similarity_score) per user row, sorted by score
+        (descending) and filtered by min_score
+    """
+    n_users, n_jobs = user_matrix.shape[0], job_matrix.shape[0]
+    results: List[List[Tuple[int, float]]] = [[] for _ in range(n_users)]
+    if n_users == 0 or n_jobs == 0 or k <= 0:
+        return results
+
+    k = min(k, n_jobs)
+    chunk_size = max(1, min(chunk_size, MAX_SCORE_BLOCK_ELEMENTS // n_jobs))
+    job_matrix_t = np.ascontiguousarray(job_matrix.T)
+
+    for start in range(0, n_users, chunk_size):
+        block = user_matrix[start:start + chunk_size] @ job_matrix_t
+        np.clip(block, 0.0, 1.0, out=block)
+
+        if k < n_jobs:
+            top = np.argpartition(block, -k, axis=1)[:, -k:]
+        else:
+            top = np.broadcast_to(np.arange(n_jobs), (block.shape[0], n_jobs))
+        top_scores = np.take_along_axis(block, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind="stable")
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+        top_ids = job_ids[top]
+        passing = top_scores >= min_score
+
+        for offset in range(block.shape[0]):
+            keep = passing[offset]
+            results[start + offset] = list(zip(
+                top_ids[offset][keep].tolist(),
+                top_scores[offset][keep].tolist()
+            ))
+
+    return results
+
+
+# Global index instance (singleton, like the embedding model)
+_index_instance = None
+_index_lock = threading.Lock()
+
+
+def get_job_index(db: Optional[Session] = None) -> JobEmbeddingIndex:
+    """
+    Get the process-wide job embedding index.
+
+    Args:
+        db: Optional session used to (re)load the index when it is cold or stale
+    """
+    global _index_instance
+    if _index_instance is None:
+        with _index_lock:
+            if _index_instance is None:
+                _index_instance = JobEmbeddingIndex()
+    if db is not None:
+        _index_instance.ensure_loaded(db)
+    return _index_instance
+
+
+# Keep the index in sync with job writes. Mapper events record a snapshot of
+# each changed job during flush; the snapshots are applied only once the
+# surrounding transaction commits, and discarded on rollback.
+_PENDING_KEY = "job_index_pending"
+_INDEXED_FIELDS = ("status", "deadline", "job_embedding")
+
+
+def _record_job_change(session: Session, job: Job, deleted: bool = False):
+    pending = session.info.setdefault(_PENDING_KEY, {})
+    if deleted:
+        pending[job.id] = None
+    else:
+        pending[job.id] = (job.status, job.deadline, job.job_embedding)
+
+
+@event.listens_for(Job, "after_insert")
+def _job_inserted(mapper, connection, target):
+    session = Session.object_session(target)
+    if session is not None:
+        _record_job_change(session, target)
+
+
+@event.listens_for(Job, "after_update")
+def _job_updated(mapper, connection, target):
+    session = Session.object_session(target)
+    if session is None:
+        return
+    state = inspect(target)
+    if any(state.attrs[field].history.has_changes() for field in _INDEXED_FIELDS):
+        _record_job_change(session, target)
+
+
+@event.listens_for(Job, "after_delete")
+def _job_deleted(mapper, connection, target):
+    session = Session.object_session(target)
+    if session is not None:
+        _record_job_change(session, target, deleted=True)
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _apply_job_changes(session: Session):
+    pending = session.info.pop(_PENDING_KEY, None)
+    if not pending or _index_instance is None:
+        return
+
+    for job_id, snapshot in pending.items():
+        try:
+            if snapshot is None:
+                _index_instance.remove(job_id)
+                continue
+            job_status, deadline, embedding_str = snapshot
+            if job_status == "open" and embedding_str:
+                _index_instance.upsert(job_id, string_to_embedding(embedding_str), deadline)
+            else:
+                _index_instance.remove(job_id)
+        except Exception as e:
+            logger.error(f"Error syncing job {job_id} into embedding index: {e}")
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _discard_job_changes(session: Session):
+    session.info.pop(_PENDING_KEY, None)
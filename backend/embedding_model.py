@@ -5,21 +5,48 @@ Uses all-MiniLM-L6-v2 for low RAM/CPU usage on free-tier hosting
 
 import os
 import json
+import time
+import struct
+import threading
+import importlib.util
 from typing import List, Dict, Any, Optional, Union
 import logging
 
+# numpy is required by the binary embedding codec even when the
+# transformer stack below is unavailable
+import numpy
+
+from embedding_cache import EmbeddingCache, embedding_cache_key
+from inference_batcher import EncodeBatcher
+
 # Type alias for embeddings
 EmbeddingVector = Union[List[float], Any]  # Any covers numpy.ndarray when available
 
-# Try to import ML dependencies, handle gracefully if not available
-try:
-    import numpy as np
-    from sentence_transformers import SentenceTransformer
-    from sklearn.metrics.pairwise import cosine_similarity
-    ML_AVAILABLE = True
-except ImportError as e:
-    ML_AVAILABLE = False
-    logging.warning(f"ML dependencies not available: {e}. Using fallback matching.")
+# Inference backend: "torch" (sentence-transformers) or "onnx" (int8 onnxruntime,
+# see onnx_encoder.py) which needs neither torch nor transformers at runtime
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch").lower()
+
+# Heavy ML packages (torch, sentence-transformers, onnxruntime, sklearn) are
+# only imported when the model is actually loaded; at import time we just
+# check that they are installed, which keeps application startup fast.
+_BACKEND_PACKAGES = {
+    "torch": ("sentence_transformers",),
+    "onnx": ("onnxruntime", "tokenizers"),
+}
+_missing_packages = [
+    package for package in _BACKEND_PACKAGES.get(EMBEDDING_BACKEND, _BACKEND_PACKAGES["torch"])
+    if importlib.util.find_spec(package) is None
+]
+ML_AVAILABLE = not _missing_packages
+
+if ML_AVAILABLE:
+    np = numpy
+    
+    def cosine_similarity_func(a: Any, b: Any) -> Any:
+        from sklearn.metrics.pairwise import cosine_similarity
+        return cosine_similarity(a, b)
+else:
+    logging.warning(f"ML dependencies not available: {', '.join(_missing_packages)}. Using fallback matching.")
     # Create fallback numpy-like functionality
     class MockLinalg:
         @staticmethod
@@ -111,32 +138,45 @@ class SkillsMatchingModel:
         """
         self.model_name = model_name
         self.model = None
+        self.load_error: Optional[str] = None
+        self.cache = EmbeddingCache()
+        self.batcher: Optional[EncodeBatcher] = None
         self._load_model()
     
     def _load_model(self):
         """Load the sentence transformer model on CPU."""
         if not ML_AVAILABLE:
             logger.warning("ML dependencies not available. Using fallback matching.")
+            self.load_error = f"Missing packages: {', '.join(_missing_packages)}"
             return
             
         try:
-            logger.info(f"Loading model: {self.model_name}")
+            logger.info(f"Loading model: {self.model_name} (backend: {EMBEDDING_BACKEND})")
             # Force CPU usage to avoid GPU memory issues
             os.environ['CUDA_VISIBLE_DEVICES'] = '-1'
             
-            # Load model with optimized settings for low RAM
-            self.model = SentenceTransformer(
-                self.model_name,
-                device='cpu'
-            )
+            if EMBEDDING_BACKEND == "onnx":
+                from onnx_encoder import OnnxSentenceEncoder
+                # Quantized ONNX export; exported on first use if missing
+                self.model = OnnxSentenceEncoder.load(self.model_name)
+            else:
+                from sentence_transformers import SentenceTransformer
+                # Load model with optimized settings for low RAM
+                self.model = SentenceTransformer(
+                    self.model_name,
+                    device='cpu'
+                )
             
             # Optimize model for inference
             self.model.eval()
+            # All encode calls go through one worker thread that batches them
+            self.batcher = EncodeBatcher(self._encode_batch)
             logger.info(f"Model loaded successfully. Embedding dimension: {self.model.get_sentence_embedding_dimension()}")
             
         except Exception as e:
             logger.error(f"Failed to load model: {e}")
             self.model = None
+            self.load_error = str(e)
     
     def _prepare_job_text(self, job_data: Dict[str, Any]) -> str:
         """
@@ -244,41 +284,71 @@ class SkillsMatchingModel:
         
         return " | ".join(text_parts)
     
-    def embed_job(self, job_data: Dict[str, Any]) -> EmbeddingVector:
+    def _encode_batch(self, texts: List[str]) -> Any:
+        """Run one batched forward pass (called on the batcher thread)."""
+        embeddings = self.model.encode(
+            texts,
+            convert_to_numpy=True,
+            normalize_embeddings=True,  # Normalize for better cosine similarity
+            show_progress_bar=False,
+            batch_size=len(texts)
+        )
+        logger.info(f"Generated {len(texts)} embeddings in one batch, shape: {getattr(embeddings, 'shape', len(embeddings))}")
+        return embeddings
+    
+    def _embed(self, kind: str, text: str) -> EmbeddingVector:
         """
-        Generate embedding for job data.
+        Encode prepared text, reusing cached vectors for text that has been
+        embedded before. Blocks the calling thread until the batch runs.
         
         Args:
-            job_data: Dictionary containing job information
+            kind: Namespace for the text (job, user, query)
+            text: Prepared text to embed
             
         Returns:
-            Embedding vector containing the job embedding
+            Normalized embedding vector, or a fallback embedding if the model
+            is unavailable
         """
         if not ML_AVAILABLE or self.model is None:
             # Fallback: create simple keyword-based embedding
-            job_text = self._prepare_job_text(job_data)
-            return self._create_fallback_embedding(job_text)
-            
+            return self._create_fallback_embedding(text)
+        
         try:
-            job_text = self._prepare_job_text(job_data)
-            
-            # Generate embedding
-            embedding = self.model.encode(
-                job_text,
-                convert_to_numpy=True,
-                normalize_embeddings=True,  # Normalize for better cosine similarity
-                show_progress_bar=False,
-                batch_size=1
-            )
-            
-            logger.info(f"Generated job embedding with shape: {getattr(embedding, 'shape', len(embedding))}")
-            return embedding
-            
+            key = embedding_cache_key(f"{self.model_name}:{EMBEDDING_BACKEND}:{kind}", text)
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+            return self.cache.put(key, self.batcher.encode(text))
+        except Exception as e:
+            logger.error(f"Error generating {kind} embedding: {e}")
+            return self._create_fallback_embedding(text)
+    
+    async def _embed_async(self, kind: str, text: str) -> EmbeddingVector:
+        """Same as _embed() but awaits the batch instead of blocking the event loop."""
+        if not ML_AVAILABLE or self.model is None:
+            return self._create_fallback_embedding(text)
+        
+        try:
+            key = embedding_cache_key(f"{self.model_name}:{EMBEDDING_BACKEND}:{kind}", text)
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+            return self.cache.put(key, await self.batcher.encode_async(text))
         except Exception as e:
-            logger.error(f"Error generating job embedding: {e}")
-            # Fallback to simple embedding
-            job_text = self._prepare_job_text(job_data)
-            return self._create_fallback_embedding(job_text)
+            logger.error(f"Error generating {kind} embedding: {e}")
+            return self._create_fallback_embedding(text)
+    
+    def embed_job(self, job_data: Dict[str, Any]) -> EmbeddingVector:
+        """
+        Generate embedding for job data.
+        
+        Args:
+            job_data: Dictionary containing job information
+            
+        Returns:
+            Embedding vector containing the job embedding
+        """
+        return self._embed("job", self._prepare_job_text(job_data))
     
     def embed_user(self, user_data: Dict[str, Any]) -> EmbeddingVector:
         """
@@ -290,31 +360,71 @@ class SkillsMatchingModel:
         Returns:
             Embedding vector containing the user embedding
         """
-        if not ML_AVAILABLE or self.model is None:
-            # Fallback: create simple keyword-based embedding
-            user_text = self._prepare_user_text(user_data)
-            return self._create_fallback_embedding(user_text)
-            
-        try:
-            user_text = self._prepare_user_text(user_data)
+        return self._embed("user", self._prepare_user_text(user_data))
+    
+    def embed_query(self, query: str) -> EmbeddingVector:
+        """
+        Generate embedding for a free-text search query.
+        
+        Args:
+            query: Search text
             
-            # Generate embedding
-            embedding = self.model.encode(
-                user_text,
-                convert_to_numpy=True,
-                normalize_embeddings=True,  # Normalize for better cosine similarity
-                show_progress_bar=False,
-                batch_size=1
-            )
+        Returns:
+            Embedding vector for the query
+        """
+        return self._embed("query", query)
+    
+    async def embed_job_async(self, job_data: Dict[str, Any]) -> EmbeddingVector:
+        """Async variant of embed_job() for use inside event-loop handlers."""
+        return await self._embed_async("job", self._prepare_job_text(job_data))
+    
+    async def embed_user_async(self, user_data: Dict[str, Any]) -> EmbeddingVector:
+        """Async variant of embed_user() for use inside event-loop handlers."""
+        return await self._embed_async("user", self._prepare_user_text(user_data))
+    
+    def encode_texts(self, texts: List[str]) -> List[EmbeddingVector]:
+        """
+        Encode prepared texts directly in one forward pass, bypassing the
+        cache and the batcher. Meant for bulk jobs such as backfills.
+        
+        Args:
+            texts: Prepared texts (see _prepare_job_text/_prepare_user_text)
             
-            logger.info(f"Generated user embedding with shape: {getattr(embedding, 'shape', len(embedding))}")
-            return embedding
+        Returns:
+            One embedding per text
+        """
+        if not ML_AVAILABLE or self.model is None:
+            return [self._create_fallback_embedding(text) for text in texts]
+        return list(self._encode_batch(texts))
+    
+    def embed_jobs(self, jobs_list: List[Dict[str, Any]]) -> List[EmbeddingVector]:
+        """
+        Generate embeddings for several jobs, submitting all cache misses to
+        the batcher together so they share forward passes.
+        
+        Args:
+            jobs_list: List of job dictionaries
             
-        except Exception as e:
-            logger.error(f"Error generating user embedding: {e}")
-            # Fallback to simple embedding
-            user_text = self._prepare_user_text(user_data)
-            return self._create_fallback_embedding(user_text)
+        Returns:
+            Embedding vectors in the same order as jobs_list
+        """
+        texts = [self._prepare_job_text(job) for job in jobs_list]
+        if not ML_AVAILABLE or self.model is None:
+            return [self._create_fallback_embedding(text) for text in texts]
+        
+        keys = [embedding_cache_key(f"{self.model_name}:{EMBEDDING_BACKEND}:job", text) for text in texts]
+        embeddings = [self.cache.get(key) for key in keys]
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if missing:
+            try:
+                encoded = self.batcher.encode_many([texts[i] for i in missing])
+                for i, embedding in zip(missing, encoded):
+                    embeddings[i] = self.cache.put(keys[i], embedding)
+            except Exception as e:
+                logger.error(f"Error generating job embeddings: {e}")
+                for i in missing:
+                    embeddings[i] = self._create_fallback_embedding(texts[i])
+        return embeddings
     
     def calculate_similarity(self, job_embedding: EmbeddingVector, user_embedding: EmbeddingVector) -> float:
         """
@@ -370,12 +480,12 @@ class SkillsMatchingModel:
             # Generate user embedding once
             user_embedding = self.embed_user(user_data)
             
+            # Embed all jobs in shared batches
+            job_embeddings = self.embed_jobs(jobs_list)
+            
             matches = []
             
-            for job in jobs_list:
-                # Generate job embedding
-                job_embedding = self.embed_job(job)
-                
+            for job, job_embedding in zip(jobs_list, job_embeddings):
                 # Calculate similarity
                 similarity = self.calculate_similarity(job_embedding, user_embedding)
                 
@@ -463,31 +573,146 @@ class SkillsMatchingModel:
 
 # Global model instance (singleton pattern for memory efficiency)
 _model_instance = None
+_model_lock = threading.Lock()
+# Separate from _model_lock, which is held for the whole (slow) load
+_warmup_lock = threading.Lock()
+_warmup_thread: Optional[threading.Thread] = None
+
+# Load the model in a background thread at startup instead of on first request
+EMBEDDING_WARMUP = os.getenv("EMBEDDING_WARMUP", "true").lower() == "true"
+
+# cold -> loading -> ready (transformer loaded) or degraded (fallback embeddings)
+_model_status: Dict[str, Any] = {
+    "state": "cold",
+    "backend": EMBEDDING_BACKEND,
+    "load_seconds": None,
+    "error": None
+}
 
 def get_model() -> SkillsMatchingModel:
-    """Get or create the singleton model instance."""
+    """
+    Get or create the singleton model instance.
+    
+    Blocks until the model is loaded; request handlers should prefer
+    get_model_if_ready() so they never stall on a cold model.
+    """
     global _model_instance
     if _model_instance is None:
-        _model_instance = SkillsMatchingModel()
+        with _model_lock:
+            if _model_instance is None:
+                _model_status["state"] = "loading"
+                start = time.perf_counter()
+                model = SkillsMatchingModel()
+                if model.model is not None:
+                    try:
+                        # First forward pass initializes kernels and thread pools
+                        model.encode_texts(["warm up"])
+                    except Exception as e:
+                        logger.warning(f"Model warm-up encode failed: {e}")
+                _model_status.update(
+                    state="ready" if model.model is not None else "degraded",
+                    load_seconds=round(time.perf_counter() - start, 2),
+                    error=model.load_error
+                )
+                _model_instance = model
+    return _model_instance
+
+def start_model_warmup():
+    """Load the model in a background thread (no-op if loaded or loading)."""
+    global _warmup_thread
+    if _model_instance is not None or (_warmup_thread is not None and _warmup_thread.is_alive()):
+        return
+    with _warmup_lock:
+        if _model_instance is None and (_warmup_thread is None or not _warmup_thread.is_alive()):
+            _warmup_thread = threading.Thread(target=get_model, name="model-warmup", daemon=True)
+            _warmup_thread.start()
+
+def get_model_if_ready() -> Optional[SkillsMatchingModel]:
+    """
+    Return the model if it has finished loading, otherwise start warming it
+    up in the background and return None so callers can take a degraded path.
+    """
+    if _model_instance is None:
+        start_model_warmup()
     return _model_instance
 
-def embedding_to_string(embedding: EmbeddingVector) -> str:
-    """Convert embedding to string for database storage."""
+def model_status() -> Dict[str, Any]:
+    """Loading state of the embedding model, for readiness checks."""
+    return dict(_model_status)
+
+# Binary embedding storage format: an 8-byte header followed by the raw
+# little-endian vector. The header carries a magic tag, format version,
+# dtype code and dimension so rows can be decoded with np.frombuffer.
+EMBEDDING_MAGIC = b"PE"
+EMBEDDING_FORMAT_VERSION = 1
+_EMBEDDING_HEADER = struct.Struct("<2sBBI")
+_DTYPE_CODES = {"float32": 0, "float16": 1}
+_CODE_DTYPES = {code: name for name, code in _DTYPE_CODES.items()}
+
+# float16 halves storage again at a small precision cost
+EMBEDDING_STORAGE_DTYPE = os.getenv("EMBEDDING_STORAGE_DTYPE", "float32")
+if EMBEDDING_STORAGE_DTYPE not in _DTYPE_CODES:
+    logger.warning(f"Unknown EMBEDDING_STORAGE_DTYPE '{EMBEDDING_STORAGE_DTYPE}', using float32")
+    EMBEDDING_STORAGE_DTYPE = "float32"
+
+
+def embedding_to_bytes(embedding: EmbeddingVector, dtype: Optional[str] = None) -> bytes:
+    """Pack an embedding into the binary storage format."""
+    dtype = dtype or EMBEDDING_STORAGE_DTYPE
+    vector = numpy.asarray(embedding, dtype=numpy.dtype(dtype).newbyteorder("<")).ravel()
+    header = _EMBEDDING_HEADER.pack(EMBEDDING_MAGIC, EMBEDDING_FORMAT_VERSION, _DTYPE_CODES[dtype], vector.size)
+    return header + vector.tobytes()
+
+
+def bytes_to_embedding(data: bytes):
+    """
+    Unpack a binary embedding.
+
+    float32 rows are returned as a read-only view over ``data`` (no copy);
+    float16 rows are widened to float32.
+    """
+    magic, version, dtype_code, dimension = _EMBEDDING_HEADER.unpack_from(data)
+    if magic != EMBEDDING_MAGIC or version != EMBEDDING_FORMAT_VERSION:
+        raise ValueError(f"Unrecognized embedding header: {magic!r} v{version}")
+    dtype = numpy.dtype(_CODE_DTYPES[dtype_code]).newbyteorder("<")
+    vector = numpy.frombuffer(data, dtype=dtype, count=dimension, offset=_EMBEDDING_HEADER.size)
+    if vector.dtype != numpy.float32:
+        vector = vector.astype(numpy.float32)
+    return vector
+
+
+def is_binary_embedding(data: Any) -> bool:
+    """Check whether a stored value uses the binary embedding format."""
+    return isinstance(data, (bytes, bytearray, memoryview)) and bytes(data[:2]) == EMBEDDING_MAGIC
+
+
+def embedding_to_string(embedding: EmbeddingVector) -> bytes:
+    """
+    Convert embedding for database storage.
+    
+    Despite the historical name this now returns the binary format stored in
+    the LargeBinary embedding columns.
+    """
     try:
-        if hasattr(embedding, 'tolist'):
-            return json.dumps(embedding.tolist())
-        elif isinstance(embedding, list):
-            return json.dumps(embedding)
-        else:
-            # Convert to list if it's not already
-            return json.dumps(list(embedding) if hasattr(embedding, '__iter__') else [])
+        if not hasattr(embedding, 'tolist') and not isinstance(embedding, list):
+            embedding = list(embedding) if hasattr(embedding, '__iter__') else []
+        return embedding_to_bytes(embedding)
     except Exception as e:
-        logger.error(f"Error converting embedding to string: {e}")
-        return json.dumps([])
+        logger.error(f"Error converting embedding to bytes: {e}")
+        return embedding_to_bytes([])
 
-def string_to_embedding(embedding_str: str) -> EmbeddingVector:
-    """Convert database string back to embedding."""
+def string_to_embedding(embedding_str: Union[str, bytes]) -> EmbeddingVector:
+    """
+    Convert a stored embedding back to a vector.
+    
+    Accepts the binary format as well as legacy JSON text, so rows that have
+    not been migrated yet keep working.
+    """
     try:
+        if is_binary_embedding(embedding_str):
+            return bytes_to_embedding(bytes(embedding_str) if isinstance(embedding_str, memoryview) else embedding_str)
+        if isinstance(embedding_str, (bytes, bytearray)):
+            embedding_str = embedding_str.decode("utf-8")
         data = json.loads(embedding_str)
         if ML_AVAILABLE:
             return np.array(data)
@@ -1,129 +1,77 @@
 """
 Helper script to generate embeddings for users and jobs
-Run this after adding users/jobs to populate their embeddings for matching
+Run this after adding users/jobs (or changing the model) to populate their embeddings for matching
+
+Usage:
+    python generate_embeddings.py [--users] [--jobs] [--batch-size 128] [--workers 1] [--force] [--all-jobs]
 """
 
-import sys
-from database import SessionLocal, get_db
-from models import User, Job
-from embedding_model import get_model, embedding_to_string
-from datetime import datetime
+import argparse
+
+from embedding_backfill import backfill_embeddings, BACKFILL_BATCH_SIZE
+
+
+def print_progress(stats):
+    print(f"   ... {stats['kind']}: scanned {stats['scanned']}, embedded {stats['embedded']}, "
+          f"skipped {stats['skipped']}, failed {stats['failed']}", end="\r", flush=True)
+
 
-def generate_user_embeddings(user_id=None):
+def generate_user_embeddings(batch_size=BACKFILL_BATCH_SIZE, force=False, workers=1):
     """
-    Generate embeddings for users.
-    
+    Generate embeddings for users whose profile text changed.
+
     Args:
-        user_id: If provided, only generate for that user. Otherwise generate for all users.
+        batch_size: Users encoded per batch
+        force: Re-embed every user even if unchanged
+        workers: Number of encoder processes
     """
-    db = SessionLocal()
-    model = get_model()
-    
-    try:
-        if user_id:
-            users = [db.query(User).filter(User.id == user_id).first()]
-            if not users[0]:
-                print(f"❌ User {user_id} not found")
-                return
-        else:
-            users = db.query(User).all()
-        
-        for user in users:
-            if not user:
-                continue
-                
-            # Prepare user data for embedding
-            user_dict = {
-                'bio': user.bio,
-                'skills': user.skills,
-                'location': user.location,
-                'experience': None,
-                'education': None,
-                'professional_title': user.professional_title,
-                'primary_role': user.primary_role,
-                'company_name': user.company_name
-            }
-            
-            try:
-                # Generate embedding
-                embedding = model.embed_user(user_dict)
-                
-                # Store in database
-                user.profile_embedding = embedding_to_string(embedding)
-                user.embedding_updated_at = datetime.utcnow()
-                db.commit()
-                
-                print(f"✅ Generated embedding for User {user.id} ({user.username}) - Skills: {user.skills}")
-            except Exception as e:
-                print(f"❌ Error generating embedding for User {user.id}: {e}")
-                db.rollback()
-                
-    finally:
-        db.close()
-
-def generate_job_embeddings(job_id=None):
+    stats = backfill_embeddings("users", batch_size=batch_size, force=force, workers=workers,
+                                progress=print_progress)
+    print(f"\n✅ Users: {stats['embedded']} embedded, {stats['skipped']} unchanged, {stats['failed']} failed")
+    return stats
+
+
+def generate_job_embeddings(batch_size=BACKFILL_BATCH_SIZE, force=False, workers=1, open_only=True):
     """
-    Generate embeddings for jobs.
-    
+    Generate embeddings for jobs whose text changed.
+
     Args:
-        job_id: If provided, only generate for that job. Otherwise generate for all open jobs.
+        batch_size: Jobs encoded per batch
+        force: Re-embed every job even if unchanged
+        workers: Number of encoder processes
+        open_only: Only embed open jobs
     """
-    db = SessionLocal()
-    model = get_model()
-    
-    try:
-        if job_id:
-            jobs = [db.query(Job).filter(Job.id == job_id).first()]
-            if not jobs[0]:
-                print(f"❌ Job {job_id} not found")
-                return
-        else:
-            jobs = db.query(Job).filter(Job.status == "open").all()
-        
-        for job in jobs:
-            if not job:
-                continue
-            
-            # Prepare job data for embedding
-            job_dict = {
-                'title': job.title,
-                'location': job.location,
-                'job_type': job.job_type,
-                'category': job.category,
-                'description': job.description,
-                'skills_required': job.skills_required,
-                'experience_required': job.experience_required,
-                'qualifications': job.qualifications,
-                'responsibilities': job.responsibilities,
-                'benefits': job.benefits,
-                'budget': job.budget
-            }
-            
-            try:
-                # Generate embedding
-                embedding = model.embed_job(job_dict)
-                
-                # Store in database
-                job.job_embedding = embedding_to_string(embedding)
-                job.embedding_updated_at = datetime.utcnow()
-                db.commit()
-                
-                print(f"✅ Generated embedding for Job {job.id} - {job.title} (Skills: {job.skills_required})")
-            except Exception as e:
-                print(f"❌ Error generating embedding for Job {job.id}: {e}")
-                db.rollback()
-                
-    finally:
-        db.close()
+    stats = backfill_embeddings("jobs", batch_size=batch_size, force=force, workers=workers,
+                                open_jobs_only=open_only, progress=print_progress)
+    print(f"\n✅ Jobs: {stats['embedded']} embedded, {stats['skipped']} unchanged, {stats['failed']} failed")
+    return stats
+
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", action="store_true", help="Only embed users")
+    parser.add_argument("--jobs", action="store_true", help="Only embed jobs")
+    parser.add_argument("--batch-size", type=int, default=BACKFILL_BATCH_SIZE, help="Rows per encode batch (64-256)")
+    parser.add_argument("--workers", type=int, default=1, help="Encoder processes for multi-core machines")
+    parser.add_argument("--force", action="store_true", help="Re-embed rows even if their text is unchanged")
+    parser.add_argument("--all-jobs", action="store_true", help="Include jobs that are not open")
+    args = parser.parse_args()
+    do_users = args.users or not args.jobs
+    do_jobs = args.jobs or not args.users
+
     print("🚀 Starting embedding generation...\n")
-    
-    print("📝 Generating job embeddings...")
-    generate_job_embeddings()
-    
-    print("\n👤 Generating user embeddings...")
-    generate_user_embeddings()
-    
+
+    try:
+        if do_jobs:
+            print("📝 Generating job embeddings...")
+            generate_job_embeddings(args.batch_size, args.force, args.workers, open_only=not args.all_jobs)
+
+        if do_users:
+            print("\n👤 Generating user embeddings...")
+            generate_user_embeddings(args.batch_size, args.force, args.workers)
+    except RuntimeError as e:
+        # Model not loaded (e.g. sentence-transformers not installed): nothing is written
+        raise SystemExit(f"❌ {e}")
+
     print("\n✨ Done! Embeddings generated successfully.")
-    print("Now try calling GET /api/skills-matching/matches-for-user/5?limit=5")
\ No newline at end of file
+    print("Now try calling GET /api/skills-matching/matches-for-user/5?limit=5")
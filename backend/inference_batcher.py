@@ -0,0 +1,153 @@
+"""
+Inference Batcher - dynamic micro-batching for sentence-transformer encode
+Collects concurrent encode requests for a few milliseconds and runs them as
+one batched forward pass on a dedicated worker thread
+"""
+
+import os
+import time
+import queue
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on texts per forward pass
+ENCODE_BATCH_MAX_SIZE = int(os.getenv("ENCODE_BATCH_MAX_SIZE", "32"))
+# How long the worker waits for more requests after the first one arrives
+ENCODE_BATCH_WAIT_MS = float(os.getenv("ENCODE_BATCH_WAIT_MS", "5"))
+
+_STOP = object()
+
+
+class EncodeBatcher:
+    """
+    Single worker thread that owns all calls into the encoder.
+
+    Callers get a concurrent.futures.Future per text; async callers can await
+    it through encode_async() without blocking the event loop. Identical texts
+    within a batch are encoded once.
+    """
+
+    def __init__(
+        self,
+        encode_fn: Callable[[List[str]], Any],
+        max_batch_size: int = ENCODE_BATCH_MAX_SIZE,
+        max_wait_ms: float = ENCODE_BATCH_WAIT_MS
+    ):
+        """
+        Args:
+            encode_fn: Function mapping a list of texts to a 2-D array of embeddings
+            max_batch_size: Maximum texts per encode call
+            max_wait_ms: Maximum time to wait for a batch to fill
+        """
+        self.encode_fn = encode_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._queue: "queue.Queue[Any]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="encode-batcher", daemon=True)
+                self._thread.start()
+
+    def submit(self, text: str) -> Future:
+        """Queue one text for encoding; the future resolves to its embedding."""
+        future: Future = Future()
+        self._ensure_started()
+        self._queue.put((text, future))
+        return future
+
+    def encode(self, text: str, timeout: Optional[float] = None) -> Any:
+        """Blocking encode for synchronous callers (e.g. threadpool routes)."""
+        return self.submit(text).result(timeout=timeout)
+
+    def encode_many(self, texts: List[str], timeout: Optional[float] = None) -> List[Any]:
+        """Queue several texts at once so they share forward passes."""
+        futures = [self.submit(text) for text in texts]
+        return [future.result(timeout=timeout) for future in futures]
+
+    async def encode_async(self, text: str) -> Any:
+        """Await an embedding without blocking the event loop."""
+        return await asyncio.wrap_future(self.submit(text))
+
+    def stop(self, timeout: float = 5.0):
+        """Let the worker drain the queue and exit."""
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "queued": self._queue.qsize(),
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0
+        }
+
+    def _collect(self, first: Tuple[str, Future]) -> Tuple[List[Tuple[str, Future]], bool]:
+        """Gather up to max_batch_size requests arriving within max_wait."""
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    item = self._queue.get(timeout=remaining)
+                else:
+                    # Window closed; still take anything already queued
+                    item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            first = self._queue.get()
+            if first is _STOP:
+                break
+            batch, stopping = self._collect(first)
+            self._process(batch)
+
+    def _process(self, batch: List[Tuple[str, Future]]):
+        pending = [(text, future) for text, future in batch if future.set_running_or_notify_cancel()]
+        if not pending:
+            return
+
+        unique_texts: List[str] = []
+        slots: Dict[str, int] = {}
+        for text, _ in pending:
+            if text not in slots:
+                slots[text] = len(unique_texts)
+                unique_texts.append(text)
+
+        try:
+            embeddings = self.encode_fn(unique_texts)
+        except Exception as e:
+            logger.error(f"Batched encode of {len(unique_texts)} texts failed: {e}")
+            for _, future in pending:
+                future.set_exception(e)
+            return
+
+        self.batches += 1
+        self.items += len(pending)
+        for text, future in pending:
+            future.set_result(embeddings[slots[text]])
@@ -1,7 +1,8 @@
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 import os
+import asyncio
 from dotenv import load_dotenv
 
 from database import Base, engine, get_db
@@ -12,9 +13,16 @@ from models import User, Job, Application, Message, Review, Advertisement, Email
 # Socket.IO imports
 import socketio
 import uvicorn
+from socket_manager import create_client_manager, describe_message_queue, socketio_transports
+from presence import PRESENCE_HEARTBEAT_SECONDS, get_presence, presence_shared, sync_presence, user_room
 
 # Background scheduler imports
 from scheduler import start_scheduler, stop_scheduler
+# Registers the change events that re-embed edited profiles and jobs
+from reembed_queue import stop_reembed_queue
+from services.smtp_pool import close_smtp_pools
+# Embedding model loads in the background; heavy ML imports happen there
+from embedding_model import EMBEDDING_WARMUP, start_model_warmup, model_status
 
 load_dotenv()
 
@@ -49,12 +57,19 @@ else:
         "https://prolinq-frontend.vercel.app"
     ]
 
-# Create Socket.IO app
+# Create Socket.IO app; with SOCKETIO_MESSAGE_QUEUE set, emits reach clients on every worker
+# and only WebSocket is accepted (polling needs sticky sessions)
+socket_client_manager = create_client_manager()
 sio = socketio.AsyncServer(
     async_mode='asgi',
     cors_allowed_origins=cors_origins,
-    cors_credentials=True
+    cors_credentials=True,
+    client_manager=socket_client_manager,
+    transports=socketio_transports(socket_client_manager)
 )
+print(f"🔌 Socket.IO message queue: {describe_message_queue(socket_client_manager)}, "
+      f"transports: {sio.eio.transports}")
+presence = get_presence()
 
 app = FastAPI(
     title="Prolinq API", 
@@ -97,6 +112,8 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Message history paging cursors
+    expose_headers=["X-Has-More", "X-Before-Cursor", "X-After-Cursor"],
 )
 
 # Include routes
@@ -127,6 +144,18 @@ async def startup_event():
     # Initialize database tables
     create_tables()
     
+    # Warm up the embedding model without delaying startup
+    if EMBEDDING_WARMUP:
+        start_model_warmup()
+        print("🧠 Embedding model warming up in background")
+    
+    # Expire typing indicators whose stop event never arrived
+    sio.start_background_task(expire_typing_indicators)
+    
+    # Share this worker's connections with the others through user_presence
+    if presence_shared():
+        sio.start_background_task(presence_heartbeat)
+    
     # Start scheduler (this might fail in Railway, so catch exceptions)
     try:
         start_scheduler(app)
@@ -139,6 +168,8 @@ async def shutdown_event():
     """Stop background scheduler on application shutdown"""
     print("🛑 Application shutting down...")
     stop_scheduler(app)
+    stop_reembed_queue()
+    close_smtp_pools()
 
 @app.get("/")
 def read_root():
@@ -148,12 +179,19 @@ def read_root():
 def health_check():
     return {"status": "ok"}
 
+@app.get("/ready")
+def readiness_check(response: Response):
+    """Readiness (as opposed to liveness): 503 until the embedding model has loaded"""
+    model = model_status()
+    if model["state"] in ("ready", "degraded"):
+        return {"status": "ready", "model": model}
+    response.status_code = 503
+    return {"status": "warming_up", "model": model}
+
 # Socket.IO event handlers
 @sio.event
 async def connect(sid, environ, auth=None):
     print(f"🔌 Client connected: {sid}")
-    print(f"   environ keys: {environ.keys() if environ else 'None'}")
-    print(f"   auth: {auth}")
     
     # Extract user_id from auth or query params
     user_id = None
@@ -168,39 +206,82 @@ async def connect(sid, environ, auth=None):
         except Exception as e:
             print(f"   Error parsing query params: {e}")
     
+    try:
+        user_id = int(user_id) if user_id is not None else None
+    except (TypeError, ValueError):
+        print(f"⚠️ Ignoring invalid user_id: {user_id}")
+        user_id = None
+    
     if user_id:
         # Join user-specific room
-        await sio.enter_room(sid, f"user_{user_id}")
-        print(f"✅ User {user_id} joined room user_{user_id}")
+        await sio.enter_room(sid, user_room(user_id))
+        came_online = presence.connect(sid, user_id)
+        print(f"✅ User {user_id} joined room {user_room(user_id)}{' (online)' if came_online else ''}")
+        if presence_shared():
+            await asyncio.to_thread(sync_presence, [user_id])
     else:
         print(f"ℹ️ Connected without user_id")
 
 @sio.event
 async def disconnect(sid):
-    print(f"🔌 Client disconnected: {sid}")
+    user_id, went_offline, typing_peers = presence.disconnect(sid)
+    print(f"🔌 Client disconnected: {sid}{f' (user {user_id} offline)' if went_offline else ''}")
+    if user_id is not None and presence_shared():
+        await asyncio.to_thread(sync_presence, [user_id])
+    # Clear typing indicators the user left behind
+    for receiver_id in typing_peers:
+        await sio.emit('typing', {'sender_id': user_id, 'receiver_id': receiver_id, 'is_typing': False}, room=user_room(receiver_id))
+
+def _receiver_id(data):
+    try:
+        return int(data['receiver_id'])
+    except (TypeError, KeyError, ValueError):
+        return None
 
 @sio.event
-async def new_message(data):
-    """Broadcast new message to all connected clients"""
-    print(f"📤 Broadcasting message: {data}")
-    await sio.emit('new_message', data)
+async def new_message(sid, data):
+    """Relay a client-sent message to the receiver's room only"""
+    sender_id = presence.user_for(sid)
+    receiver_id = _receiver_id(data)
+    if sender_id is None or receiver_id is None:
+        print(f"⚠️ Dropping new_message from {sid}: unknown sender or no receiver_id")
+        return
+    # The sender is whoever owns the connection, not what the payload claims
+    await sio.emit('new_message', {**data, 'sender_id': sender_id}, room=user_room(receiver_id), skip_sid=sid)
 
 @sio.event
-async def typing(data):
-    """Broadcast typing indicator"""
-    print(f"⌨️ Typing event: {data}")
-    await sio.emit('typing', data)
+async def typing(sid, data):
+    """Forward typing indicators to the conversation peer, coalescing repeats"""
+    sender_id = presence.user_for(sid)
+    receiver_id = _receiver_id(data)
+    if sender_id is None or receiver_id is None:
+        return
+    is_typing = bool(data.get('is_typing'))
+    if presence.update_typing(sender_id, receiver_id, is_typing):
+        await sio.emit('typing', {'sender_id': sender_id, 'receiver_id': receiver_id, 'is_typing': is_typing}, room=user_room(receiver_id))
+
+async def expire_typing_indicators():
+    """Send is_typing=false for peers whose typing went quiet without a stop event"""
+    while True:
+        await sio.sleep(1)
+        for sender_id, receiver_id in presence.expire_typing():
+            await sio.emit('typing', {'sender_id': sender_id, 'receiver_id': receiver_id, 'is_typing': False}, room=user_room(receiver_id))
+
+async def presence_heartbeat():
+    """Refresh this worker's user_presence rows so other workers see its users as online"""
+    while True:
+        await asyncio.to_thread(sync_presence)
+        await sio.sleep(PRESENCE_HEARTBEAT_SECONDS)
 
 @sio.event
-async def notification(data):
-    """Broadcast notification to specific user"""
-    user_id = data.get('user_id')
+async def notification(sid, data):
+    """Send notification to specific user"""
+    user_id = data.get('user_id') if isinstance(data, dict) else None
     if user_id:
         print(f"🔔 Sending notification to user {user_id}: {data}")
-        await sio.emit('notification', data, room=f"user_{user_id}")
+        await sio.emit('notification', data, room=user_room(user_id))
     else:
-        print(f"📢 Broadcasting notification to all: {data}")
-        await sio.emit('notification', data)
+        print(f"⚠️ Dropping notification from {sid} without user_id")
 
 # Create Socket.IO app
 socket_app = socketio.ASGIApp(sio, app)
@@ -0,0 +1,41 @@
+"""Add bulk_campaigns table for broadcast campaign progress
+
+Revision ID: add_bulk_campaigns
+Revises: backfill_notification_created_at
+Create Date: 2026-10-17 21:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_bulk_campaigns'
+down_revision = 'backfill_notification_created_at'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'bulk_campaigns',
+        sa.Column('id', sa.String(), nullable=False),
+        sa.Column('admin_id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(), nullable=True),
+        sa.Column('status', sa.String(), nullable=True),
+        sa.Column('total', sa.Integer(), nullable=True),
+        sa.Column('processed', sa.Integer(), nullable=True),
+        sa.Column('failed', sa.Integer(), nullable=True),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['admin_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_bulk_campaigns_admin_id', 'bulk_campaigns', ['admin_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_bulk_campaigns_admin_id', table_name='bulk_campaigns')
+    op.drop_table('bulk_campaigns')
@@ -0,0 +1,108 @@
+"""Add materialized conversations table
+
+Revision ID: add_conversations_table
+Revises: add_message_conversation_indexes
+Create Date: 2026-10-17 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_conversations_table'
+down_revision = 'add_message_conversation_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'conversations',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_low_id', sa.Integer(), nullable=False),
+        sa.Column('user_high_id', sa.Integer(), nullable=False),
+        sa.Column('last_message_id', sa.Integer(), nullable=True),
+        sa.Column('last_message_at', sa.DateTime(), nullable=True),
+        sa.Column('message_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('unread_count_low', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('unread_count_high', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_low_id'], ['users.id']),
+        sa.ForeignKeyConstraint(['user_high_id'], ['users.id']),
+        sa.ForeignKeyConstraint(['last_message_id'], ['messages.id'], ondelete='SET NULL'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_conversations_id', 'conversations', ['id'], unique=False)
+    op.create_index('ix_conversations_user_pair', 'conversations', ['user_low_id', 'user_high_id'], unique=True)
+    op.create_index('ix_conversations_low_last_message', 'conversations', ['user_low_id', 'last_message_at'], unique=False)
+    op.create_index('ix_conversations_high_last_message', 'conversations', ['user_high_id', 'last_message_at'], unique=False)
+
+    # Backfill: one grouped INSERT ... SELECT, then point each row at its last message
+    messages = sa.table(
+        'messages',
+        sa.column('id', sa.Integer),
+        sa.column('sender_id', sa.Integer),
+        sa.column('receiver_id', sa.Integer),
+        sa.column('is_read', sa.Boolean),
+        sa.column('created_at', sa.DateTime),
+    )
+    conversations = sa.table(
+        'conversations',
+        sa.column('user_low_id', sa.Integer),
+        sa.column('user_high_id', sa.Integer),
+        sa.column('last_message_id', sa.Integer),
+        sa.column('last_message_at', sa.DateTime),
+        sa.column('message_count', sa.Integer),
+        sa.column('unread_count_low', sa.Integer),
+        sa.column('unread_count_high', sa.Integer),
+        sa.column('created_at', sa.DateTime),
+        sa.column('updated_at', sa.DateTime),
+    )
+    sender_is_low = messages.c.sender_id <= messages.c.receiver_id
+    low = sa.case((sender_is_low, messages.c.sender_id), else_=messages.c.receiver_id)
+    high = sa.case((sender_is_low, messages.c.receiver_id), else_=messages.c.sender_id)
+    unread = messages.c.is_read == sa.false()
+
+    grouped = sa.select(
+        low,
+        high,
+        sa.func.max(messages.c.created_at),
+        sa.func.count(),
+        sa.func.sum(sa.case((sa.and_(unread, messages.c.receiver_id == low), 1), else_=0)),
+        sa.func.sum(sa.case((sa.and_(unread, messages.c.receiver_id == high, low != high), 1), else_=0)),
+        sa.func.min(messages.c.created_at),
+        sa.func.max(messages.c.created_at),
+    ).where(
+        messages.c.sender_id.isnot(None), messages.c.receiver_id.isnot(None)
+    ).group_by(low, high)
+
+    conn = op.get_bind()
+    conn.execute(conversations.insert().from_select(
+        ['user_low_id', 'user_high_id', 'last_message_at', 'message_count',
+         'unread_count_low', 'unread_count_high', 'created_at', 'updated_at'],
+        grouped
+    ))
+
+    in_pair = sa.or_(
+        sa.and_(messages.c.sender_id == conversations.c.user_low_id, messages.c.receiver_id == conversations.c.user_high_id),
+        sa.and_(messages.c.sender_id == conversations.c.user_high_id, messages.c.receiver_id == conversations.c.user_low_id),
+    )
+    last_message = (
+        sa.select(messages.c.id)
+        .where(in_pair)
+        .order_by(messages.c.created_at.desc(), messages.c.id.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+    result = conn.execute(conversations.update().values(last_message_id=last_message))
+    print(f"✅ Backfilled {result.rowcount} conversations")
+
+
+def downgrade() -> None:
+    op.drop_index('ix_conversations_high_last_message', table_name='conversations')
+    op.drop_index('ix_conversations_low_last_message', table_name='conversations')
+    op.drop_index('ix_conversations_user_pair', table_name='conversations')
+    op.drop_index('ix_conversations_id', table_name='conversations')
+    op.drop_table('conversations')
@@ -0,0 +1,57 @@
+"""Add retry scheduling (next_attempt_at, priority) and dead-letter status to email_queue
+
+Revision ID: add_email_queue_backoff
+Revises: add_email_queue_claims
+Create Date: 2026-10-17 19:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_email_queue_backoff'
+down_revision = 'add_email_queue_claims'
+branch_labels = None
+depends_on = None
+
+
+# Mirrors services.rate_limiter.EMAIL_PRIORITIES at the time of this migration
+EMAIL_PRIORITIES = {"welcome": 0, "test": 0, "daily_jobs": 1, "promotional": 2}
+DEFAULT_PRIORITY = 1
+
+
+def upgrade() -> None:
+    op.add_column('email_queue', sa.Column('priority', sa.Integer(), nullable=True))
+    op.add_column('email_queue', sa.Column('next_attempt_at', sa.DateTime(), nullable=True))
+
+    # Backfill: queued emails are due from when they were queued
+    email_queue = sa.table(
+        'email_queue',
+        sa.column('email_type', sa.String),
+        sa.column('status', sa.String),
+        sa.column('priority', sa.Integer),
+        sa.column('created_at', sa.DateTime),
+        sa.column('next_attempt_at', sa.DateTime),
+    )
+    conn = op.get_bind()
+    result = conn.execute(email_queue.update().values(
+        priority=sa.case(EMAIL_PRIORITIES, value=email_queue.c.email_type, else_=DEFAULT_PRIORITY),
+        next_attempt_at=sa.func.coalesce(email_queue.c.created_at, sa.func.now())
+    ))
+    print(f"✅ Backfilled {result.rowcount} queued emails")
+
+    # Emails that ran out of retries are now dead letters
+    conn.execute(email_queue.update().where(email_queue.c.status == 'failed').values(status='dead_letter'))
+
+    op.create_index('ix_email_queue_status_priority_next_attempt', 'email_queue', ['status', 'priority', 'next_attempt_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_email_queue_status_priority_next_attempt', table_name='email_queue')
+
+    email_queue = sa.table('email_queue', sa.column('status', sa.String))
+    op.get_bind().execute(email_queue.update().where(email_queue.c.status == 'dead_letter').values(status='failed'))
+
+    op.drop_column('email_queue', 'next_attempt_at')
+    op.drop_column('email_queue', 'priority')
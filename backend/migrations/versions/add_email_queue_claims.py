@@ -0,0 +1,26 @@
+"""Add claim lease columns to email_queue
+
+Revision ID: add_email_queue_claims
+Revises: add_email_sender_state
+Create Date: 2026-10-17 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_email_queue_claims'
+down_revision = 'add_email_sender_state'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('email_queue', sa.Column('claimed_by', sa.String(), nullable=True))
+    op.add_column('email_queue', sa.Column('claimed_until', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('email_queue', 'claimed_until')
+    op.drop_column('email_queue', 'claimed_by')
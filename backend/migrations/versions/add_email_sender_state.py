@@ -0,0 +1,41 @@
+"""Add email_sender_state table and email_queue.sender_account
+
+Revision ID: add_email_sender_state
+Revises: add_notifications_archive
+Create Date: 2026-10-17 17:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_email_sender_state'
+down_revision = 'add_notifications_archive'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'email_sender_state',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('sender', sa.String(), nullable=False),
+        sa.Column('daily_tokens', sa.Float(), nullable=False),
+        sa.Column('spacing_tokens', sa.Float(), nullable=False),
+        sa.Column('bucket_updated_at', sa.Float(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_email_sender_state_id', 'email_sender_state', ['id'], unique=False)
+    op.create_index('ix_email_sender_state_sender', 'email_sender_state', ['sender'], unique=True)
+
+    op.add_column('email_queue', sa.Column('sender_account', sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('email_queue', 'sender_account')
+
+    op.drop_index('ix_email_sender_state_sender', table_name='email_sender_state')
+    op.drop_index('ix_email_sender_state_id', table_name='email_sender_state')
+    op.drop_table('email_sender_state')
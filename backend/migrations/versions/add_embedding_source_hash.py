@@ -0,0 +1,28 @@
+"""Add embedding_source_hash to users and jobs tables
+
+Revision ID: add_embedding_source_hash
+Revises: convert_embeddings_to_binary
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_embedding_source_hash'
+down_revision = 'convert_embeddings_to_binary'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('users', sa.Column('embedding_source_hash', sa.String(length=64), nullable=True))
+    op.add_column('jobs', sa.Column('embedding_source_hash', sa.String(length=64), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('jobs') as batch_op:
+        batch_op.drop_column('embedding_source_hash')
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.drop_column('embedding_source_hash')
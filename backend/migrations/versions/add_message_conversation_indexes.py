@@ -0,0 +1,25 @@
+"""Add composite indexes for conversation summaries on messages
+
+Revision ID: add_message_conversation_indexes
+Revises: add_notification_related_entity
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_message_conversation_indexes'
+down_revision = 'add_notification_related_entity'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_messages_sender_receiver_created', 'messages', ['sender_id', 'receiver_id', 'created_at'], unique=False)
+    op.create_index('ix_messages_receiver_is_read', 'messages', ['receiver_id', 'is_read'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_messages_receiver_is_read', table_name='messages')
+    op.drop_index('ix_messages_sender_receiver_created', table_name='messages')
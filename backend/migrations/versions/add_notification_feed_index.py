@@ -0,0 +1,23 @@
+"""Add (user_id, is_read, created_at) index for the notification feed
+
+Revision ID: add_notification_feed_index
+Revises: add_conversations_table
+Create Date: 2026-10-17 14:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_notification_feed_index'
+down_revision = 'add_conversations_table'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_notifications_user_read_created', 'notifications', ['user_id', 'is_read', 'created_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_notifications_user_read_created', table_name='notifications')
@@ -0,0 +1,109 @@
+"""Add related_job_id / related_entity_type / related_entity_id to notifications
+
+Revision ID: add_notification_related_entity
+Revises: add_embedding_source_hash
+Create Date: 2026-10-17 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import json
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_notification_related_entity'
+down_revision = 'add_embedding_source_hash'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+
+# notification type -> (related_entity_type, key in data holding its id)
+ENTITY_KEYS = {
+    'job_recommendation': ('job', 'job_id'),
+    'job_completed': ('job', 'job_id'),
+    'job_application': ('application', 'application_id'),
+    'application_update': ('application', 'application_id'),
+    'new_message': ('message', 'message_id'),
+    'review_received': ('review', 'review_id'),
+}
+
+
+def _as_int(value):
+    try:
+        return int(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def upgrade() -> None:
+    op.add_column('notifications', sa.Column('related_job_id', sa.Integer(), nullable=True))
+    op.add_column('notifications', sa.Column('related_entity_type', sa.String(), nullable=True))
+    op.add_column('notifications', sa.Column('related_entity_id', sa.Integer(), nullable=True))
+
+    # Backfill from the JSON data blob in keyset-paged batches
+    conn = op.get_bind()
+    notifications = sa.table(
+        'notifications',
+        sa.column('id', sa.Integer),
+        sa.column('type', sa.String),
+        sa.column('data', sa.Text),
+        sa.column('related_job_id', sa.Integer),
+        sa.column('related_entity_type', sa.String),
+        sa.column('related_entity_id', sa.Integer),
+    )
+    update = notifications.update().where(notifications.c.id == sa.bindparam('_id')).values(
+        related_job_id=sa.bindparam('_job_id'),
+        related_entity_type=sa.bindparam('_entity_type'),
+        related_entity_id=sa.bindparam('_entity_id'),
+    )
+
+    last_id = 0
+    updated = 0
+    while True:
+        rows = conn.execute(
+            sa.select(notifications.c.id, notifications.c.type, notifications.c.data)
+            .where(notifications.c.id > last_id, notifications.c.data.isnot(None))
+            .order_by(notifications.c.id)
+            .limit(BATCH_SIZE)
+        ).fetchall()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+
+        params = []
+        for row_id, notification_type, raw in rows:
+            try:
+                data = json.loads(raw)
+            except (TypeError, ValueError):
+                continue
+            if not isinstance(data, dict):
+                continue
+            entity_type, entity_key = ENTITY_KEYS.get(notification_type, (None, None))
+            job_id = _as_int(data.get('job_id'))
+            entity_id = _as_int(data.get(entity_key)) if entity_key else None
+            if job_id is None and entity_id is None:
+                continue
+            params.append({
+                '_id': row_id,
+                '_job_id': job_id,
+                '_entity_type': entity_type if entity_id is not None else None,
+                '_entity_id': entity_id,
+            })
+        if params:
+            conn.execute(update, params)
+            updated += len(params)
+
+    print(f"✅ Backfilled related entity columns on {updated} notifications")
+
+    op.create_index('ix_notifications_related_job_id', 'notifications', ['related_job_id'], unique=False)
+    op.create_index('ix_notifications_related_entity', 'notifications', ['related_entity_type', 'related_entity_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_notifications_related_entity', table_name='notifications')
+    op.drop_index('ix_notifications_related_job_id', table_name='notifications')
+    with op.batch_alter_table('notifications') as batch_op:
+        batch_op.drop_column('related_entity_id')
+        batch_op.drop_column('related_entity_type')
+        batch_op.drop_column('related_job_id')
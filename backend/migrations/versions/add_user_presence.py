@@ -0,0 +1,34 @@
+"""Add user_presence table for presence shared across API workers
+
+Revision ID: add_user_presence
+Revises: add_bulk_campaigns
+Create Date: 2026-10-17 22:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_user_presence'
+down_revision = 'add_bulk_campaigns'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'user_presence',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('worker_id', sa.String(), nullable=False),
+        sa.Column('connections', sa.Integer(), nullable=True),
+        sa.Column('heartbeat_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('user_id', 'worker_id')
+    )
+    op.create_index('ix_user_presence_heartbeat_at', 'user_presence', ['heartbeat_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_user_presence_heartbeat_at', table_name='user_presence')
+    op.drop_table('user_presence')
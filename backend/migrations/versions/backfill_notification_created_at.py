@@ -0,0 +1,36 @@
+"""Backfill NULL notifications.created_at so feed cursors can order every row
+
+Revision ID: backfill_notification_created_at
+Revises: add_email_queue_backoff
+Create Date: 2026-10-17 20:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'backfill_notification_created_at'
+down_revision = 'add_email_queue_backoff'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Rows inserted outside the ORM default; the last update is the best guess
+    notifications = sa.table(
+        'notifications',
+        sa.column('created_at', sa.DateTime),
+        sa.column('updated_at', sa.DateTime),
+    )
+    result = op.get_bind().execute(
+        notifications.update()
+        .where(notifications.c.created_at.is_(None))
+        .values(created_at=sa.func.coalesce(notifications.c.updated_at, sa.func.now()))
+    )
+    print(f"✅ Backfilled created_at on {result.rowcount} notifications")
+
+
+def downgrade() -> None:
+    # Data-only fix; the original NULLs are not restored
+    pass
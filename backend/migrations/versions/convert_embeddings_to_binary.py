@@ -0,0 +1,88 @@
+"""Convert users.profile_embedding and jobs.job_embedding to binary storage
+
+Revision ID: convert_embeddings_to_binary
+Revises: 073c2e659ba2
+Create Date: 2026-10-17 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import json
+
+from embedding_model import embedding_to_bytes, bytes_to_embedding, is_binary_embedding
+
+
+# revision identifiers, used by Alembic.
+revision = 'convert_embeddings_to_binary'
+down_revision = '073c2e659ba2'
+branch_labels = None
+depends_on = None
+
+EMBEDDING_COLUMNS = [
+    ('users', 'profile_embedding'),
+    ('jobs', 'job_embedding'),
+]
+BATCH_SIZE = 500
+
+
+def _convert_column(table_name, column_name, new_type, convert):
+    """Copy column through a temporary column, converting every row."""
+    temp_name = f"{column_name}_new"
+    op.add_column(table_name, sa.Column(temp_name, new_type, nullable=True))
+
+    conn = op.get_bind()
+    table = sa.table(
+        table_name,
+        sa.column('id', sa.Integer),
+        sa.column(column_name),
+        sa.column(temp_name, new_type),
+    )
+
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            sa.select(table.c.id, table.c[column_name])
+            .where(table.c.id > last_id, table.c[column_name].isnot(None))
+            .order_by(table.c.id)
+            .limit(BATCH_SIZE)
+        ).fetchall()
+        if not rows:
+            break
+        for row_id, value in rows:
+            try:
+                converted = convert(value)
+            except Exception as e:
+                print(f"⚠️  Could not convert {table_name}.{column_name} for id {row_id}: {e}")
+                converted = None
+            conn.execute(
+                table.update().where(table.c.id == row_id).values({temp_name: converted})
+            )
+        last_id = rows[-1][0]
+
+    with op.batch_alter_table(table_name) as batch_op:
+        batch_op.drop_column(column_name)
+        batch_op.alter_column(temp_name, new_column_name=column_name, existing_type=new_type)
+
+
+def _json_to_binary(value):
+    if is_binary_embedding(value):
+        return bytes(value)
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        value = bytes(value).decode('utf-8')
+    return embedding_to_bytes(json.loads(value))
+
+
+def _binary_to_json(value):
+    if not is_binary_embedding(value):
+        return value if isinstance(value, str) else bytes(value).decode('utf-8')
+    return json.dumps(bytes_to_embedding(bytes(value)).tolist())
+
+
+def upgrade() -> None:
+    for table_name, column_name in EMBEDDING_COLUMNS:
+        _convert_column(table_name, column_name, sa.LargeBinary(), _json_to_binary)
+
+
+def downgrade() -> None:
+    for table_name, column_name in EMBEDDING_COLUMNS:
+        _convert_column(table_name, column_name, sa.Text(), _binary_to_json)
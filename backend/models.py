@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, Float
+from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, Float, LargeBinary, Index
 from sqlalchemy.orm import relationship
 from database import Base
 from datetime import datetime
@@ -37,8 +37,9 @@ class User(Base):
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # AI matching fields
-    profile_embedding = Column(Text, nullable=True)  # Store user profile embedding as JSON string
+    profile_embedding = Column(LargeBinary, nullable=True)  # Binary embedding (see embedding_model.embedding_to_bytes)
     embedding_updated_at = Column(DateTime, nullable=True)  # Track when embedding was last updated
+    embedding_source_hash = Column(String(64), nullable=True)  # Hash of model name + embedded text, to skip unchanged rows
 
     # Relationships
     jobs = relationship("Job", back_populates="creator")
@@ -100,8 +101,9 @@ class Job(Base):
     picture_filename = Column(String, nullable=True)  # Filename of the picture
     
     # AI matching fields
-    job_embedding = Column(Text, nullable=True)  # Store job embedding as JSON string
+    job_embedding = Column(LargeBinary, nullable=True)  # Binary embedding (see embedding_model.embedding_to_bytes)
     embedding_updated_at = Column(DateTime, nullable=True)  # Track when embedding was last updated
+    embedding_source_hash = Column(String(64), nullable=True)  # Hash of model name + embedded text, to skip unchanged rows
 
     # Relationships
     creator = relationship("User", back_populates="jobs")
@@ -136,12 +138,45 @@ class Message(Base):
     message_type = Column(String, nullable=True, default="text")  # text, location, media, file
     created_at = Column(DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        # Conversation threads and the inbox's last-message lookup
+        Index("ix_messages_sender_receiver_created", "sender_id", "receiver_id", "created_at"),
+        # Unread counts per receiver
+        Index("ix_messages_receiver_is_read", "receiver_id", "is_read"),
+    )
+
     # Relationships
     sender = relationship("User", foreign_keys=[sender_id], back_populates="sent_messages")
     receiver = relationship("User", foreign_keys=[receiver_id], back_populates="received_messages")
     replied_to = relationship("Message", remote_side=[id], foreign_keys=[reply_to_id])
 
 
+class Conversation(Base):
+    """One row per user pair, maintained alongside messages for cheap inbox reads"""
+    __tablename__ = "conversations"
+
+    id = Column(Integer, primary_key=True, index=True)
+    # Ordered pair: user_low_id <= user_high_id
+    user_low_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    user_high_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    last_message_id = Column(Integer, ForeignKey("messages.id", ondelete="SET NULL"), nullable=True)
+    last_message_at = Column(DateTime, nullable=True)
+    message_count = Column(Integer, default=0, nullable=False)
+    # Unread messages addressed to each participant
+    unread_count_low = Column(Integer, default=0, nullable=False)
+    unread_count_high = Column(Integer, default=0, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_conversations_user_pair", "user_low_id", "user_high_id", unique=True),
+        Index("ix_conversations_low_last_message", "user_low_id", "last_message_at"),
+        Index("ix_conversations_high_last_message", "user_high_id", "last_message_at"),
+    )
+
+    last_message = relationship("Message", foreign_keys=[last_message_id])
+
+
 class Review(Base):
     __tablename__ = "reviews"
 
@@ -179,6 +214,33 @@ class AdminMessage(Base):
     receiver = relationship("User", foreign_keys=[receiver_id])
 
 
+class BulkCampaign(Base):
+    """Progress of an admin broadcast campaign, written as its chunks commit"""
+    __tablename__ = "bulk_campaigns"
+
+    id = Column(String, primary_key=True)  # Same UUID as AdminMessage.bulk_campaign_id
+    admin_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    name = Column(String, nullable=True)
+    status = Column(String, default="queued")  # queued, running, completed, failed
+    total = Column(Integer, default=0)
+    processed = Column(Integer, default=0)
+    failed = Column(Integer, default=0)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+
+class UserPresence(Base):
+    """Socket.IO connections a worker holds for a user, refreshed by heartbeat"""
+    __tablename__ = "user_presence"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    worker_id = Column(String, primary_key=True)  # hostname:pid of the API worker
+    connections = Column(Integer, default=0)
+    heartbeat_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+
 class Notification(Base):
     __tablename__ = "notifications"
 
@@ -189,13 +251,42 @@ class Notification(Base):
     type = Column(String, nullable=True, default="general")  # admin_message, job_application, etc.
     is_read = Column(Boolean, default=False)
     data = Column(Text, nullable=True)  # JSON string for additional data
+    # Queryable copies of the ids in `data`, so cleanups don't have to parse JSON
+    related_job_id = Column(Integer, nullable=True, index=True)
+    related_entity_type = Column(String, nullable=True)  # job, application, message, review
+    related_entity_id = Column(Integer, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    __table_args__ = (
+        Index("ix_notifications_related_entity", "related_entity_type", "related_entity_id"),
+        # Feed pages and unread counts
+        Index("ix_notifications_user_read_created", "user_id", "is_read", "created_at"),
+    )
+
     # Relationships
     user = relationship("User", back_populates="notifications")
 
 
+class NotificationArchive(Base):
+    """Notifications moved out of the live table by the retention job"""
+    __tablename__ = "notifications_archive"
+
+    id = Column(Integer, primary_key=True)  # Same id the row had in notifications
+    user_id = Column(Integer, nullable=False, index=True)
+    title = Column(String, nullable=False)
+    message = Column(Text, nullable=False)
+    type = Column(String, nullable=True)
+    is_read = Column(Boolean, default=False)
+    data = Column(Text, nullable=True)
+    related_job_id = Column(Integer, nullable=True)
+    related_entity_type = Column(String, nullable=True)
+    related_entity_id = Column(Integer, nullable=True)
+    created_at = Column(DateTime, nullable=True)
+    updated_at = Column(DateTime, nullable=True)
+    archived_at = Column(DateTime, default=datetime.utcnow)
+
+
 class Advertisement(Base):
     __tablename__ = "advertisements"
 
@@ -246,16 +337,38 @@ class EmailQueue(Base):
     html_content = Column(Text, nullable=True)  # HTML version of email
     email_type = Column(String, nullable=False)  # welcome, daily_jobs, promotional, test
     user_id = Column(Integer, ForeignKey("users.id"), nullable=True)  # Optional user reference
-    status = Column(String, default="pending", index=True)  # pending, sent, failed, retry
+    status = Column(String, default="pending", index=True)  # pending, sending, sent, retry, dead_letter, cancelled
+    priority = Column(Integer, default=1)  # 0 = highest, see services.rate_limiter.EMAIL_PRIORITIES
     retry_count = Column(Integer, default=0)
+    next_attempt_at = Column(DateTime, default=datetime.utcnow)  # Not sent before this (retry backoff)
     error_message = Column(Text, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow, index=True)
     sent_at = Column(DateTime, nullable=True)
+    sender_account = Column(String, nullable=True)  # SMTP account it was sent through
+    claimed_by = Column(String, nullable=True)  # Worker currently sending it (status "sending")
+    claimed_until = Column(DateTime, nullable=True)  # Lease end; expired claims go back to the queue
+    
+    __table_args__ = (
+        # Next emails to send: one ordered range scan per status
+        Index("ix_email_queue_status_priority_next_attempt", "status", "priority", "next_attempt_at"),
+    )
     
     # Relationships
     user = relationship("User", foreign_keys=[user_id])
 
 
+class EmailSenderState(Base):
+    """Persisted rate-limit token buckets, one row per SMTP sending account"""
+    __tablename__ = "email_sender_state"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    sender = Column(String, nullable=False, unique=True, index=True)  # Account name from SMTP_ACCOUNTS
+    daily_tokens = Column(Float, nullable=False, default=0)
+    spacing_tokens = Column(Float, nullable=False, default=0)
+    bucket_updated_at = Column(Float, nullable=False, default=0)  # Unix time the token levels were taken at
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
 class EmailAd(Base):
     """Stores promotional ads for daily emails"""
     __tablename__ = "email_ads"
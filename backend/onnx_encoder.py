@@ -0,0 +1,202 @@
+"""
+ONNX Sentence Encoder - quantized CPU inference for the embedding model
+Runs an int8 ONNX export of the sentence-transformer through onnxruntime and
+the Rust tokenizers library, so serving needs neither torch nor transformers
+
+Export once (needs sentence-transformers/torch on the build machine):
+    python onnx_encoder.py [--model all-MiniLM-L6-v2] [--output onnx_models]
+"""
+
+import os
+import json
+import logging
+from typing import Any, Dict, List, Union
+
+import numpy as np
+import onnxruntime as ort
+from tokenizers import Tokenizer
+
+logger = logging.getLogger(__name__)
+
+# Root directory holding one sub-directory per exported model
+ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR", "onnx_models")
+# model_int8.onnx (quantized, default) or model.onnx (fp32)
+ONNX_MODEL_FILE = os.getenv("ONNX_MODEL_FILE", "model_int8.onnx")
+# Intra-op threads for onnxruntime; 0 lets the runtime decide
+ONNX_NUM_THREADS = int(os.getenv("ONNX_NUM_THREADS", "0"))
+
+FP32_FILE = "model.onnx"
+INT8_FILE = "model_int8.onnx"
+CONFIG_FILE = "encoder_config.json"
+
+
+def model_export_dir(model_name: str, root: str = ONNX_MODEL_DIR) -> str:
+    return os.path.join(root, model_name.replace("/", "__"))
+
+
+def export_onnx_model(model_name: str, output_root: str = ONNX_MODEL_DIR, opset: int = 14) -> str:
+    """
+    Export a sentence-transformer to ONNX and write an int8 dynamically
+    quantized copy next to it.
+
+    Args:
+        model_name: sentence-transformers model name
+        output_root: Directory under which the export is written
+        opset: ONNX opset version
+
+    Returns:
+        Path of the export directory
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+
+    output_dir = model_export_dir(model_name, output_root)
+    os.makedirs(output_dir, exist_ok=True)
+
+    st_model = SentenceTransformer(model_name, device="cpu")
+    transformer = st_model[0].auto_model.eval()
+    tokenizer = st_model[0].tokenizer
+
+    class _HiddenStates(torch.nn.Module):
+        """Expose only last_hidden_state so the graph has one plain output."""
+
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, input_ids, attention_mask, token_type_ids):
+            return self.model(input_ids=input_ids, attention_mask=attention_mask,
+                              token_type_ids=token_type_ids)[0]
+
+    dummy = tokenizer(["Job Title: Python developer | Skills: FastAPI"], return_tensors="pt")
+    fp32_path = os.path.join(output_dir, FP32_FILE)
+    dynamic = {0: "batch", 1: "sequence"}
+    with torch.no_grad():
+        torch.onnx.export(
+            _HiddenStates(transformer),
+            (dummy["input_ids"], dummy["attention_mask"], dummy["token_type_ids"]),
+            fp32_path,
+            input_names=["input_ids", "attention_mask", "token_type_ids"],
+            output_names=["last_hidden_state"],
+            dynamic_axes={"input_ids": dynamic, "attention_mask": dynamic,
+                          "token_type_ids": dynamic, "last_hidden_state": dynamic},
+            opset_version=opset
+        )
+
+    quantize_dynamic(fp32_path, os.path.join(output_dir, INT8_FILE), weight_type=QuantType.QInt8)
+
+    # Fast tokenizer serializes to tokenizer.json, which tokenizers loads directly
+    tokenizer.save_pretrained(output_dir)
+    config = {
+        "model_name": model_name,
+        "max_seq_length": st_model.max_seq_length,
+        "dimension": st_model.get_sentence_embedding_dimension(),
+        "normalize": any(type(module).__name__ == "Normalize" for module in st_model),
+        "pad_token": tokenizer.pad_token,
+        "pad_token_id": tokenizer.pad_token_id
+    }
+    with open(os.path.join(output_dir, CONFIG_FILE), "w") as f:
+        json.dump(config, f, indent=2)
+
+    logger.info(f"Exported {model_name} to {output_dir}")
+    return output_dir
+
+
+class OnnxSentenceEncoder:
+    """
+    Drop-in replacement for the parts of SentenceTransformer used by
+    SkillsMatchingModel: encode(), get_sentence_embedding_dimension(), eval().
+
+    Pooling mirrors all-MiniLM-L6-v2: attention-masked mean over token
+    states followed by L2 normalization.
+    """
+
+    def __init__(self, model_dir: str, model_file: str = ONNX_MODEL_FILE, num_threads: int = ONNX_NUM_THREADS):
+        with open(os.path.join(model_dir, CONFIG_FILE)) as f:
+            self.config: Dict[str, Any] = json.load(f)
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=self.config["max_seq_length"])
+        self.tokenizer.enable_padding(pad_id=self.config["pad_token_id"], pad_token=self.config["pad_token"])
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads > 0:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(
+            os.path.join(model_dir, model_file),
+            sess_options=options,
+            providers=["CPUExecutionProvider"]
+        )
+        self._input_names = {node.name for node in self.session.get_inputs()}
+
+    @classmethod
+    def load(cls, model_name: str, root: str = ONNX_MODEL_DIR) -> "OnnxSentenceEncoder":
+        """Load an exported model, exporting it first if it is missing."""
+        model_dir = model_export_dir(model_name, root)
+        if not os.path.exists(os.path.join(model_dir, CONFIG_FILE)):
+            logger.info(f"No ONNX export found in {model_dir}; exporting {model_name}")
+            export_onnx_model(model_name, root)
+        return cls(model_dir)
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.config["dimension"]
+
+    def eval(self):
+        return self
+
+    def _encode_batch(self, texts: List[str], normalize: bool) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        feeds = {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": np.array([e.attention_mask for e in encodings], dtype=np.int64),
+            "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+        }
+        feeds = {name: value for name, value in feeds.items() if name in self._input_names}
+        hidden = self.session.run(None, feeds)[0]
+
+        mask = feeds["attention_mask"][:, :, None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        if normalize:
+            pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+        return pooled.astype(np.float32)
+
+    def encode(
+        self,
+        sentences: Union[str, List[str]],
+        batch_size: int = 32,
+        show_progress_bar: bool = False,
+        convert_to_numpy: bool = True,
+        normalize_embeddings: bool = False
+    ) -> np.ndarray:
+        """Same contract as SentenceTransformer.encode for numpy output."""
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        if not texts:
+            return np.empty((0, self.get_sentence_embedding_dimension()), dtype=np.float32)
+
+        normalize = normalize_embeddings or self.config.get("normalize", False)
+        # Sort by length so each batch pads to a similar sequence length
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        embeddings = np.empty((len(texts), self.get_sentence_embedding_dimension()), dtype=np.float32)
+        batch_size = max(1, batch_size)
+        for start in range(0, len(order), batch_size):
+            idx = order[start:start + batch_size]
+            embeddings[idx] = self._encode_batch([texts[i] for i in idx], normalize)
+
+        return embeddings[0] if single else embeddings
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Export a sentence-transformer to int8 ONNX")
+    parser.add_argument("--model", default="all-MiniLM-L6-v2")
+    parser.add_argument("--output", default=ONNX_MODEL_DIR)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    print(f"📦 Exporting {args.model} to ONNX...")
+    path = export_onnx_model(args.model, args.output)
+    print(f"✅ Export written to {path}")
@@ -0,0 +1,119 @@
+"""
+Keyset Pagination - cursor paging for messages, notifications and other feeds
+Pages are cut on (created_at, id) so fetching deep into a long thread costs
+the same as fetching its newest page; cursors are "<created_at ISO>_<id>"
+"""
+
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
+
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Query
+
+MAX_PAGE_SIZE = 500
+
+
+def encode_cursor(row) -> str:
+    # Rows without a timestamp (legacy data) sort as the oldest
+    created_at = row.created_at or datetime.min
+    return f"{created_at.isoformat()}_{row.id}"
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    created_at, _, message_id = cursor.rpartition("_")
+    return datetime.fromisoformat(created_at), int(message_id)
+
+
+def _newer_than(model, cursor: Tuple[datetime, int]):
+    created_at, row_id = cursor
+    return or_(model.created_at > created_at, and_(model.created_at == created_at, model.id > row_id))
+
+
+def _older_than(model, cursor: Tuple[datetime, int]):
+    created_at, row_id = cursor
+    return or_(model.created_at < created_at, and_(model.created_at == created_at, model.id < row_id))
+
+
+def paginate_keyset(
+    query: Query,
+    model,
+    limit: Optional[int],
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    since: Optional[datetime] = None,
+    newest_first: bool = False
+) -> Tuple[List[Any], bool]:
+    """
+    Cut one page out of a filtered query over a model with created_at and
+    id columns (messages, notifications).
+
+    With `after` (or `since`) the page holds the oldest rows newer than the
+    cursor (catching up); otherwise the newest rows older than `before`, or
+    the latest rows when no cursor is given (scrolling back). limit=None
+    returns everything in that direction, for clients that predate paging.
+
+    Args:
+        query: Query with the thread/user filters applied
+        model: Mapped class the query selects
+        limit: Page size (capped at MAX_PAGE_SIZE), or None for no limit
+        before: Cursor; return rows older than it
+        after: Cursor; return rows newer than it
+        since: Like after, for clients that only know a timestamp
+        newest_first: Order of the returned page
+
+    Returns:
+        (rows, has_more) where has_more says another page exists in the
+        direction being paged
+
+    Raises:
+        ValueError: If a cursor is malformed
+    """
+    if after is not None or since is not None:
+        if after is not None:
+            query = query.filter(_newer_than(model, decode_cursor(after)))
+        else:
+            query = query.filter(model.created_at > since)
+        query = query.order_by(model.created_at.asc(), model.id.asc())
+        ascending = True
+    else:
+        if before is not None:
+            query = query.filter(_older_than(model, decode_cursor(before)))
+        query = query.order_by(model.created_at.desc(), model.id.desc())
+        ascending = False
+
+    if limit is None:
+        rows, has_more = query.all(), False
+    else:
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        rows = query.limit(limit + 1).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+    if ascending == newest_first:
+        rows.reverse()
+    return rows, has_more
+
+
+def page_cursors(rows: List[Any]) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Returns:
+        (before_cursor, after_cursor): the oldest and newest row of a page,
+        for fetching the older and the newer neighbouring page
+    """
+    if not rows:
+        return None, None
+    key = lambda row: (row.created_at or datetime.min, row.id)
+    return encode_cursor(min(rows, key=key)), encode_cursor(max(rows, key=key))
+
+
+def page_headers(rows: List[Any], has_more: bool) -> dict:
+    """Cursors for the neighbouring pages, sent as response headers so list payloads stay unchanged."""
+    headers = {"X-Has-More": "true" if has_more else "false"}
+    before_cursor, after_cursor = page_cursors(rows)
+    if rows:
+        headers["X-Before-Cursor"] = before_cursor
+        headers["X-After-Cursor"] = after_cursor
+    return headers
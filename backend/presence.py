@@ -0,0 +1,274 @@
+"""
+Presence Registry - who is connected over Socket.IO, kept in memory
+Maps sid <-> user_id so socket events can be routed to the peer's
+room instead of every client, answers online/last-seen queries without
+touching the database, and coalesces typing indicators so a burst of
+keystrokes reaches the peer as one "started typing" event.
+With several workers (SOCKETIO_MESSAGE_QUEUE set) each one also writes its
+per-user connection counts to user_presence, and online/last-seen queries
+read that table so they see connections held by every worker
+"""
+
+import os
+import time
+import socket
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Mapping, Optional, Set, Tuple
+
+from sqlalchemy import and_, case, func
+from sqlalchemy.orm import Session
+
+from socket_manager import SOCKETIO_MESSAGE_QUEUE
+
+logger = logging.getLogger(__name__)
+
+# A repeated is_typing=true for the same peer is forwarded at most this often
+TYPING_REFRESH_SECONDS = float(os.getenv("TYPING_REFRESH_SECONDS", "3"))
+# Typing state with no refresh for this long is expired with an is_typing=false
+TYPING_TIMEOUT_SECONDS = float(os.getenv("TYPING_TIMEOUT_SECONDS", "6"))
+# Each worker refreshes its user_presence rows this often; rows not refreshed
+# for PRESENCE_TTL_SECONDS belong to a worker that died and count as offline
+PRESENCE_HEARTBEAT_SECONDS = float(os.getenv("PRESENCE_HEARTBEAT_SECONDS", "20"))
+PRESENCE_TTL_SECONDS = float(os.getenv("PRESENCE_TTL_SECONDS", "60"))
+# Offline rows are kept this long so last_seen survives worker restarts
+PRESENCE_RETENTION_DAYS = int(os.getenv("PRESENCE_RETENTION_DAYS", "30"))
+
+
+def user_room(user_id: int) -> str:
+    return f"user_{user_id}"
+
+
+class PresenceRegistry:
+    """
+    Connection state for this process. With several workers sharing rooms
+    through a message queue, each worker only sees its own connections;
+    presence_status() answers for all of them.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sid_user: Dict[str, int] = {}
+        self._user_sids: Dict[int, Set[str]] = {}
+        self._last_seen: Dict[int, datetime] = {}
+        # (sender, receiver) -> [last refresh, last forwarded] monotonic times
+        self._typing: Dict[Tuple[int, int], List[float]] = {}
+
+    def connect(self, sid: str, user_id: int) -> bool:
+        """
+        Register a connection.
+
+        Returns:
+            True if this is the user's first open connection (came online)
+        """
+        with self._lock:
+            self._sid_user[sid] = user_id
+            sids = self._user_sids.setdefault(user_id, set())
+            came_online = not sids
+            sids.add(sid)
+            self._last_seen[user_id] = datetime.utcnow()
+            return came_online
+
+    def disconnect(self, sid: str) -> Tuple[Optional[int], bool, List[int]]:
+        """
+        Forget a connection.
+
+        Returns:
+            (user_id, went_offline, peers) where peers are users the
+            disconnected user was shown as typing to when they went offline
+        """
+        with self._lock:
+            user_id = self._sid_user.pop(sid, None)
+            if user_id is None:
+                return None, False, []
+            self._last_seen[user_id] = datetime.utcnow()
+            sids = self._user_sids.get(user_id)
+            if sids:
+                sids.discard(sid)
+            if sids:
+                return user_id, False, []
+            self._user_sids.pop(user_id, None)
+            peers = [receiver for sender, receiver in self._typing if sender == user_id]
+            for receiver in peers:
+                del self._typing[(user_id, receiver)]
+            return user_id, True, peers
+
+    def user_for(self, sid: str) -> Optional[int]:
+        return self._sid_user.get(sid)
+
+    def is_online(self, user_id: int) -> bool:
+        return bool(self._user_sids.get(user_id))
+
+    def online_users(self, user_ids: Optional[Iterable[int]] = None) -> Set[int]:
+        """Online users, optionally restricted to the given ids."""
+        with self._lock:
+            if user_ids is None:
+                return set(self._user_sids)
+            return {user_id for user_id in user_ids if self._user_sids.get(user_id)}
+
+    def connection_counts(self, user_ids: Optional[Iterable[int]] = None) -> Dict[int, int]:
+        """Open connections per user, optionally restricted to the given ids."""
+        with self._lock:
+            if user_ids is None:
+                return {user_id: len(sids) for user_id, sids in self._user_sids.items()}
+            return {user_id: len(self._user_sids.get(user_id, ())) for user_id in user_ids}
+
+    def last_seen(self, user_id: int) -> Optional[datetime]:
+        """When the user last connected or disconnected, if seen by this process."""
+        return self._last_seen.get(user_id)
+
+    def status(self, user_ids: Iterable[int]) -> Dict[int, Dict]:
+        """Online flag, connection count and last-seen time per user."""
+        with self._lock:
+            return {
+                user_id: {
+                    "online": bool(self._user_sids.get(user_id)),
+                    "connections": len(self._user_sids.get(user_id, ())),
+                    "last_seen": self._last_seen[user_id].isoformat() if user_id in self._last_seen else None
+                }
+                for user_id in user_ids
+            }
+
+    def update_typing(self, sender_id: int, receiver_id: int, is_typing: bool, now: Optional[float] = None) -> bool:
+        """
+        Record a typing event.
+
+        Returns:
+            True if it should be forwarded to the receiver: the state changed,
+            or the peer has not been refreshed for TYPING_REFRESH_SECONDS
+        """
+        now = time.monotonic() if now is None else now
+        key = (sender_id, receiver_id)
+        with self._lock:
+            state = self._typing.get(key)
+            if not is_typing:
+                return self._typing.pop(key, None) is not None
+            if state is None:
+                self._typing[key] = [now, now]
+                return True
+            state[0] = now
+            if now - state[1] >= TYPING_REFRESH_SECONDS:
+                state[1] = now
+                return True
+            return False
+
+    def expire_typing(self, now: Optional[float] = None) -> List[Tuple[int, int]]:
+        """Drop typing states that went quiet and return their (sender, receiver) pairs."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            expired = [key for key, state in self._typing.items() if now - state[0] >= TYPING_TIMEOUT_SECONDS]
+            for key in expired:
+                del self._typing[key]
+            return expired
+
+
+_registry: Optional[PresenceRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_presence() -> PresenceRegistry:
+    """Get the process-wide presence registry."""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = PresenceRegistry()
+    return _registry
+
+
+def presence_shared() -> bool:
+    """Whether connections are spread over several workers."""
+    return bool(SOCKETIO_MESSAGE_QUEUE)
+
+
+def _worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def publish_presence(db: Session, counts: Mapping[int, int], now: Optional[datetime] = None):
+    """
+    Write this worker's connection count for each user to user_presence.
+    Each (user, worker) row is only written by its own worker, so a plain
+    update-or-insert cannot race.
+    """
+    from models import UserPresence
+
+    now = now or datetime.utcnow()
+    worker_id = _worker_id()
+    for user_id, connections in counts.items():
+        updated = db.query(UserPresence).filter(
+            UserPresence.user_id == user_id,
+            UserPresence.worker_id == worker_id
+        ).update({"connections": connections, "heartbeat_at": now}, synchronize_session=False)
+        if not updated:
+            db.add(UserPresence(user_id=user_id, worker_id=worker_id, connections=connections, heartbeat_at=now))
+    db.commit()
+
+
+def sync_presence(user_ids: Optional[Iterable[int]] = None):
+    """
+    Publish this worker's connections from the in-memory registry: for the
+    given users after a connect/disconnect, or for everyone on a heartbeat,
+    which also zeroes rows for users no longer connected here and prunes
+    offline rows past PRESENCE_RETENTION_DAYS. Runs on a worker thread.
+    """
+    from database import SessionLocal
+    from models import UserPresence
+
+    registry = get_presence()
+    db = SessionLocal()
+    try:
+        now = datetime.utcnow()
+        counts = registry.connection_counts(user_ids)
+        if user_ids is None:
+            stale = db.query(UserPresence).filter(
+                UserPresence.worker_id == _worker_id(),
+                UserPresence.connections > 0
+            )
+            if counts:
+                stale = stale.filter(UserPresence.user_id.notin_(list(counts)))
+            stale.update({"connections": 0, "heartbeat_at": now}, synchronize_session=False)
+            db.query(UserPresence).filter(
+                UserPresence.heartbeat_at < now - timedelta(days=PRESENCE_RETENTION_DAYS)
+            ).delete(synchronize_session=False)
+        publish_presence(db, counts, now)
+    except Exception as e:
+        db.rollback()
+        logger.error(f"❌ Failed to publish presence: {e}")
+    finally:
+        db.close()
+
+
+def presence_status(db: Session, user_ids: Iterable[int]) -> Dict[int, Dict]:
+    """
+    Online flag, connection count and last-seen time per user. From memory
+    with a single worker; from user_presence across workers otherwise.
+    """
+    user_ids = list(user_ids)
+    if not presence_shared():
+        return get_presence().status(user_ids)
+
+    from models import UserPresence
+
+    statuses = {user_id: {"online": False, "connections": 0, "last_seen": None} for user_id in user_ids}
+    if not user_ids:
+        return statuses
+    cutoff = datetime.utcnow() - timedelta(seconds=PRESENCE_TTL_SECONDS)
+    live = case(
+        (and_(UserPresence.connections > 0, UserPresence.heartbeat_at >= cutoff), UserPresence.connections),
+        else_=0
+    )
+    rows = db.query(
+        UserPresence.user_id,
+        func.sum(live).label("connections"),
+        func.max(UserPresence.heartbeat_at).label("last_seen")
+    ).filter(UserPresence.user_id.in_(user_ids)).group_by(UserPresence.user_id).all()
+    for row in rows:
+        connections = int(row.connections or 0)
+        statuses[row.user_id] = {
+            "online": connections > 0,
+            "connections": connections,
+            "last_seen": row.last_seen.isoformat() if row.last_seen else None
+        }
+    return statuses
@@ -0,0 +1,242 @@
+"""
+Re-embedding Queue - keeps user and job embeddings fresh after edits
+SQLAlchemy change events on the fields that feed the embedding text enqueue
+the row id on commit; a background worker debounces bursts of edits and
+re-embeds the affected rows in batches
+"""
+
+import os
+import time
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, List, Set
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from models import User, Job
+from embedding_model import get_model, embedding_to_string
+from embedding_backfill import (
+    USER_SOURCE_COLUMNS, JOB_SOURCE_COLUMNS,
+    user_embedding_data, job_embedding_data, embedding_source_hash, embedding_model_tag
+)
+
+logger = logging.getLogger(__name__)
+
+# Wait this long after the first edit so a burst of saves is embedded once
+REEMBED_DEBOUNCE_SECONDS = float(os.getenv("REEMBED_DEBOUNCE_SECONDS", "2"))
+REEMBED_BATCH_SIZE = int(os.getenv("REEMBED_BATCH_SIZE", "64"))
+
+_PENDING_KEY = "reembed_pending"
+_KINDS = {
+    "users": (User, "profile_embedding", USER_SOURCE_COLUMNS, user_embedding_data),
+    "jobs": (Job, "job_embedding", JOB_SOURCE_COLUMNS, job_embedding_data),
+}
+
+
+class ReembedQueue:
+    """
+    Deduplicating queue of user/job ids whose embedding text changed.
+
+    Ids are held in sets, so repeated edits to the same row before the
+    worker runs collapse into a single re-embed.
+    """
+
+    def __init__(self, debounce: float = REEMBED_DEBOUNCE_SECONDS, batch_size: int = REEMBED_BATCH_SIZE):
+        self.debounce = debounce
+        self.batch_size = max(1, batch_size)
+        self._pending: Dict[str, Set[int]] = {kind: set() for kind in _KINDS}
+        self._condition = threading.Condition()
+        self._thread = None
+        self._stopping = False
+        self.processed = 0
+        self.skipped = 0
+        self.deferred = 0
+        self.failed = 0
+
+    def enqueue(self, kind: str, ids):
+        with self._condition:
+            self._pending[kind].update(ids)
+            self._ensure_started()
+            self._condition.notify()
+
+    def pending_count(self) -> int:
+        with self._condition:
+            return sum(len(ids) for ids in self._pending.values())
+
+    def _ensure_started(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="reembed-queue", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        """Flush what is queued and stop the worker."""
+        with self._condition:
+            if self._thread is None:
+                return
+            self._stopping = True
+            self._condition.notify()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _take_batch(self) -> Dict[str, List[int]]:
+        batch = {}
+        for kind, ids in self._pending.items():
+            taken = []
+            while ids and len(taken) < self.batch_size:
+                taken.append(ids.pop())
+            if taken:
+                batch[kind] = taken
+        return batch
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._stopping and not any(self._pending.values()):
+                    self._condition.wait()
+                if not any(self._pending.values()):
+                    return
+                stopping = self._stopping
+
+            if not stopping:
+                time.sleep(self.debounce)
+
+            while True:
+                with self._condition:
+                    batch = self._take_batch()
+                if not batch:
+                    break
+                for kind, ids in batch.items():
+                    try:
+                        self.process(kind, ids)
+                    except Exception as e:
+                        self.failed += len(ids)
+                        logger.error(f"Re-embedding {kind} {ids} failed: {e}")
+
+    def process(self, kind: str, ids: List[int]):
+        """
+        Re-embed the given rows in one encode call and one transaction.
+
+        Rows whose source text hash is unchanged are skipped. Updates go
+        through the ORM so the job index sync hooks see the new vectors.
+        Without a loaded model nothing is written: the rows keep their old
+        hash, so a backfill picks them up once the model is available.
+        """
+        entity, embedding_column, source_columns, to_data = _KINDS[kind]
+        model = get_model()
+        try:
+            model_tag = embedding_model_tag(model)
+        except RuntimeError as e:
+            self.deferred += len(ids)
+            logger.warning(f"Not re-embedding {len(ids)} {kind}: {e}")
+            return
+        prepare = model._prepare_user_text if kind == "users" else model._prepare_job_text
+
+        db = SessionLocal()
+        try:
+            rows = db.query(entity).filter(entity.id.in_(ids)).all()
+            stale, texts = [], []
+            for row in rows:
+                text = prepare(to_data(row))
+                source_hash = embedding_source_hash(model_tag, text)
+                if row.embedding_source_hash == source_hash and getattr(row, embedding_column) is not None:
+                    self.skipped += 1
+                    continue
+                stale.append((row, source_hash))
+                texts.append(text)
+            if not stale:
+                return
+
+            embeddings = model.encode_texts(texts)
+            now = datetime.utcnow()
+            for (row, source_hash), embedding in zip(stale, embeddings):
+                setattr(row, embedding_column, embedding_to_string(embedding))
+                row.embedding_source_hash = source_hash
+                row.embedding_updated_at = now
+            db.commit()
+            self.processed += len(stale)
+            logger.info(f"Re-embedded {len(stale)} {kind}")
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "pending": self.pending_count(),
+            "processed": self.processed,
+            "skipped": self.skipped,
+            "deferred": self.deferred,
+            "failed": self.failed
+        }
+
+
+_queue_instance = None
+_queue_lock = threading.Lock()
+
+
+def get_reembed_queue() -> ReembedQueue:
+    """Get or create the singleton re-embedding queue."""
+    global _queue_instance
+    if _queue_instance is None:
+        with _queue_lock:
+            if _queue_instance is None:
+                _queue_instance = ReembedQueue()
+    return _queue_instance
+
+
+def stop_reembed_queue():
+    if _queue_instance is not None:
+        _queue_instance.stop()
+
+
+# Record ids whose embedding text changed during flush; hand them to the
+# queue only once the transaction commits.
+def _record_change(kind: str, target, source_columns: List[str], inserted: bool):
+    session = Session.object_session(target)
+    if session is None:
+        return
+    if not inserted:
+        state = inspect(target)
+        if not any(state.attrs[column].history.has_changes() for column in source_columns):
+            return
+    session.info.setdefault(_PENDING_KEY, {}).setdefault(kind, set()).add(target.id)
+
+
+@event.listens_for(User, "after_insert")
+def _user_inserted(mapper, connection, target):
+    _record_change("users", target, USER_SOURCE_COLUMNS, inserted=True)
+
+
+@event.listens_for(User, "after_update")
+def _user_updated(mapper, connection, target):
+    _record_change("users", target, USER_SOURCE_COLUMNS, inserted=False)
+
+
+@event.listens_for(Job, "after_insert")
+def _job_inserted(mapper, connection, target):
+    _record_change("jobs", target, JOB_SOURCE_COLUMNS, inserted=True)
+
+
+@event.listens_for(Job, "after_update")
+def _job_updated(mapper, connection, target):
+    _record_change("jobs", target, JOB_SOURCE_COLUMNS, inserted=False)
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _enqueue_changes(session: Session):
+    pending = session.info.pop(_PENDING_KEY, None)
+    if not pending:
+        return
+    queue = get_reembed_queue()
+    for kind, ids in pending.items():
+        queue.enqueue(kind, ids)
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _discard_changes(session: Session):
+    session.info.pop(_PENDING_KEY, None)
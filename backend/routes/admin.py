@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, BackgroundTasks
 from sqlalchemy.orm import Session
 from sqlalchemy import func, desc, text
 from typing import List, Optional
@@ -8,7 +8,10 @@ from datetime import datetime, timedelta
 from database import get_db
 from models import User, Job, Application, Message, Review, AdminMessage
 from auth import get_admin_user
-from sqlalchemy import or_, union_all
+from embedding_backfill import run_backfill_job, get_backfill_status, BACKFILL_BATCH_SIZE
+from sqlalchemy import or_, and_, union_all, case, select
+from conversation_summary import user_message_totals, refresh_conversation
+from presence import presence_status
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 
@@ -92,6 +95,8 @@ class ConversationAdminResponse(BaseModel):
     last_message_time: Optional[datetime]
     unread_count: int
     total_messages: int
+    is_online: bool = False
+    last_seen: Optional[datetime] = None
 
 # Dashboard Statistics
 @router.get("/dashboard/stats", response_model=DashboardStats)
@@ -434,99 +439,85 @@ async def get_all_conversations(
 ):
     """Get all conversations for admin monitoring"""
     
-    # Get all users who have sent or received messages (both regular and admin messages)
-    regular_users = db.query(Message.sender_id).distinct().union(
-        db.query(Message.receiver_id).distinct()
+    # Regular messages: per-user totals from the materialized conversations table
+    regular = user_message_totals(db)
+    
+    # Admin messages: one grouped pass per side instead of queries per user
+    admin_sides = union_all(
+        select(
+            AdminMessage.admin_id.label("user_id"),
+            AdminMessage.id.label("message_id"),
+            AdminMessage.created_at.label("created_at"),
+            # Messages an admin sent to themselves only appear on this side
+            case((and_(AdminMessage.receiver_id == AdminMessage.admin_id, AdminMessage.is_read == False), 1), else_=0).label("unread")
+        ),
+        select(
+            AdminMessage.receiver_id.label("user_id"),
+            AdminMessage.id.label("message_id"),
+            AdminMessage.created_at.label("created_at"),
+            case((AdminMessage.is_read == False, 1), else_=0).label("unread")
+        ).where(AdminMessage.receiver_id != AdminMessage.admin_id)
     ).subquery()
-    
-    admin_users = db.query(AdminMessage.admin_id).distinct().union(
-        db.query(AdminMessage.receiver_id).distinct()
+    admin_ranked = db.query(
+        admin_sides.c.user_id,
+        admin_sides.c.message_id,
+        admin_sides.c.created_at,
+        func.count().over(partition_by=admin_sides.c.user_id).label("total"),
+        func.sum(admin_sides.c.unread).over(partition_by=admin_sides.c.user_id).label("unread_total"),
+        func.row_number().over(
+            partition_by=admin_sides.c.user_id,
+            order_by=(admin_sides.c.created_at.desc(), admin_sides.c.message_id.desc())
+        ).label("rank")
     ).subquery()
+    admin = {
+        row.user_id: row
+        for row in db.query(admin_ranked).filter(admin_ranked.c.rank == 1).all()
+    }
     
-    users_with_messages = db.query(User).filter(
-        (User.id.in_(regular_users)) | (User.id.in_(admin_users))
-    ).all()
+    user_ids = set(regular) | set(admin)
+    users = db.query(User).filter(User.id.in_(user_ids)).all() if user_ids else []
+    
+    # Pick each user's latest message (regular wins ties), then load contents in bulk
+    latest = {}
+    for user_id in user_ids:
+        regular_stats = regular.get(user_id)
+        admin_stats = admin.get(user_id)
+        if regular_stats and regular_stats["last_message_at"] and (
+            not admin_stats or regular_stats["last_message_at"] >= admin_stats.created_at
+        ):
+            latest[user_id] = ("regular", regular_stats["last_message_id"], regular_stats["last_message_at"])
+        elif admin_stats:
+            latest[user_id] = ("admin", admin_stats.message_id, admin_stats.created_at)
+    
+    regular_ids = [message_id for kind, message_id, _ in latest.values() if kind == "regular"]
+    admin_ids = [message_id for kind, message_id, _ in latest.values() if kind == "admin"]
+    contents = {
+        ("regular", message_id): content
+        for message_id, content in (db.query(Message.id, Message.content).filter(Message.id.in_(regular_ids)).all() if regular_ids else [])
+    }
+    contents.update({
+        ("admin", message_id): content
+        for message_id, content in (db.query(AdminMessage.id, AdminMessage.content).filter(AdminMessage.id.in_(admin_ids)).all() if admin_ids else [])
+    })
     
+    # Presence comes from the Socket.IO registry, shared across workers
+    statuses = presence_status(db, user_ids)
     conversations = []
-    for user in users_with_messages:
-        # Get last regular message involving this user
-        last_regular_message = db.query(Message).filter(
-            (Message.sender_id == user.id) | (Message.receiver_id == user.id)
-        ).order_by(Message.created_at.desc()).first()
-        
-        # Get last admin message involving this user (as sender or receiver)
-        last_admin_message_sent = db.query(AdminMessage).filter(
-            AdminMessage.admin_id == user.id
-        ).order_by(AdminMessage.created_at.desc()).first()
-        
-        last_admin_message_received = db.query(AdminMessage).filter(
-            AdminMessage.receiver_id == user.id
-        ).order_by(AdminMessage.created_at.desc()).first()
-        
-        # Determine the last message overall
-        last_message = None
-        if last_regular_message and last_admin_message_sent and last_admin_message_received:
-            # Compare timestamps to find the most recent
-            latest_time = max(
-                last_regular_message.created_at,
-                last_admin_message_sent.created_at,
-                last_admin_message_received.created_at
-            )
-            if latest_time == last_regular_message.created_at:
-                last_message = last_regular_message
-            elif latest_time == last_admin_message_sent.created_at:
-                last_message = last_admin_message_sent
-            else:
-                last_message = last_admin_message_received
-        elif last_regular_message and last_admin_message_sent:
-            latest_time = max(last_regular_message.created_at, last_admin_message_sent.created_at)
-            last_message = last_regular_message if latest_time == last_regular_message.created_at else last_admin_message_sent
-        elif last_regular_message and last_admin_message_received:
-            latest_time = max(last_regular_message.created_at, last_admin_message_received.created_at)
-            last_message = last_regular_message if latest_time == last_regular_message.created_at else last_admin_message_received
-        elif last_admin_message_sent and last_admin_message_received:
-            latest_time = max(last_admin_message_sent.created_at, last_admin_message_received.created_at)
-            last_message = last_admin_message_sent if latest_time == last_admin_message_sent.created_at else last_admin_message_received
-        elif last_regular_message:
-            last_message = last_regular_message
-        elif last_admin_message_sent:
-            last_message = last_admin_message_sent
-        elif last_admin_message_received:
-            last_message = last_admin_message_received
-        
-        # Count unread regular messages sent TO this user
-        unread_regular = db.query(Message).filter(
-            Message.receiver_id == user.id,
-            Message.is_read == False
-        ).count()
-        
-        # Count unread admin messages sent TO this user
-        unread_admin = db.query(AdminMessage).filter(
-            AdminMessage.receiver_id == user.id,
-            AdminMessage.is_read == False
-        ).count()
-        
-        unread_count = unread_regular + unread_admin
-        
-        # Count total messages involving this user (both regular and admin)
-        total_regular = db.query(Message).filter(
-            (Message.sender_id == user.id) | (Message.receiver_id == user.id)
-        ).count()
-        
-        total_admin = db.query(AdminMessage).filter(
-            (AdminMessage.admin_id == user.id) | (AdminMessage.receiver_id == user.id)
-        ).count()
-        
-        total_messages = total_regular + total_admin
+    for user in users:
+        regular_stats = regular.get(user.id, {})
+        admin_stats = admin.get(user.id)
+        kind, message_id, last_time = latest.get(user.id, (None, None, None))
         
         conversations.append(ConversationAdminResponse(
             user_id=user.id,
             user_name=user.full_name or user.username,
             user_email=user.email,
-            last_message=last_message.content if last_message else None,
-            last_message_time=last_message.created_at if last_message else None,
-            unread_count=unread_count,
-            total_messages=total_messages
+            last_message=contents.get((kind, message_id)),
+            last_message_time=last_time,
+            unread_count=regular_stats.get("unread_count", 0) + (int(admin_stats.unread_total or 0) if admin_stats else 0),
+            total_messages=regular_stats.get("total_messages", 0) + (admin_stats.total if admin_stats else 0),
+            is_online=statuses[user.id]["online"],
+            last_seen=statuses[user.id]["last_seen"]
         ))
     
     # Sort by last message time (most recent first)
@@ -724,6 +715,8 @@ async def delete_message(
         )
     
     db.delete(message)
+    db.flush()
+    refresh_conversation(db, message.sender_id, message.receiver_id)
     db.commit()
     
     return {"message": "Message deleted successfully"}
@@ -903,3 +896,71 @@ async def get_system_health(
         "total_users": total_users,
         "timestamp": datetime.utcnow()
     }
+
+# Embedding Backfill
+class EmbeddingBackfillRequest(BaseModel):
+    kinds: List[str] = ["jobs", "users"]
+    batch_size: int = BACKFILL_BATCH_SIZE
+    force: bool = False
+    workers: int = 1
+
+@router.post("/embeddings/backfill")
+async def start_embedding_backfill(
+    request: EmbeddingBackfillRequest,
+    background_tasks: BackgroundTasks,
+    current_user: User = Depends(get_admin_user)
+):
+    """Re-embed users/jobs whose text changed (or everything with force) in the background (admin only)"""
+    
+    invalid = [kind for kind in request.kinds if kind not in ("jobs", "users")]
+    if invalid or not request.kinds:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"kinds must be a non-empty list of 'jobs' and/or 'users', got {request.kinds}"
+        )
+    if get_backfill_status()["running"]:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="An embedding backfill is already running"
+        )
+    
+    # Never load the model on the event loop; a cold worker starts warming it up instead
+    from embedding_model import get_model_if_ready
+    model = get_model_if_ready()
+    if model is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Embedding model is warming up, please retry shortly",
+            headers={"Retry-After": "5"}
+        )
+    if model.model is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Embedding model is not loaded ({model.load_error}); fallback embeddings are never stored"
+        )
+    
+    background_tasks.add_task(run_backfill_job, request.kinds, request.batch_size, request.force, max(1, request.workers))
+    return {"message": "Embedding backfill started", "kinds": request.kinds}
+
+@router.get("/embeddings/backfill")
+async def get_embedding_backfill_status(
+    current_user: User = Depends(get_admin_user)
+):
+    """Progress of the most recent embedding backfill (admin only)"""
+    
+    return get_backfill_status()
+
+# Notification Retention
+@router.get("/notifications/retention")
+async def get_notification_retention_status(
+    current_user: User = Depends(get_admin_user)
+):
+    """Retention settings and rows pruned by the most recent run (admin only)"""
+    from scheduler import last_retention_run, NOTIFICATION_TTL_DAYS, NOTIFICATION_UNREAD_TTL_DAYS, NOTIFICATION_ARCHIVE_ENABLED
+    
+    return {
+        "ttl_days": NOTIFICATION_TTL_DAYS,
+        "unread_ttl_days": NOTIFICATION_UNREAD_TTL_DAYS,
+        "archive_enabled": NOTIFICATION_ARCHIVE_ENABLED,
+        "last_run": last_retention_run or None
+    }
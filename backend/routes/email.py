@@ -202,9 +202,10 @@ def get_pending_emails(
             detail="Only admins can view queue"
         )
     
+    # Includes emails a worker has claimed and is sending right now
     pending = db.query(EmailQueue).filter(
-        EmailQueue.status.in_(["pending", "retry"])
-    ).order_by(EmailQueue.created_at.asc()).limit(limit).all()
+        EmailQueue.status.in_(["pending", "retry", "sending"])
+    ).order_by(EmailQueue.next_attempt_at.asc()).limit(limit).all()
     
     return [
         {
@@ -215,6 +216,8 @@ def get_pending_emails(
             "status": email.status,
             "retry_count": email.retry_count,
             "created_at": email.created_at.isoformat(),
+            "next_attempt_at": email.next_attempt_at.isoformat() if email.next_attempt_at else None,
+            "claimed_by": email.claimed_by,
             "error": email.error_message
         }
         for email in pending
@@ -289,6 +292,45 @@ def cancel_pending_email(
         "status": "cancelled"
     }
 
+@router.post("/queue/{email_id}/requeue", response_model=dict)
+def requeue_dead_letter_email(
+    email_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Send a dead-lettered email again, with a fresh set of attempts (admin only)"""
+    if not current_user.is_admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only admins can requeue emails"
+        )
+    
+    email = db.query(EmailQueue).filter(EmailQueue.id == email_id).first()
+    if not email:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Email not found in queue"
+        )
+    
+    if email.status != "dead_letter":
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Cannot requeue email with status '{email.status}'. Only dead-lettered emails can be requeued."
+        )
+    
+    email.status = "pending"
+    email.retry_count = 0
+    email.next_attempt_at = datetime.utcnow()
+    db.commit()
+    
+    logger.info(f"📧 Email requeued by {current_user.email}: ID {email_id}, recipient {email.to}")
+    
+    return {
+        "message": f"Email to {email.to} has been requeued",
+        "email_id": email_id,
+        "status": "pending"
+    }
+
 @router.get("/queue/remaining", response_model=dict)
 def get_remaining_emails(
     db: Session = Depends(get_db),
@@ -304,9 +346,9 @@ def get_remaining_emails(
     now = datetime.utcnow()
     today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
     
-    # Get all unsent emails (pending, retry, and failed from today that might be retried)
+    # Get all unsent emails (pending, retry, being sent, and dead letters from today that might be requeued)
     remaining = db.query(EmailQueue).filter(
-        EmailQueue.status.in_(["pending", "retry", "failed"]),
+        EmailQueue.status.in_(["pending", "retry", "sending", "dead_letter"]),
         EmailQueue.created_at >= today_start
     ).order_by(EmailQueue.created_at.asc()).all()
     
@@ -344,7 +386,7 @@ def clear_all_remaining_emails(
     
     # Cancel all unsent emails from today
     cancelled_count = db.query(EmailQueue).filter(
-        EmailQueue.status.in_(["pending", "retry", "failed"]),
+        EmailQueue.status.in_(["pending", "retry", "dead_letter"]),
         EmailQueue.created_at >= today_start
     ).update({"status": "cancelled"})
     
@@ -10,14 +10,50 @@ from sqlalchemy import and_
 from database import get_db
 from models import User, Job, Notification
 from auth import get_current_user
-from routes.notification_helpers import create_job_recommendation_notification
-from embedding_model import string_to_embedding, get_model
+from routes.notification_helpers import job_recommendation_notification_fields, create_notifications_bulk
+from embedding_model import string_to_embedding
+from embedding_index import get_job_index
 from datetime import datetime, timedelta
 import json
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 
 router = APIRouter(prefix="/api/recommendations", tags=["recommendations"])
 
+# Minimum similarity for a job to be recommended
+MATCH_THRESHOLD = 0.4
+
+
+def score_open_jobs(
+    db: Session,
+    user_embedding,
+    limit: int,
+    now: Optional[datetime] = None,
+    min_score: float = MATCH_THRESHOLD
+) -> List[Tuple[Job, float]]:
+    """
+    Rank open, non-expired jobs against a user embedding using the job index.
+    
+    Args:
+        db: Database session
+        user_embedding: Decoded user profile embedding
+        limit: Maximum number of matches to return
+        now: Reference time for deadline filtering (defaults to utcnow)
+        min_score: Minimum similarity to include
+        
+    Returns:
+        List of (Job, similarity) pairs sorted by similarity (descending)
+    """
+    index = get_job_index(db)
+    top = index.top_k(user_embedding, limit, min_score=min_score, now=now or datetime.utcnow())
+    if not top:
+        return []
+    
+    jobs_by_id = {
+        job.id: job
+        for job in db.query(Job).filter(Job.id.in_([job_id for job_id, _ in top])).all()
+    }
+    return [(jobs_by_id[job_id], score) for job_id, score in top if job_id in jobs_by_id]
+
 
 @router.get("/daily")
 async def get_daily_recommendations(
@@ -71,7 +107,6 @@ async def get_daily_recommendations(
         print(f"📌 Jobs already recommended today: {existing_job_ids}")
         
         # Get new recommendations
-        model = get_model()
         user_embedding = string_to_embedding(current_user.profile_embedding)
         
         if user_embedding.size == 0:
@@ -80,46 +115,29 @@ async def get_daily_recommendations(
                 detail="Invalid user embedding"
             )
         
-        # Get all open jobs with embeddings
-        jobs = db.query(Job).filter(
-            and_(
-                Job.job_embedding.isnot(None),
-                Job.status == "open",
-                Job.deadline.is_(None) | (Job.deadline > now)  # Not expired
-            )
-        ).all()
-        
-        print(f"📌 Found {len(jobs)} open jobs to match against")
-        
-        matches = []
-        for job in jobs:
-            job_embedding = string_to_embedding(job.job_embedding)
-            if job_embedding.size == 0:
-                continue
-            
-            similarity = model.calculate_similarity(job_embedding, user_embedding)
-            
-            # Only include matches above 40% threshold
-            if similarity >= 0.4:
-                matches.append({
-                    "job_id": job.id,
-                    "title": job.title,
-                    "description": job.description[:200] + "..." if len(job.description) > 200 else job.description,
-                    "company": job.creator.company_name if job.creator else "Unknown",
-                    "location": job.location,
-                    "job_type": job.job_type,
-                    "category": job.category,
-                    "budget": job.budget,
-                    "budget_min": job.budget_min,
-                    "budget_max": job.budget_max,
-                    "budget_currency": job.budget_currency,
-                    "similarity_score": round(similarity, 3),
-                    "match_percentage": int(similarity * 100)
-                })
-        
-        # Sort by similarity score (descending)
-        matches.sort(key=lambda x: x['similarity_score'], reverse=True)
-        matches = matches[:limit]
+        # Score all open jobs in one pass over the job index
+        scored = score_open_jobs(db, user_embedding, limit, now=now)
+        
+        print(f"📌 Matched against {len(get_job_index())} indexed open jobs")
+        
+        matches = [
+            {
+                "job_id": job.id,
+                "title": job.title,
+                "description": job.description[:200] + "..." if len(job.description) > 200 else job.description,
+                "company": job.creator.company_name if job.creator else "Unknown",
+                "location": job.location,
+                "job_type": job.job_type,
+                "category": job.category,
+                "budget": job.budget,
+                "budget_min": job.budget_min,
+                "budget_max": job.budget_max,
+                "budget_currency": job.budget_currency,
+                "similarity_score": round(similarity, 3),
+                "match_percentage": int(similarity * 100)
+            }
+            for job, similarity in scored
+        ]
         
         print(f"✅ Generated {len(matches)} new recommendations")
         
@@ -146,18 +164,10 @@ async def get_daily_recommendations(
             jobs_to_create = new_job_ids - existing_job_ids
             if jobs_to_create:
                 print(f"✨ Creating new notifications for jobs: {jobs_to_create}")
-                for match in matches:
-                    if match['job_id'] in jobs_to_create:
-                        try:
-                            create_job_recommendation_notification(
-                                db=db,
-                                user_id=current_user.id,
-                                job_title=match['title'],
-                                job_id=match['job_id'],
-                                match_score=match['similarity_score']
-                            )
-                        except Exception as e:
-                            print(f"❌ Error creating recommendation notification: {e}")
+                create_notifications_bulk(db, [
+                    job_recommendation_notification_fields(current_user.id, match['title'], match['job_id'], match['similarity_score'])
+                    for match in matches if match['job_id'] in jobs_to_create
+                ], commit=False)
             
             db.commit()
         else:
@@ -224,35 +234,17 @@ async def force_refresh_recommendations(
                 pass
         
         # Get new recommendations
-        model = get_model()
         user_embedding = string_to_embedding(current_user.profile_embedding)
         
-        now = datetime.utcnow()
-        jobs = db.query(Job).filter(
-            and_(
-                Job.job_embedding.isnot(None),
-                Job.status == "open",
-                Job.deadline.is_(None) | (Job.deadline > now)
-            )
-        ).all()
-        
-        matches = []
-        for job in jobs:
-            job_embedding = string_to_embedding(job.job_embedding)
-            if job_embedding.size == 0:
-                continue
-            
-            similarity = model.calculate_similarity(job_embedding, user_embedding)
-            
-            if similarity >= 0.4:
-                matches.append({
-                    "job_id": job.id,
-                    "title": job.title,
-                    "similarity_score": round(similarity, 3),
-                    "match_percentage": int(similarity * 100)
-                })
-        
-        matches.sort(key=lambda x: x['similarity_score'], reverse=True)
+        matches = [
+            {
+                "job_id": job.id,
+                "title": job.title,
+                "similarity_score": round(similarity, 3),
+                "match_percentage": int(similarity * 100)
+            }
+            for job, similarity in score_open_jobs(db, user_embedding, 10)
+        ]
         new_job_ids = {match['job_id'] for match in matches[:10]}
         
         # Archive old recommendations not in new set
@@ -266,18 +258,10 @@ async def force_refresh_recommendations(
                 pass
         
         # Create new recommendations
-        for match in matches[:10]:
-            if match['job_id'] not in existing_job_ids:
-                try:
-                    create_job_recommendation_notification(
-                        db=db,
-                        user_id=current_user.id,
-                        job_title=match['title'],
-                        job_id=match['job_id'],
-                        match_score=match['similarity_score']
-                    )
-                except Exception as e:
-                    print(f"❌ Error: {e}")
+        create_notifications_bulk(db, [
+            job_recommendation_notification_fields(current_user.id, match['title'], match['job_id'], match['similarity_score'])
+            for match in matches[:10] if match['job_id'] not in existing_job_ids
+        ], commit=False)
         
         db.commit()
         
@@ -416,7 +400,6 @@ async def trigger_daily_recommendations(
         print(f"📌 Found {len(existing_today)} existing recommendations from today")
         
         # Get new recommendations
-        model = get_model()
         user_embedding = string_to_embedding(current_user.profile_embedding)
         
         if user_embedding.size == 0:
@@ -425,44 +408,25 @@ async def trigger_daily_recommendations(
                 detail="Invalid user embedding"
             )
         
-        # Get all open jobs with embeddings
-        jobs = db.query(Job).filter(
-            and_(
-                Job.job_embedding.isnot(None),
-                Job.status == "open",
-                Job.deadline.is_(None) | (Job.deadline > now)
-            )
-        ).all()
-        
-        print(f"📌 Found {len(jobs)} open jobs to match against")
-        
-        matches = []
-        for job in jobs:
-            job_embedding = string_to_embedding(job.job_embedding)
-            if job_embedding.size == 0:
-                continue
-            
-            similarity = model.calculate_similarity(job_embedding, user_embedding)
-            
-            if similarity >= 0.4:
-                matches.append({
-                    "job_id": job.id,
-                    "title": job.title,
-                    "description": job.description[:200] + "..." if len(job.description) > 200 else job.description,
-                    "company": job.creator.company_name if job.creator else "Unknown",
-                    "location": job.location,
-                    "job_type": job.job_type,
-                    "category": job.category,
-                    "budget": job.budget,
-                    "budget_min": job.budget_min,
-                    "budget_max": job.budget_max,
-                    "budget_currency": job.budget_currency,
-                    "similarity_score": round(similarity, 3),
-                    "match_percentage": int(similarity * 100)
-                })
-        
-        matches.sort(key=lambda x: x['similarity_score'], reverse=True)
-        matches = matches[:5]
+        # Score all open jobs in one pass over the job index
+        matches = [
+            {
+                "job_id": job.id,
+                "title": job.title,
+                "description": job.description[:200] + "..." if len(job.description) > 200 else job.description,
+                "company": job.creator.company_name if job.creator else "Unknown",
+                "location": job.location,
+                "job_type": job.job_type,
+                "category": job.category,
+                "budget": job.budget,
+                "budget_min": job.budget_min,
+                "budget_max": job.budget_max,
+                "budget_currency": job.budget_currency,
+                "similarity_score": round(similarity, 3),
+                "match_percentage": int(similarity * 100)
+            }
+            for job, similarity in score_open_jobs(db, user_embedding, 5, now=now)
+        ]
         
         print(f"✅ Generated {len(matches)} new recommendations")
         
@@ -472,21 +436,10 @@ async def trigger_daily_recommendations(
         
         if jobs_to_create:
             print(f"✨ Creating new notifications for jobs: {jobs_to_create}")
-            for match in matches:
-                if match['job_id'] in jobs_to_create:
-                    try:
-                        create_job_recommendation_notification(
-                            db=db,
-                            user_id=current_user.id,
-                            job_title=match['title'],
-                            job_id=match['job_id'],
-                            match_score=match['similarity_score']
-                        )
-                        created_count += 1
-                    except Exception as e:
-                        print(f"❌ Error creating recommendation notification: {e}")
-            
-            db.commit()
+            created_count = create_notifications_bulk(db, [
+                job_recommendation_notification_fields(current_user.id, match['title'], match['job_id'], match['similarity_score'])
+                for match in matches if match['job_id'] in jobs_to_create
+            ])
         
         return {
             "success": True,
@@ -609,49 +562,11 @@ def get_user_job_recommendations(db: Session, user_id: int, limit: int = 5) -> L
             print(f"⚠️  User {user_id} has invalid embedding")
             return []
         
-        # Get all open jobs with embeddings
-        now = datetime.utcnow()
-        jobs = db.query(Job).filter(
-            and_(
-                Job.job_embedding.isnot(None),
-                Job.status == "open",
-                Job.deadline.is_(None) | (Job.deadline > now)
-            )
-        ).all()
-        
-        if not jobs:
-            print(f"⚠️  No open jobs found for user {user_id}")
-            return []
-        
-        # Calculate matches
-        model = get_model()
-        matches = []
-        
-        for job in jobs:
-            try:
-                job_embedding = string_to_embedding(job.job_embedding)
-                if job_embedding.size == 0:
-                    continue
-                
-                similarity = model.calculate_similarity(job_embedding, user_embedding)
-                
-                # Only include matches above 40% threshold
-                if similarity >= 0.4:
-                    matches.append({
-                        "job": job,
-                        "similarity_score": round(similarity, 3),
-                        "match_percentage": int(similarity * 100)
-                    })
-            except Exception as e:
-                print(f"⚠️  Error processing job {job.id} for user {user_id}: {e}")
-                continue
-        
-        # Sort by similarity score (descending) and take top N
-        matches.sort(key=lambda x: x['similarity_score'], reverse=True)
-        matches = matches[:limit]
+        # Score all open jobs in one pass over the job index
+        matches = score_open_jobs(db, user_embedding, limit)
         
         # Return just the job objects
-        recommended_jobs = [match['job'] for match in matches]
+        recommended_jobs = [job for job, _ in matches]
         print(f"✅ Found {len(recommended_jobs)} recommendations for user {user_id}")
         
         return recommended_jobs
@@ -212,89 +212,81 @@ def semantic_search_jobs(
         List of jobs with similarity scores, sorted by relevance
     """
     try:
-        from embedding_model import string_to_embedding, get_model, embedding_to_string
-        import numpy as np
+        from embedding_model import get_model_if_ready
+        from embedding_index import get_job_index
         
         query = search_request.query.strip()
         if not query:
             # If no query, return empty results
             return []
         
-        # Get the embedding model
-        model = get_model()
-        
-        # Convert query to embedding (directly encode, normalize for similarity)
-        from sklearn.preprocessing import normalize
-        query_vec = model.model.encode(query, convert_to_numpy=True, normalize_embeddings=True)
-        query_embedding = query_vec
-        
-        if query_embedding.size == 0:
-            return []
+        # Get the embedding model without waiting for it to load
+        model = get_model_if_ready()
+        
+        if model is None:
+            # Model still warming up: degrade to keyword matching (scores are 0.0)
+            search_term = f"%{query}%"
+            keyword_ids = db.query(Job.id).filter(
+                Job.status == "open",
+                (Job.title.ilike(search_term)) |
+                (Job.description.ilike(search_term)) |
+                (Job.skills_required.ilike(search_term))
+            ).order_by(Job.created_at.desc()).limit(search_request.limit).all()
+            hits = [(job_id, 0.0) for job_id, in keyword_ids]
+            print(f"⏳ Embedding model warming up, keyword fallback for '{query}'")
+        else:
+            # Convert query to embedding (cached, so popular searches skip the transformer)
+            query_embedding = model.embed_query(query)
+            
+            if len(query_embedding) == 0:
+                return []
+            
+            # Top-k over open jobs via the job index (IVF for large catalogues)
+            hits = get_job_index(db).search(
+                query_embedding,
+                search_request.limit,
+                min_score=search_request.min_score
+            )
         
-        # Get all open jobs with embeddings
-        jobs = db.query(Job).filter(
-            (Job.job_embedding.isnot(None)) &
-            (Job.status == "open")
-        ).all()
+        jobs_by_id = {
+            job.id: job
+            for job in db.query(Job).filter(Job.id.in_([job_id for job_id, _ in hits])).all()
+        } if hits else {}
         
         results = []
-        
-        for job in jobs:
-            try:
-                # Handle both string and numpy array embeddings
-                if isinstance(job.job_embedding, str):
-                    # If it's a string, convert it back to numpy array
-                    job_embedding = string_to_embedding(job.job_embedding)
-                else:
-                    # If it's already a numpy array, use it directly
-                    job_embedding = job.job_embedding
-                
-                if job_embedding.size == 0:
-                    continue
-                
-                # Calculate cosine similarity
-                similarity = model.calculate_similarity(job_embedding, query_embedding)
-                
-                # Only include if similarity is above threshold
-                if similarity >= search_request.min_score:
-                    # Serialize job to dictionary
-                    job_dict = {
-                        "id": job.id,
-                        "title": job.title,
-                        "description": job.description,
-                        "budget": job.budget,
-                        "budget_min": job.budget_min,
-                        "budget_max": job.budget_max,
-                        "budget_currency": job.budget_currency,
-                        "category": job.category,
-                        "skills_required": job.skills_required,
-                        "experience_required": job.experience_required,
-                        "qualifications": job.qualifications,
-                        "responsibilities": job.responsibilities,
-                        "benefits": job.benefits,
-                        "job_type": job.job_type,
-                        "location": job.location,
-                        "is_remote": job.is_remote,
-                        "deadline": job.deadline.isoformat() if job.deadline else None,
-                        "status": job.status,
-                        "creator_id": job.creator_id,
-                        "created_at": job.created_at.isoformat(),
-                        "updated_at": job.updated_at.isoformat(),
-                    }
-                    
-                    results.append({
-                        "job": job_dict,
-                        "similarity_score": float(similarity)
-                    })
-            except Exception as e:
-                print(f"Error processing job {job.id}: {e}")
+        for job_id, similarity in hits:
+            job = jobs_by_id.get(job_id)
+            if job is None:
                 continue
-        
-        # Sort by similarity score (descending)
-        results.sort(key=lambda x: x["similarity_score"], reverse=True)
-        
-        # Limit results
-        results = results[:search_request.limit]
+            # Serialize job to dictionary
+            job_dict = {
+                "id": job.id,
+                "title": job.title,
+                "description": job.description,
+                "budget": job.budget,
+                "budget_min": job.budget_min,
+                "budget_max": job.budget_max,
+                "budget_currency": job.budget_currency,
+                "category": job.category,
+                "skills_required": job.skills_required,
+                "experience_required": job.experience_required,
+                "qualifications": job.qualifications,
+                "responsibilities": job.responsibilities,
+                "benefits": job.benefits,
+                "job_type": job.job_type,
+                "location": job.location,
+                "is_remote": job.is_remote,
+                "deadline": job.deadline.isoformat() if job.deadline else None,
+                "status": job.status,
+                "creator_id": job.creator_id,
+                "created_at": job.created_at.isoformat(),
+                "updated_at": job.updated_at.isoformat(),
+            }
+            
+            results.append({
+                "job": job_dict,
+                "similarity_score": float(similarity)
+            })
         
         print(f"🔍 Semantic search for '{query}' found {len(results)} matching jobs")
         
@@ -725,25 +717,14 @@ def update_job(job_id: int, job_data: JobUpdate, current_user: User = Depends(ge
     if old_status == 'open' and new_status != 'open':
         try:
             from models import Notification
-            from sqlalchemy import and_
-            import json
             
             print(f"🔄 Job {job_id} status changed from '{old_status}' to '{new_status}', removing recommendations")
             
-            # Find and delete all job_recommendation notifications for this job
-            recommendations = db.query(Notification).filter(
+            # Single indexed bulk delete of this job's recommendations
+            deleted_count = db.query(Notification).filter(
+                Notification.related_job_id == job_id,
                 Notification.type == 'job_recommendation'
-            ).all()
-            
-            deleted_count = 0
-            for notif in recommendations:
-                try:
-                    data = json.loads(notif.data) if notif.data else {}
-                    if data.get('job_id') == job_id:
-                        db.delete(notif)
-                        deleted_count += 1
-                except:
-                    pass
+            ).delete(synchronize_session=False)
             
             if deleted_count > 0:
                 db.commit()
@@ -771,25 +752,14 @@ def delete_job(job_id: int, current_user: User = Depends(get_current_user), db:
     # Remove job recommendations before deleting job
     try:
         from models import Notification
-        from sqlalchemy import and_
-        import json
         
         print(f"🗑️  Deleting job {job_id}, removing all recommendations")
         
-        # Find and delete all job_recommendation notifications for this job
-        recommendations = db.query(Notification).filter(
+        # Single indexed bulk delete of this job's recommendations
+        deleted_count = db.query(Notification).filter(
+            Notification.related_job_id == job_id,
             Notification.type == 'job_recommendation'
-        ).all()
-        
-        deleted_count = 0
-        for notif in recommendations:
-            try:
-                data = json.loads(notif.data) if notif.data else {}
-                if data.get('job_id') == job_id:
-                    db.delete(notif)
-                    deleted_count += 1
-            except:
-                pass
+        ).delete(synchronize_session=False)
         
         if deleted_count > 0:
             print(f"✅ Removed {deleted_count} recommendations for job {job_id}")
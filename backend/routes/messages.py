@@ -1,17 +1,29 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Request
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Query, Response, BackgroundTasks
 from sqlalchemy.orm import Session
 from sqlalchemy import or_, func
 from database import get_db
 from models import Message, User, AdminMessage
 from schemas import MessageCreate, MessageResponse, AdminMessageCreate, BulkMessageRequest, AdminMessageResponse, BulkMessageResponse
 from auth import get_current_user, get_admin_user
-from typing import List
+from conversation_summary import (
+    conversation_summaries, record_message, mark_message_read, mark_conversation_read,
+    refresh_conversation, delete_conversation_messages, unread_total
+)
+from campaign_engine import recipient_filter, register_campaign, run_campaign, campaign_stats
+from pagination import paginate_keyset, page_headers, encode_cursor, MAX_PAGE_SIZE
+from presence import presence_status
+from typing import List, Optional
 import uuid
+import asyncio
 import re
+import os
 from datetime import datetime
 
 router = APIRouter(prefix="/api/messages", tags=["messages"])
 
+MESSAGE_PAGE_SIZE = int(os.getenv("MESSAGE_PAGE_SIZE", "100"))
+PRESENCE_MAX_USERS = 200
+
 @router.post("/", response_model=MessageResponse)
 async def send_message(msg_data: MessageCreate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     receiver = db.query(User).filter(User.id == msg_data.receiver_id).first()
@@ -39,6 +51,9 @@ async def send_message(msg_data: MessageCreate, current_user: User = Depends(get
     )
     
     db.add(db_message)
+    db.flush()
+    # Update the conversation row in the same transaction as the message
+    record_message(db, db_message)
     db.commit()
     db.refresh(db_message)
     
@@ -102,107 +117,70 @@ async def send_message(msg_data: MessageCreate, current_user: User = Depends(get
     
     return db_message
 
+def _message_page(response: Response, query, limit: Optional[int], before: Optional[str], after: Optional[str], newest_first: bool = False):
+    """Apply keyset paging to a message query and expose the neighbouring cursors as headers"""
+    if before and after:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Use either before or after, not both")
+    try:
+        if limit is None and (before or after):
+            limit = MESSAGE_PAGE_SIZE
+        messages, has_more = paginate_keyset(query, Message, limit, before=before, after=after, newest_first=newest_first)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    response.headers.update(page_headers(messages, has_more))
+    return messages
+
 @router.get("/conversations", response_model=list[dict])
-def get_conversations(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    """Get all conversations grouped by user"""
-    # Get all unique users the current user has messaged with
-    other_users = db.query(User).distinct().join(
-        Message,
-        or_(
-            (Message.sender_id == current_user.id) & (Message.receiver_id == User.id),
-            (Message.sender_id == User.id) & (Message.receiver_id == current_user.id)
-        )
-    ).all()
-    
-    conversations = []
-    for other_user in other_users:
-        # Get last message in this conversation
-        last_message = db.query(Message).filter(
-            or_(
-                (Message.sender_id == current_user.id) & (Message.receiver_id == other_user.id),
-                (Message.sender_id == other_user.id) & (Message.receiver_id == current_user.id)
-            )
-        ).order_by(Message.created_at.desc()).first()
-        
-        # Get unread count for this conversation
-        unread_count = db.query(Message).filter(
-            (Message.sender_id == other_user.id) &
-            (Message.receiver_id == current_user.id) &
-            (Message.is_read == False)  # type: ignore
-        ).count()
-        
-        conversations.append({
-            "id": f"{current_user.id}_{other_user.id}",  # Unique conversation ID
-            "user1_id": current_user.id,
-            "user2_id": other_user.id,
-            "user1": {
-                "id": current_user.id,
-                "full_name": current_user.full_name,
-                "profile_photo": current_user.profile_photo
-            },
-            "user2": {
-                "id": other_user.id,
-                "full_name": other_user.full_name,
-                "profile_photo": other_user.profile_photo
-            },
-            "last_message": last_message.content if last_message else None,
-            "last_message_at": last_message.created_at.isoformat() if last_message else None,
-            "unread_count": unread_count
-        })
-    
-    # Sort by last_message_at descending
-    conversations.sort(key=lambda x: x["last_message_at"] or "", reverse=True)
+def get_conversations(
+    limit: Optional[int] = Query(None, ge=1, le=100),
+    before: Optional[datetime] = Query(None, description="last_message_at of the last conversation on the previous page"),
+    before_id: Optional[int] = Query(None, description="last_message_id of the last conversation on the previous page"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Get all conversations grouped by user, most recent first"""
+    conversations = conversation_summaries(db, current_user, limit=limit, before=before, before_id=before_id)
+    statuses = presence_status(db, [conversation["user2_id"] for conversation in conversations])
+    for conversation in conversations:
+        conversation["user2"]["is_online"] = statuses[conversation["user2_id"]]["online"]
     return conversations
 
 @router.get("/unread/count")
 def get_unread_count(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    unread_count = db.query(Message).filter(
-        (Message.receiver_id == current_user.id) & (Message.is_read == False)  # type: ignore
-    ).count()
-    
-    return {"count": unread_count}
+    return {"count": unread_total(db, current_user.id)}
 
 @router.post("/conversations/{user_id}/mark-read")
 def mark_conversation_as_read(user_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     """Mark all messages in a conversation as read"""
-    messages = db.query(Message).filter(
-        (Message.sender_id == user_id) &
-        (Message.receiver_id == current_user.id) &
-        (Message.is_read == False)  # type: ignore
-    ).all()
-    
-    for message in messages:
-        message.is_read = True  # type: ignore
-    
+    marked = mark_conversation_read(db, current_user.id, user_id)
     db.commit()
-    return {"message": f"Marked {len(messages)} messages as read"}
+    return {"message": f"Marked {marked} messages as read"}
 
 @router.get("/conversations/{user_id}", response_model=list[MessageResponse])
-def get_conversation(user_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    """Get all messages in a conversation with a specific user"""
-    messages = db.query(Message).filter(
+def get_conversation(
+    user_id: int,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Page size; omit (with no cursor) for the whole history"),
+    before: Optional[str] = Query(None, description="Cursor: return messages older than this"),
+    after: Optional[str] = Query(None, description="Cursor: return messages newer than this"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Get messages in a conversation with a specific user, oldest first.
+    With limit and no cursor this is the latest page; follow X-Before-Cursor to
+    scroll back. Without limit or cursor the whole conversation is returned."""
+    query = db.query(Message).filter(
         or_(
             (Message.sender_id == current_user.id) & (Message.receiver_id == user_id),
             (Message.sender_id == user_id) & (Message.receiver_id == current_user.id)
         )
-    ).order_by(Message.created_at).all()
-    
-    return messages
+    )
+    return _message_page(response, query, limit, before, after)
 
 @router.delete("/conversations/{user_id}")
 def delete_conversation(user_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     """Delete all messages in a conversation"""
-    messages = db.query(Message).filter(
-        or_(
-            (Message.sender_id == current_user.id) & (Message.receiver_id == user_id),
-            (Message.sender_id == user_id) & (Message.receiver_id == current_user.id)
-        )
-    ).all()
-    
-    count = len(messages)
-    for message in messages:
-        db.delete(message)
-    
+    count = delete_conversation_messages(db, current_user.id, user_id)
     db.commit()
     return {"message": f"Deleted {count} messages"}
 
@@ -215,7 +193,9 @@ def mark_as_read(message_id: int, db: Session = Depends(get_db)):
             detail="Message not found"
         )
     
-    message.is_read = True  # type: ignore
+    if not message.is_read:
+        message.is_read = True  # type: ignore
+        mark_message_read(db, message)
     db.commit()
     return {"message": "Marked as read"}
 
@@ -237,31 +217,90 @@ def delete_message(message_id: int, current_user: User = Depends(get_current_use
         )
     
     db.delete(message)
+    db.flush()
+    refresh_conversation(db, message.sender_id, message.receiver_id)
     db.commit()
     return {"message": "Message deleted"}
 
 @router.get("/me/conversations", response_model=list[MessageResponse])
-def get_all_conversations(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    messages = db.query(Message).filter(
+def get_all_conversations(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Page size; omit (with no cursor) for the whole history"),
+    before: Optional[str] = Query(None, description="Cursor: return messages older than this"),
+    after: Optional[str] = Query(None, description="Cursor: return messages newer than this"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Get all the user's messages, newest first; pass limit (and cursors) to page"""
+    query = db.query(Message).filter(
         or_(
             Message.sender_id == current_user.id,
             Message.receiver_id == current_user.id
         )
-    ).order_by(Message.created_at.desc()).all()
-    
-    return messages
+    )
+    return _message_page(response, query, limit, before, after, newest_first=True)
+
+@router.get("/sync")
+def sync_messages(
+    after: Optional[str] = Query(None, description="Cursor of the last message the client has seen"),
+    since: Optional[datetime] = Query(None, description="Fallback when the client only knows when it was last connected"),
+    limit: int = Query(MESSAGE_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Messages the user sent or received since they were last seen, oldest first.
+    Reconnecting Socket.IO clients call this until has_more is false."""
+    query = db.query(Message).filter(
+        or_(
+            Message.sender_id == current_user.id,
+            Message.receiver_id == current_user.id
+        )
+    )
+    try:
+        messages, has_more = paginate_keyset(query, Message, limit, after=after, since=since)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+    return {
+        "messages": [MessageResponse.model_validate(message) for message in messages],
+        "cursor": encode_cursor(messages[-1]) if messages else after,
+        "has_more": has_more,
+        "unread_count": unread_total(db, current_user.id)
+    }
+
+@router.get("/presence")
+def get_presence_status(
+    user_ids: str = Query(..., description="Comma-separated user ids"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Online status and last-seen time from the Socket.IO presence registry, shared across workers"""
+    try:
+        ids = [int(user_id) for user_id in user_ids.split(",") if user_id.strip()]
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="user_ids must be comma-separated integers")
+    if len(ids) > PRESENCE_MAX_USERS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"At most {PRESENCE_MAX_USERS} user ids per request")
+    return {"users": presence_status(db, ids)}
 
 @router.get("/{user_id}", response_model=list[MessageResponse])
-def get_user_messages(user_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def get_user_messages(
+    user_id: int,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Page size; omit (with no cursor) for the whole history"),
+    before: Optional[str] = Query(None, description="Cursor: return messages older than this"),
+    after: Optional[str] = Query(None, description="Cursor: return messages newer than this"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
     """Legacy endpoint - get messages with a user"""
-    messages = db.query(Message).filter(
+    query = db.query(Message).filter(
         or_(
             (Message.sender_id == current_user.id) & (Message.receiver_id == user_id),
             (Message.sender_id == user_id) & (Message.receiver_id == current_user.id)
         )
-    ).order_by(Message.created_at).all()
-    
-    return messages
+    )
+    return _message_page(response, query, limit, before, after)
 
 
 # ============ ADMIN MESSAGING ENDPOINTS ============
@@ -350,74 +389,47 @@ async def send_admin_message(
 @router.post("/admin/send-bulk", response_model=BulkMessageResponse)
 async def send_bulk_admin_message(
     bulk_request: BulkMessageRequest, 
+    background_tasks: BackgroundTasks,
     admin_user: User = Depends(get_admin_user), 
     db: Session = Depends(get_db)
 ):
-    """Send bulk messages to multiple users with template support"""
-    
-    # Build query to get recipient users
-    query = db.query(User)
-    
-    if bulk_request.include_all:
-        # Send to all users except the admin
-        query = query.filter(User.id != admin_user.id)
-    elif bulk_request.recipient_ids:
-        # Send to specific user IDs
-        query = query.filter(User.id.in_(bulk_request.recipient_ids))
-    else:
-        # Apply filters
-        if bulk_request.filter_role:
-            query = query.filter(User.primary_role == bulk_request.filter_role)
-        if bulk_request.filter_verified is not None:
-            query = query.filter(User.is_verified == bulk_request.filter_verified)
-    
-    recipients = query.all()
-    
-    if not recipients:
+    """Queue a bulk message campaign with template support; messages are written in the background"""
+    
+    filters = dict(
+        include_all=bulk_request.include_all,
+        recipient_ids=bulk_request.recipient_ids,
+        filter_role=bulk_request.filter_role,
+        filter_verified=bulk_request.filter_verified
+    )
+    total = recipient_filter(db.query(func.count(User.id)), admin_user.id, **filters).scalar()
+    
+    if not total:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="No users found matching the criteria"
         )
     
     campaign_id = str(uuid.uuid4())
-    success_count = 0
-    failed_count = 0
-    
-    # Process each recipient
-    for recipient in recipients:
-        try:
-            # Replace template placeholders with actual user data
-            message_content = bulk_request.content
-            message_content = message_content.replace("{{full_name}}", str(recipient.full_name) if recipient.full_name else "User")
-            message_content = message_content.replace("{{username}}", str(recipient.username) if recipient.username else "")
-            message_content = message_content.replace("{{email}}", str(recipient.email) if recipient.email else "")
-            
-            admin_message = AdminMessage(
-                admin_id=admin_user.id,
-                receiver_id=recipient.id,
-                content=message_content,
-                is_bulk=True,
-                bulk_campaign_id=campaign_id,
-                bulk_campaign_name=bulk_request.campaign_name
-            )
-            
-            db.add(admin_message)
-            success_count += 1
-            
-        except Exception as e:
-            print(f"❌ Error sending message to user {recipient.id}: {str(e)}")
-            failed_count += 1
-    
-    db.commit()
+    register_campaign(db, campaign_id, admin_user.id, bulk_request.campaign_name, total)
+    background_tasks.add_task(
+        run_campaign,
+        campaign_id,
+        admin_user.id,
+        bulk_request.content,
+        bulk_request.campaign_name,
+        loop=asyncio.get_running_loop(),
+        **filters
+    )
     
-    print(f"📢 Bulk campaign {campaign_id} ({bulk_request.campaign_name}) sent to {success_count} users (failed: {failed_count})")
+    print(f"📢 Bulk campaign {campaign_id} ({bulk_request.campaign_name}) queued for {total} users")
     
     return BulkMessageResponse(
         campaign_id=campaign_id,
         campaign_name=bulk_request.campaign_name,
-        total_sent=len(recipients),
-        success_count=success_count,
-        failed_count=failed_count,
+        total_sent=total,
+        success_count=0,
+        failed_count=0,
+        status="queued",
         timestamp=datetime.utcnow()
     )
 
@@ -483,27 +495,16 @@ def get_bulk_campaign_stats(
     admin_user: User = Depends(get_admin_user), 
     db: Session = Depends(get_db)
 ):
-    """Get statistics for a bulk message campaign"""
-    messages = db.query(AdminMessage).filter(
-        (AdminMessage.bulk_campaign_id == campaign_id) &
-        (AdminMessage.admin_id == admin_user.id)
-    ).all()
+    """Get statistics for a bulk message campaign, with progress while it is still sending"""
+    stats = campaign_stats(db, campaign_id, admin_user.id)
     
-    if not messages:
+    if not stats:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Campaign not found"
         )
     
-    read_count = len([m for m in messages if m.is_read])
-    
-    return {
-        "campaign_id": campaign_id,
-        "total_sent": len(messages),
-        "read_count": read_count,
-        "unread_count": len(messages) - read_count,
-        "read_percentage": (read_count / len(messages) * 100) if messages else 0
-    }
+    return stats
 
 
 
@@ -4,11 +4,19 @@ Centralized notification creation for all events in the system
 """
 
 import json
-from typing import Optional, Dict, Any
+import asyncio
+from collections import defaultdict
+from typing import Optional, Dict, Any, Iterable, List, Sequence, Union
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
 from models import Notification
 from datetime import datetime
 
+# Rows per INSERT statement in bulk writes
+BULK_NOTIFICATION_CHUNK_SIZE = 1000
+
+_BULK_FIELDS = ('user_id', 'title', 'message', 'type', 'data')
+
 
 def create_notification(
     db: Session,
@@ -16,7 +24,10 @@ def create_notification(
     title: str,
     message: str,
     notification_type: str = "general",
-    data: Optional[Dict[str, Any]] = None
+    data: Optional[Dict[str, Any]] = None,
+    related_job_id: Optional[int] = None,
+    related_entity_type: Optional[str] = None,
+    related_entity_id: Optional[int] = None
 ) -> Notification:
     """
     Create a notification for a user.
@@ -28,6 +39,9 @@ def create_notification(
         message: Notification message
         notification_type: Type of notification (general, job_application, application_update, new_message, review_received, job_recommendation)
         data: Additional JSON data to store with notification
+        related_job_id: Job this notification refers to (indexed, used for cleanup)
+        related_entity_type: Kind of object the notification is about (job, application, message, review)
+        related_entity_id: ID of that object
     
     Returns:
         Created Notification object
@@ -37,7 +51,10 @@ def create_notification(
         title=title,
         message=message,
         type=notification_type,
-        data=json.dumps(data) if data else None
+        data=json.dumps(data) if data else None,
+        related_job_id=related_job_id,
+        related_entity_type=related_entity_type,
+        related_entity_id=related_entity_id
     )
     
     db.add(db_notification)
@@ -49,6 +66,139 @@ def create_notification(
     return db_notification
 
 
+def _bulk_row(notification: Union[Sequence, Dict[str, Any]], now: datetime) -> Dict[str, Any]:
+    """Normalize a (user_id, title, message, type, data) tuple or a column dict."""
+    if isinstance(notification, dict):
+        row = dict(notification)
+    else:
+        row = dict(zip(_BULK_FIELDS, notification))
+    row['type'] = row.get('type') or 'general'
+    if row.get('data') is not None and not isinstance(row['data'], str):
+        row['data'] = json.dumps(row['data'])
+    row.setdefault('is_read', False)
+    row.setdefault('created_at', now)
+    row.setdefault('updated_at', now)
+    return row
+
+
+def create_notifications_bulk(
+    db: Session,
+    notifications: Iterable[Union[Sequence, Dict[str, Any]]],
+    return_ids: bool = False,
+    chunk_size: int = BULK_NOTIFICATION_CHUNK_SIZE,
+    commit: bool = True
+) -> Union[int, List[int]]:
+    """
+    Insert many notifications with one multi-row INSERT per chunk.
+    
+    Args:
+        db: Database session
+        notifications: (user_id, title, message, type, data) tuples, or dicts of
+            Notification columns such as job_recommendation_notification_fields()
+        return_ids: Return the new ids (in input order) instead of a count
+        chunk_size: Rows per INSERT
+        commit: Commit once after all chunks; pass False to join the caller's transaction
+    
+    Returns:
+        Number of rows inserted, or their ids when return_ids is set
+    """
+    now = datetime.utcnow()
+    rows = [_bulk_row(notification, now) for notification in notifications]
+    if not rows:
+        return [] if return_ids else 0
+    ids: List[int] = []
+    
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+        if return_ids:
+            result = db.execute(
+                insert(Notification).returning(Notification.id, sort_by_parameter_order=True),
+                chunk
+            )
+            ids.extend(result.scalars().all())
+        else:
+            db.execute(insert(Notification), chunk)
+    
+    if commit:
+        db.commit()
+    
+    print(f"✅ Bulk-created {len(rows)} notifications")
+    return ids if return_ids else len(rows)
+
+
+def notification_payload(notification_id: int, row: Dict[str, Any]) -> Dict[str, Any]:
+    """Socket.IO payload for a notification row, same shape as the single-row events."""
+    created_at = row.get('created_at')
+    return {
+        'id': notification_id,
+        'user_id': row['user_id'],
+        'title': row['title'],
+        'message': row['message'],
+        'type': row.get('type') or 'general',
+        'is_read': bool(row.get('is_read', False)),
+        'data': row.get('data'),
+        'created_at': created_at.isoformat() if created_at else None
+    }
+
+
+async def emit_notifications(payloads: List[Dict[str, Any]], sio=None) -> int:
+    """
+    Push notification events in one grouped pass: payloads are grouped by
+    user room and every room's events are sent concurrently.
+    
+    Returns:
+        Number of events emitted
+    """
+    if not payloads:
+        return 0
+    if sio is None:
+        import sys
+        import os
+        sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+        from main import app
+        sio = getattr(app.state, 'sio', None)
+        if sio is None:
+            print("❌ Socket.IO server not found in app.state")
+            return 0
+    
+    by_room: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    for payload in payloads:
+        by_room[f"user_{payload['user_id']}"].append(payload)
+    
+    async def emit_room(room: str, events: List[Dict[str, Any]]):
+        for event in events:
+            await sio.emit('notification', event, room=room)
+    
+    await asyncio.gather(*(emit_room(room, events) for room, events in by_room.items()))
+    print(f"📡 Emitted {len(payloads)} notifications to {len(by_room)} users")
+    return len(payloads)
+
+
+async def fan_out_notifications(
+    db: Session,
+    notifications: Iterable[Union[Sequence, Dict[str, Any]]],
+    emit: bool = True,
+    commit: bool = True,
+    sio=None
+) -> List[int]:
+    """
+    Bulk-insert notifications, then emit their Socket.IO events in one pass
+    (after the commit, unless commit=False leaves that to the caller).
+    
+    Returns:
+        Ids of the created notifications
+    """
+    now = datetime.utcnow()
+    rows = [_bulk_row(notification, now) for notification in notifications]
+    ids = create_notifications_bulk(db, rows, return_ids=True, commit=commit)
+    if emit:
+        try:
+            await emit_notifications([notification_payload(i, row) for i, row in zip(ids, rows)], sio=sio)
+        except Exception as e:
+            print(f"❌ Error broadcasting notifications: {type(e).__name__}: {e}")
+    return ids
+
+
 def create_job_application_notification(
     db: Session,
     job_creator_id: int,
@@ -72,7 +222,10 @@ def create_job_application_notification(
             'job_id': job_id,
             'applicant_id': applicant_id,
             'applicant_name': applicant_name
-        }
+        },
+        related_job_id=job_id,
+        related_entity_type='application',
+        related_entity_id=application_id
     )
 
 
@@ -111,7 +264,10 @@ def create_application_status_notification(
             'job_id': job_id,
             'old_status': old_status,
             'new_status': new_status
-        }
+        },
+        related_job_id=job_id,
+        related_entity_type='application',
+        related_entity_id=application_id
     )
 
 
@@ -139,7 +295,9 @@ def create_new_message_notification(
             'message_id': message_id,
             'sender_id': sender_id,
             'sender_name': sender_name
-        }
+        },
+        related_entity_type='message',
+        related_entity_id=message_id
     )
 
 
@@ -171,7 +329,10 @@ def create_review_received_notification(
             'job_id': job_id,
             'job_title': job_title,
             'rating': rating
-        }
+        },
+        related_job_id=job_id,
+        related_entity_type='review',
+        related_entity_id=review_id
     )
 
 
@@ -185,21 +346,48 @@ def create_job_recommendation_notification(
     """
     Create notification for job recommendation based on skills match.
     """
-    percentage = int(match_score * 100)
+    fields = job_recommendation_notification_fields(user_id, job_title, job_id, match_score)
     
     return create_notification(
         db=db,
         user_id=user_id,
-        title='🎯 Recommended Job Match',
-        message=f'We found a job that matches your skills: "{job_title}" ({percentage}% match)',
-        notification_type='job_recommendation',
-        data={
+        title=fields['title'],
+        message=fields['message'],
+        notification_type=fields['type'],
+        data=fields['data'],
+        related_job_id=fields['related_job_id'],
+        related_entity_type=fields['related_entity_type'],
+        related_entity_id=fields['related_entity_id']
+    )
+
+
+def job_recommendation_notification_fields(
+    user_id: int,
+    job_title: str,
+    job_id: int,
+    match_score: float
+) -> Dict[str, Any]:
+    """
+    Build the Notification column values for a job recommendation.
+    Shared by the single-row helper and bulk inserts in the scheduler.
+    """
+    percentage = int(match_score * 100)
+    
+    return {
+        'user_id': user_id,
+        'title': '🎯 Recommended Job Match',
+        'message': f'We found a job that matches your skills: "{job_title}" ({percentage}% match)',
+        'type': 'job_recommendation',
+        'data': {
             'job_id': job_id,
             'job_title': job_title,
             'match_score': match_score,
             'match_percentage': percentage
-        }
-    )
+        },
+        'related_job_id': job_id,
+        'related_entity_type': 'job',
+        'related_entity_id': job_id
+    }
 
 
 def create_job_completion_notification(
@@ -230,7 +418,10 @@ def create_job_completion_notification(
             'job_id': job_id,
             'job_title': job_title,
             'recipient_type': recipient_type
-        }
+        },
+        related_job_id=job_id,
+        related_entity_type='job',
+        related_entity_id=job_id
     )
 
 
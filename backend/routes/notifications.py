@@ -1,14 +1,20 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
 from sqlalchemy.orm import Session
+from sqlalchemy import func, or_
 from database import get_db
 from models import User, Notification
 from auth import get_current_user
 from pydantic import BaseModel
 from typing import Optional, List, Dict, Any
+from pagination import paginate_keyset, page_headers, page_cursors
 import json
+import os
 
 router = APIRouter(prefix="/api/notifications", tags=["notifications"])
 
+NOTIFICATION_PAGE_SIZE = int(os.getenv("NOTIFICATION_PAGE_SIZE", "50"))
+NOTIFICATION_MAX_PAGE_SIZE = 200
+
 class NotificationCreate(BaseModel):
     user_id: int
     title: str
@@ -30,42 +36,96 @@ class NotificationResponse(BaseModel):
     class Config:
         from_attributes = True
 
-@router.get("/", response_model=List[NotificationResponse])
-async def get_notifications(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    """Get all notifications for the current user"""
+def _notification_dict(notification: Notification) -> dict:
+    return {
+        "id": notification.id,
+        "user_id": notification.user_id,
+        "title": notification.title,
+        "message": notification.message,
+        "type": notification.type or "general",
+        "is_read": bool(notification.is_read),
+        "data": notification.data,
+        "created_at": notification.created_at.isoformat() if notification.created_at is not None else "",
+        "updated_at": notification.updated_at.isoformat() if notification.updated_at is not None else ""
+    }
+
+def _feed_query(db: Session, user_id: int, types: Optional[str], is_read: Optional[bool]):
+    """Notifications for a user, optionally narrowed to comma-separated types and a read state"""
+    query = db.query(Notification).filter(Notification.user_id == user_id)
+    if types:
+        wanted = [t.strip() for t in types.split(",") if t.strip()]
+        type_filter = Notification.type.in_(wanted)
+        if "general" in wanted:
+            # Untyped notifications are shown as general
+            type_filter = or_(type_filter, Notification.type.is_(None))
+        query = query.filter(type_filter)
+    if is_read is not None:
+        query = query.filter(Notification.is_read == is_read)
+    return query
+
+def _feed_page(query, limit: Optional[int], before: Optional[str], after: Optional[str]):
+    if before and after:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Use either before or after, not both")
     try:
-        print(f"📢 Fetching notifications for user {current_user.id}")
-        notifications = db.query(Notification).filter(
-            Notification.user_id == current_user.id
-        ).order_by(Notification.created_at.desc()).all()
-        
-        print(f"✅ Found {len(notifications)} notifications for user {current_user.id}")
-        
-        # Convert to response format
-        result = []
-        for notification in notifications:
-            result.append({
-                "id": notification.id,
-                "user_id": notification.user_id,
-                "title": notification.title,
-                "message": notification.message,
-                "type": notification.type or "general",
-                "is_read": bool(notification.is_read),
-                "data": notification.data,
-                "created_at": notification.created_at.isoformat() if notification.created_at is not None else "",
-                "updated_at": notification.updated_at.isoformat() if notification.updated_at is not None else ""
-            })
-        
-        return result
-        
-    except Exception as e:
-        print(f"❌ Error fetching notifications: {type(e).__name__}: {e}")
-        import traceback
-        traceback.print_exc()
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to fetch notifications: {str(e)}"
-        )
+        if limit is None and (before or after):
+            limit = NOTIFICATION_PAGE_SIZE
+        return paginate_keyset(query, Notification, limit, before=before, after=after, newest_first=True)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+def unread_counts_by_type(db: Session, user_id: int) -> Dict[str, int]:
+    """Unread notifications per type in one grouped query on (user_id, is_read)"""
+    rows = db.query(Notification.type, func.count(Notification.id)).filter(
+        Notification.user_id == user_id,
+        Notification.is_read == False
+    ).group_by(Notification.type).all()
+    counts: Dict[str, int] = {}
+    for notification_type, count in rows:
+        key = notification_type or "general"
+        counts[key] = counts.get(key, 0) + count
+    return counts
+
+@router.get("/", response_model=List[NotificationResponse])
+async def get_notifications(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=NOTIFICATION_MAX_PAGE_SIZE, description="Page size; omit (with no cursor) for every notification"),
+    before: Optional[str] = Query(None, description="Cursor: return notifications older than this"),
+    after: Optional[str] = Query(None, description="Cursor: return notifications newer than this"),
+    type: Optional[str] = Query(None, description="Comma-separated notification types"),
+    is_read: Optional[bool] = Query(None),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Get the current user's notifications, newest first; pass limit (and cursors) to page"""
+    notifications, has_more = _feed_page(_feed_query(db, current_user.id, type, is_read), limit, before, after)
+    response.headers.update(page_headers(notifications, has_more))
+    print(f"📢 Fetched {len(notifications)} notifications for user {current_user.id}")
+    return [_notification_dict(notification) for notification in notifications]
+
+@router.get("/feed")
+async def get_notification_feed(
+    limit: int = Query(NOTIFICATION_PAGE_SIZE, ge=1, le=NOTIFICATION_MAX_PAGE_SIZE),
+    before: Optional[str] = Query(None, description="Cursor: return notifications older than this"),
+    after: Optional[str] = Query(None, description="Cursor: return notifications newer than this"),
+    type: Optional[str] = Query(None, description="Comma-separated notification types"),
+    is_read: Optional[bool] = Query(None),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """One page of the feed plus unread counts per type, replacing separate list and /unread/count polls"""
+    notifications, has_more = _feed_page(_feed_query(db, current_user.id, type, is_read), limit, before, after)
+    unread_by_type = unread_counts_by_type(db, current_user.id)
+    # next_cursor continues in the direction being paged (newer for after, older otherwise)
+    # and goes back in the same parameter; prev_cursor goes the other way in the other one
+    before_cursor, after_cursor = page_cursors(notifications)
+    return {
+        "items": [_notification_dict(notification) for notification in notifications],
+        "has_more": has_more,
+        "next_cursor": after_cursor if after else before_cursor,
+        "prev_cursor": before_cursor if after else after_cursor,
+        "unread_count": sum(unread_by_type.values()),
+        "unread_by_type": unread_by_type
+    }
 
 @router.post("/", response_model=NotificationResponse)
 async def create_notification(notification: NotificationCreate, db: Session = Depends(get_db)):
@@ -172,12 +232,8 @@ async def delete_notification(notification_id: int, current_user: User = Depends
 @router.get("/unread/count")
 async def get_unread_count(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     """Get count of unread notifications for the current user"""
-    unread_count = db.query(Notification).filter(
-        Notification.user_id == current_user.id,
-        Notification.is_read == False
-    ).count()
-    
-    return {"count": unread_count}
+    unread_by_type = unread_counts_by_type(db, current_user.id)
+    return {"count": sum(unread_by_type.values()), "by_type": unread_by_type}
 
 @router.put("/mark-all-read")
 async def mark_all_notifications_read(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
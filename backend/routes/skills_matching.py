@@ -4,6 +4,7 @@ Provides endpoints for job/user embedding generation and similarity matching
 """
 
 from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from typing import List, Dict, Any, Optional
 from pydantic import BaseModel, Field
@@ -12,11 +13,21 @@ from datetime import datetime
 
 from database import get_db
 from models import User, Job
-from embedding_model import get_model, embedding_to_string, string_to_embedding
+from embedding_model import get_model_if_ready, model_status, embedding_to_string, string_to_embedding
+from embedding_index import get_job_index
+from reembed_queue import get_reembed_queue
 # from auth import get_current_user  # Not used in current implementation
 
 router = APIRouter(prefix="/api/skills-matching", tags=["skills-matching"])
 
+def model_warming_up() -> HTTPException:
+    """503 returned while the embedding model is still loading in the background."""
+    return HTTPException(
+        status_code=503,
+        detail="Embedding model is warming up, please retry shortly",
+        headers={"Retry-After": "5"}
+    )
+
 # Pydantic models for request/response
 class JobEmbeddingRequest(BaseModel):
     """Request model for job embedding generation"""
@@ -87,8 +98,11 @@ async def embed_job(job_data: JobEmbeddingRequest):
     Returns:
         Embedding vector and metadata
     """
+    model = get_model_if_ready()
+    if model is None:
+        raise model_warming_up()
+    
     try:
-        model = get_model()
         
         # Convert to dictionary format expected by the model
         job_dict = {
@@ -106,7 +120,7 @@ async def embed_job(job_data: JobEmbeddingRequest):
         }
         
         # Generate embedding
-        embedding = model.embed_job(job_dict)
+        embedding = await model.embed_job_async(job_dict)
         
         # Handle both numpy arrays and lists
         if hasattr(embedding, 'tolist'):
@@ -134,8 +148,11 @@ async def embed_user(user_data: UserEmbeddingRequest):
     Returns:
         Embedding vector and metadata
     """
+    model = get_model_if_ready()
+    if model is None:
+        raise model_warming_up()
+    
     try:
-        model = get_model()
         
         # Convert to dictionary format expected by the model
         user_dict = {
@@ -150,7 +167,7 @@ async def embed_user(user_data: UserEmbeddingRequest):
         }
         
         # Generate embedding
-        embedding = model.embed_user(user_dict)
+        embedding = await model.embed_user_async(user_dict)
         
         # Handle both numpy arrays and lists
         if hasattr(embedding, 'tolist'):
@@ -179,14 +196,19 @@ async def calculate_similarity(request: SimilarityRequest):
         Similarity score between 0 and 1
     """
     try:
-        model = get_model()
+        model = get_model_if_ready()
         
         # Convert lists to numpy arrays
         job_embedding = np.array(request.job_embedding)
         user_embedding = np.array(request.user_embedding)
         
         # Calculate similarity
-        similarity = model.calculate_similarity(job_embedding, user_embedding)
+        if model is not None:
+            similarity = model.calculate_similarity(job_embedding, user_embedding)
+        else:
+            # Plain cosine needs no transformer, so it works while the model warms up
+            norms = np.linalg.norm(job_embedding) * np.linalg.norm(user_embedding)
+            similarity = max(0.0, min(1.0, float(job_embedding @ user_embedding / norms))) if norms else 0.0
         
         return SimilarityResponse(
             similarity_score=similarity,
@@ -207,8 +229,11 @@ async def find_best_matches(request: BestMatchesRequest):
     Returns:
         List of jobs sorted by similarity score
     """
+    model = get_model_if_ready()
+    if model is None:
+        raise model_warming_up()
+    
     try:
-        model = get_model()
         
         # Convert user profile to dictionary
         user_dict = {
@@ -242,7 +267,8 @@ async def find_best_matches(request: BestMatchesRequest):
         
         # Find best matches
         top_k = request.top_k if request.top_k is not None else 10
-        matches = model.find_best_matches(user_dict, jobs_list, top_k)
+        # Runs in the threadpool so the batched encode does not block the event loop
+        matches = await run_in_threadpool(model.find_best_matches, user_dict, jobs_list, top_k)
         
         # Convert to response format
         match_results = []
@@ -295,7 +321,16 @@ async def embed_job_in_db(job_id: int, db: Session = Depends(get_db)):
         if not job:
             raise HTTPException(status_code=404, detail="Job not found")
         
-        model = get_model()
+        model = get_model_if_ready()
+        if model is None:
+            # Don't block on a cold model; the re-embedding worker picks it up once loaded
+            get_reembed_queue().enqueue("jobs", [job_id])
+            return {
+                "success": True,
+                "queued": True,
+                "message": "Embedding model is warming up; job queued for embedding",
+                "job_id": job_id
+            }
         
         # Prepare job data
         job_dict = {
@@ -313,7 +348,7 @@ async def embed_job_in_db(job_id: int, db: Session = Depends(get_db)):
         }
         
         # Generate embedding
-        embedding = model.embed_job(job_dict)
+        embedding = await model.embed_job_async(job_dict)
         
         # Store embedding in database
         setattr(job, 'job_embedding', embedding_to_string(embedding))
@@ -349,7 +384,16 @@ async def embed_user_in_db(user_id: int, db: Session = Depends(get_db)):
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
         
-        model = get_model()
+        model = get_model_if_ready()
+        if model is None:
+            # Don't block on a cold model; the re-embedding worker picks it up once loaded
+            get_reembed_queue().enqueue("users", [user_id])
+            return {
+                "success": True,
+                "queued": True,
+                "message": "Embedding model is warming up; user queued for embedding",
+                "user_id": user_id
+            }
         
         # Prepare user data
         user_dict = {
@@ -364,7 +408,7 @@ async def embed_user_in_db(user_id: int, db: Session = Depends(get_db)):
         }
         
         # Generate embedding
-        embedding = model.embed_user(user_dict)
+        embedding = await model.embed_user_async(user_dict)
         
         # Store embedding in database
         setattr(user, 'profile_embedding', embedding_to_string(embedding))
@@ -401,35 +445,30 @@ async def get_matches_for_user(user_id: int, limit: int = 10, db: Session = Depe
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
         
-        user_embedding_str = getattr(user, 'profile_embedding', None)
-        if not user_embedding_str:
+        stored_embedding = getattr(user, 'profile_embedding', None)
+        if not stored_embedding:
             raise HTTPException(status_code=400, detail="User embedding not found. Generate embedding first.")
         
-        model = get_model()
-        # Convert database string to embedding
-        user_embedding = string_to_embedding(str(user_embedding_str))
+        # Decode stored embedding
+        user_embedding = string_to_embedding(stored_embedding)
         
         # Handle both numpy arrays and lists
         embedding_size = len(user_embedding) if hasattr(user_embedding, '__len__') else getattr(user_embedding, 'size', 0)
         if embedding_size == 0:
             raise HTTPException(status_code=400, detail="Invalid user embedding")
         
-        # Get all jobs with embeddings
-        jobs = db.query(Job).filter(
-            Job.job_embedding.isnot(None),
-            Job.status == "open"
-        ).all()
+        # Score every indexed open job in one pass
+        top = get_job_index(db).top_k(user_embedding, limit)
+        jobs_by_id = {
+            job.id: job
+            for job in db.query(Job).filter(Job.id.in_([job_id for job_id, _ in top])).all()
+        }
         
         matches = []
-        for job in jobs:
-            job_embedding = string_to_embedding(str(job.job_embedding))
-            # Handle both numpy arrays and lists
-            job_embedding_size = len(job_embedding) if hasattr(job_embedding, '__len__') else getattr(job_embedding, 'size', 0)
-            if job_embedding_size == 0:
+        for job_id, similarity in top:
+            job = jobs_by_id.get(job_id)
+            if job is None:
                 continue
-                
-            similarity = model.calculate_similarity(job_embedding, user_embedding)
-            
             matches.append({
                 "job_id": job.id,
                 "title": job.title,
@@ -440,10 +479,6 @@ async def get_matches_for_user(user_id: int, limit: int = 10, db: Session = Depe
                 "similarity_score": similarity
             })
         
-        # Sort by similarity score (descending) and limit results
-        matches.sort(key=lambda x: x['similarity_score'], reverse=True)
-        matches = matches[:limit]
-        
         return {
             "success": True,
             "user_id": user_id,
@@ -455,3 +490,20 @@ async def get_matches_for_user(user_id: int, limit: int = 10, db: Session = Depe
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error getting matches: {str(e)}")
+
+@router.get("/cache-stats")
+async def get_embedding_cache_stats():
+    """
+    Hit/miss counters for the embedding cache, inference batcher and re-embedding queue.
+    
+    Returns:
+        Cache size, configuration and hit rate, plus batch statistics
+    """
+    model = get_model_if_ready()
+    return {
+        "success": True,
+        "model": model_status(),
+        "cache": model.cache.stats() if model else None,
+        "batcher": model.batcher.stats() if model and model.batcher else None,
+        "reembed_queue": get_reembed_queue().stats()
+    }
@@ -1,23 +1,28 @@
 """
 Background Scheduler for Daily Jobs
-Handles recurring tasks like daily job recommendation notifications
+Handles recurring tasks like daily job recommendation notifications and
+notification retention
 """
 
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
 from apscheduler.triggers.interval import IntervalTrigger
-from database import get_db
-from models import User, Notification, Job
-from routes.notification_helpers import create_job_recommendation_notification
-from embedding_model import string_to_embedding, get_model
+from database import get_db, SessionLocal
+from models import User, Notification, NotificationArchive, Job
+from routes.notification_helpers import job_recommendation_notification_fields, create_notifications_bulk
+from embedding_model import string_to_embedding
+from embedding_index import get_job_index, build_embedding_matrix, batch_top_k
 from services.email_service import EmailService
-from routes.job_recommendations import get_user_job_recommendations
+from routes.job_recommendations import get_user_job_recommendations, MATCH_THRESHOLD
 from datetime import datetime, timedelta
-import json
-from sqlalchemy import and_
+import os
+from sqlalchemy import and_, or_, select, insert, literal
 import asyncio
+import time
 import logging
 import random
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -26,37 +31,100 @@ logger = logging.getLogger(__name__)
 scheduler = AsyncIOScheduler()
 email_service = EmailService()
 
+# With several API workers only the one holding this lock runs scheduled jobs;
+# set SCHEDULER_ENABLED=false on extra hosts when scaling beyond one machine
+SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "true").lower() == "true"
+SCHEDULER_LOCK_FILE = os.getenv("SCHEDULER_LOCK_FILE", os.path.join(tempfile.gettempdir(), "prolinq-scheduler.lock"))
+_scheduler_lock_handle = None
+
+# Daily recommendation batch settings
+DAILY_RECOMMENDATIONS_PER_USER = 5
+RECOMMENDATION_CHUNK_SIZE = int(os.getenv("RECOMMENDATION_CHUNK_SIZE", "1024"))
+NOTIFICATION_INSERT_CHUNK_SIZE = 1000
+
+
+def _parse_ttl_days(raw: str) -> dict:
+    """Parse "type=days,type=days" overrides; malformed entries are logged and skipped"""
+    ttls = {}
+    for item in raw.split(","):
+        if "=" in item:
+            notification_type, days = item.split("=", 1)
+            try:
+                ttls[notification_type.strip()] = int(days)
+            except ValueError:
+                logger.error(f"❌ Ignoring invalid NOTIFICATION_TTL_DAYS entry {item.strip()!r}; keeping the default")
+    return ttls
+
+
+# Notification retention: read notifications are pruned after their type's TTL,
+# unread ones only once they reach NOTIFICATION_UNREAD_TTL_DAYS (0 keeps them)
+NOTIFICATION_TTL_DAYS = {
+    "job_recommendation": 14,
+    "new_message": 30,
+    "default": 90,
+    **_parse_ttl_days(os.getenv("NOTIFICATION_TTL_DAYS", ""))
+}
+NOTIFICATION_UNREAD_TTL_DAYS = int(os.getenv("NOTIFICATION_UNREAD_TTL_DAYS", "180"))
+RETENTION_BATCH_SIZE = int(os.getenv("NOTIFICATION_RETENTION_BATCH_SIZE", "1000"))
+# Pause between batches so other writers get the table
+RETENTION_BATCH_PAUSE_SECONDS = float(os.getenv("NOTIFICATION_RETENTION_BATCH_PAUSE", "0.05"))
+# Copy pruned rows to notifications_archive instead of dropping them
+NOTIFICATION_ARCHIVE_ENABLED = os.getenv("NOTIFICATION_ARCHIVE_ENABLED", "false").lower() == "true"
+
+_ARCHIVE_COLUMNS = [
+    'id', 'user_id', 'title', 'message', 'type', 'is_read', 'data',
+    'related_job_id', 'related_entity_type', 'related_entity_id', 'created_at', 'updated_at'
+]
+last_retention_run = {}
+
+# Email jobs do blocking SMTP and database I/O; they run on their own threads
+# so the event loop shared with FastAPI and Socket.IO never waits on a mail server
+EMAIL_WORKER_THREADS = int(os.getenv("EMAIL_WORKER_THREADS", "2"))
+email_executor = ThreadPoolExecutor(max_workers=EMAIL_WORKER_THREADS, thread_name_prefix="email-worker")
+
+
+async def run_email_job(func, *args):
+    """Run a blocking email job on the email executor and await its result"""
+    return await asyncio.get_running_loop().run_in_executor(email_executor, func, *args)
+
+
+def _process_email_queue():
+    """One queue tick on an email worker thread, with its own session"""
+    db = SessionLocal()
+    try:
+        return email_service.process_queue(db)
+    finally:
+        db.close()
+
 
 async def process_email_queue():
     """
-    Process one email from the queue every minute
+    Process the email queue every minute
     Respects Gmail rate limits (1 email every 8-10 minutes)
+    SMTP and database work run on the email executor, off the event loop
     """
     try:
-        db = next(get_db())
-        result = email_service.process_queue(db)
+        result = await run_email_job(_process_email_queue)
         
         if result.get("processed", 0) > 0:
-            logger.info(f"✉️  Processed email: {result.get('type')} to {result.get('to')}")
+            logger.info(f"✉️  Processed {result.get('processed')} email(s): {result.get('type')} to {result.get('to')}")
         else:
             status = result.get("status", "unknown")
             if status != "no_emails_to_send":
                 logger.debug(f"📧 Queue processing: {status}")
-        
-        db.close()
     except Exception as e:
         logger.error(f"❌ Error processing email queue: {str(e)}")
 
 
-async def send_daily_emails():
+def _send_daily_emails():
     """
-    Send daily job recommendations emails to all talent users
-    Stagger throughout the day (every hour starting at 8 AM)
+    Queue this hour's batch of daily recommendation emails
+    Runs on an email worker thread with its own session
     """
     logger.info("📧 Starting daily email recommendations sending...")
     
     try:
-        db = next(get_db())
+        db = SessionLocal()
         
         # Get all active talent users
         talent_users = db.query(User).filter(
@@ -124,22 +192,49 @@ async def send_daily_emails():
         traceback.print_exc()
 
 
+async def send_daily_emails():
+    """
+    Send daily job recommendations emails to all talent users
+    Stagger throughout the day (every hour starting at 8 AM)
+    """
+    await run_email_job(_send_daily_emails)
+
+
 async def generate_daily_recommendations():
     """
     Generate and send daily job recommendations to all active users
     This runs once per day at a configured time
+    
+    User and job embeddings are loaded once and scored as matrices in
+    (users-chunk x jobs) blocks, then all notifications are bulk-inserted.
     """
     logger.info("🌅 Starting daily job recommendations generation...")
     
     try:
         db = next(get_db())
         
-        # Get all active users with embeddings
-        users = db.query(User).filter(
+        # Get today's date range
+        now = datetime.utcnow()
+        today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        today_end = today_start + timedelta(days=1)
+        
+        # Users that already have unread recommendations from today are skipped
+        already_recommended = db.query(Notification.user_id).filter(
+            and_(
+                Notification.type == 'job_recommendation',
+                Notification.created_at >= today_start,
+                Notification.created_at < today_end,
+                Notification.is_read == False
+            )
+        ).distinct()
+        
+        # Get all active users with embeddings (only the columns we need)
+        users = db.query(User.id, User.profile_embedding).filter(
             and_(
                 User.is_active == True,
                 User.profile_embedding.isnot(None),
-                User.primary_role.in_(["talent", "freelancer"])  # Only for job seekers
+                User.primary_role.in_(["talent", "freelancer"]),  # Only for job seekers
+                User.id.notin_(already_recommended)
             )
         ).all()
         
@@ -150,103 +245,56 @@ async def generate_daily_recommendations():
             db.close()
             return
         
-        # Get today's date range
-        now = datetime.utcnow()
-        today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
-        today_end = today_start + timedelta(days=1)
+        # Rebuild the job index once so the run sees every open job
+        index = get_job_index()
+        index.load(db)
+        job_ids, job_matrix = index.snapshot(now=now)
         
-        model = get_model()
-        total_recommendations = 0
+        logger.info(f"📌 Matching {len(users)} users against {len(job_ids)} open jobs")
         
-        for user in users:
-            try:
-                logger.info(f"🎯 Processing recommendations for user {user.id} ({user.username})")
-                
-                # Check if this user already has recommendations for today
-                existing_today = db.query(Notification).filter(
-                    and_(
-                        Notification.user_id == user.id,
-                        Notification.type == 'job_recommendation',
-                        Notification.created_at >= today_start,
-                        Notification.created_at < today_end,
-                        Notification.is_read == False
-                    )
-                ).count()
-                
-                if existing_today > 0:
-                    logger.info(f"✅ User {user.id} already has {existing_today} unread recommendations from today, skipping")
-                    continue
-                
-                # Get user embedding
-                user_embedding = string_to_embedding(user.profile_embedding)
-                if user_embedding.size == 0:
-                    logger.warning(f"⚠️  User {user.id} has invalid embedding")
+        if len(job_ids) == 0:
+            logger.info("📭 No open jobs with embeddings, nothing to recommend")
+            db.close()
+            return
+        
+        positions, user_matrix = build_embedding_matrix(
+            [string_to_embedding(embedding) for _, embedding in users],
+            job_matrix.shape[1]
+        )
+        if len(positions) < len(users):
+            logger.warning(f"⚠️  Skipped {len(users) - len(positions)} users with invalid embeddings")
+        
+        top_matches = batch_top_k(
+            user_matrix,
+            job_ids,
+            job_matrix,
+            k=DAILY_RECOMMENDATIONS_PER_USER,
+            min_score=MATCH_THRESHOLD,
+            chunk_size=RECOMMENDATION_CHUNK_SIZE
+        )
+        
+        # Look up titles for every recommended job in one query
+        recommended_ids = {job_id for matches in top_matches for job_id, _ in matches}
+        titles = dict(db.query(Job.id, Job.title).filter(Job.id.in_(recommended_ids)).all()) if recommended_ids else {}
+        
+        rows = []
+        for position, matches in zip(positions.tolist(), top_matches):
+            user_id = users[position][0]
+            for job_id, similarity in matches:
+                if job_id not in titles:
                     continue
-                
-                # Get all open jobs with embeddings
-                jobs = db.query(Job).filter(
-                    and_(
-                        Job.job_embedding.isnot(None),
-                        Job.status == "open",
-                        Job.deadline.is_(None) | (Job.deadline > now)
-                    )
-                ).all()
-                
-                logger.info(f"📌 Found {len(jobs)} open jobs to match against for user {user.id}")
-                
-                # Calculate matches
-                matches = []
-                for job in jobs:
-                    try:
-                        job_embedding = string_to_embedding(job.job_embedding)
-                        if job_embedding.size == 0:
-                            continue
-                        
-                        similarity = model.calculate_similarity(job_embedding, user_embedding)
-                        
-                        # Only include matches above 40% threshold
-                        if similarity >= 0.4:
-                            matches.append({
-                                "job_id": job.id,
-                                "title": job.title,
-                                "similarity_score": round(similarity, 3),
-                                "match_percentage": int(similarity * 100)
-                            })
-                    except Exception as e:
-                        logger.warning(f"⚠️  Error processing job {job.id}: {e}")
-                        continue
-                
-                # Sort by similarity score (descending) and take top 5
-                matches.sort(key=lambda x: x['similarity_score'], reverse=True)
-                matches = matches[:5]
-                
-                if matches:
-                    logger.info(f"✨ Creating {len(matches)} recommendation notifications for user {user.id}")
-                    
-                    for match in matches:
-                        try:
-                            create_job_recommendation_notification(
-                                db=db,
-                                user_id=user.id,
-                                job_title=match['title'],
-                                job_id=match['job_id'],
-                                match_score=match['similarity_score']
-                            )
-                            total_recommendations += 1
-                        except Exception as e:
-                            logger.error(f"❌ Error creating notification for user {user.id}, job {match['job_id']}: {e}")
-                else:
-                    logger.info(f"📭 No matching recommendations found for user {user.id}")
-                
-                db.commit()
-                
-            except Exception as e:
-                logger.error(f"❌ Error processing user {user.id}: {e}")
-                db.rollback()
-                continue
+                fields = job_recommendation_notification_fields(
+                    user_id=user_id,
+                    job_title=titles[job_id],
+                    job_id=job_id,
+                    match_score=round(similarity, 3)
+                )
+                rows.append(fields)
+        
+        create_notifications_bulk(db, rows, chunk_size=NOTIFICATION_INSERT_CHUNK_SIZE)
         
         db.close()
-        logger.info(f"🎉 Daily recommendations generation complete! Created {total_recommendations} total recommendations")
+        logger.info(f"🎉 Daily recommendations generation complete! Created {len(rows)} total recommendations")
         
     except Exception as e:
         logger.error(f"❌ Fatal error in daily recommendations generation: {e}")
@@ -254,11 +302,130 @@ async def generate_daily_recommendations():
         traceback.print_exc()
 
 
+def _expired_notifications(now: datetime):
+    """Filter matching notifications past their retention period"""
+    typed = {t: days for t, days in NOTIFICATION_TTL_DAYS.items() if t != "default"}
+    read_expired = [
+        and_(Notification.type == notification_type, Notification.created_at < now - timedelta(days=days))
+        for notification_type, days in typed.items()
+    ]
+    read_expired.append(and_(
+        or_(Notification.type.is_(None), Notification.type.notin_(list(typed))),
+        Notification.created_at < now - timedelta(days=NOTIFICATION_TTL_DAYS["default"])
+    ))
+    expired = and_(Notification.is_read == True, or_(*read_expired))
+    if NOTIFICATION_UNREAD_TTL_DAYS > 0:
+        expired = or_(expired, and_(
+            Notification.is_read.isnot(True),
+            Notification.created_at < now - timedelta(days=NOTIFICATION_UNREAD_TTL_DAYS)
+        ))
+    return expired
+
+
+def prune_notifications(db, now=None, batch_size=RETENTION_BATCH_SIZE, archive=NOTIFICATION_ARCHIVE_ENABLED):
+    """
+    Delete (or archive) expired notifications in bounded batches.
+    
+    Walks the table by id so each batch is a short transaction and later
+    batches don't rescan rows already checked.
+    
+    Returns:
+        Stats dict with rows pruned in total and per type
+    """
+    now = now or datetime.utcnow()
+    expired = _expired_notifications(now)
+    stats = {"pruned": 0, "by_type": {}, "batches": 0, "archived": archive,
+             "started_at": now.isoformat(), "finished_at": None}
+    
+    last_id = 0
+    while True:
+        rows = db.query(Notification.id, Notification.type).filter(
+            expired, Notification.id > last_id
+        ).order_by(Notification.id).limit(batch_size).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+        ids = [row.id for row in rows]
+        
+        if archive:
+            columns = [getattr(Notification, column) for column in _ARCHIVE_COLUMNS]
+            db.execute(insert(NotificationArchive).from_select(
+                _ARCHIVE_COLUMNS + ['archived_at'],
+                select(*columns, literal(now)).where(Notification.id.in_(ids))
+            ))
+        db.query(Notification).filter(Notification.id.in_(ids)).delete(synchronize_session=False)
+        db.commit()
+        
+        stats["pruned"] += len(ids)
+        stats["batches"] += 1
+        for row in rows:
+            key = row.type or "general"
+            stats["by_type"][key] = stats["by_type"].get(key, 0) + 1
+        if RETENTION_BATCH_PAUSE_SECONDS > 0:
+            time.sleep(RETENTION_BATCH_PAUSE_SECONDS)
+    
+    stats["finished_at"] = datetime.utcnow().isoformat()
+    return stats
+
+
+def _run_notification_retention():
+    db = next(get_db())
+    try:
+        return prune_notifications(db)
+    finally:
+        db.close()
+
+
+async def run_notification_retention():
+    """
+    Daily notification retention pass
+    Runs in a worker thread so batch pauses don't block the event loop
+    """
+    logger.info("🧹 Starting notification retention...")
+    
+    try:
+        stats = await asyncio.to_thread(_run_notification_retention)
+        last_retention_run.clear()
+        last_retention_run.update(stats)
+        logger.info(f"🧹 Notification retention pruned {stats['pruned']} rows in {stats['batches']} batches: {stats['by_type']}")
+    except Exception as e:
+        logger.error(f"❌ Error in notification retention: {e}")
+        import traceback
+        traceback.print_exc()
+
+
+def _claim_scheduler_lock() -> bool:
+    """Take the per-host scheduler lock without blocking; held until the process exits."""
+    global _scheduler_lock_handle
+    if _scheduler_lock_handle is not None:
+        return True
+    try:
+        import fcntl
+    except ImportError:
+        # No flock (Windows dev machines run a single worker)
+        return True
+
+    handle = open(SCHEDULER_LOCK_FILE, "a")
+    try:
+        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        handle.close()
+        return False
+    _scheduler_lock_handle = handle
+    return True
+
+
 def start_scheduler(app):
     """
     Start the background scheduler
     Call this from main.py on app startup
     """
+    if not SCHEDULER_ENABLED:
+        logger.info("⏸️ Scheduler disabled on this instance (SCHEDULER_ENABLED=false)")
+        return
+    if not _claim_scheduler_lock():
+        logger.info(f"⏸️ Scheduler already running in another worker (pid {os.getpid()} skipping)")
+        return
     if not scheduler.running:
         logger.info("🚀 Starting background scheduler...")
         
@@ -289,12 +456,22 @@ def start_scheduler(app):
             replace_existing=True
         )
         
+        # Prune expired notifications daily at 3 AM UTC, off-peak
+        scheduler.add_job(
+            run_notification_retention,
+            CronTrigger(hour=3, minute=0, second=0),
+            id='notification_retention',
+            name='Prune expired notifications',
+            replace_existing=True
+        )
+        
         scheduler.start()
         logger.info("✅ Background scheduler started successfully")
         logger.info("📅 Scheduled:")
         logger.info("   - Daily job recommendations at 09:00 UTC")
         logger.info("   - Email queue processing every minute")
         logger.info("   - Daily emails: Every hour 8 AM - 8 PM UTC")
+        logger.info("   - Notification retention at 03:00 UTC")
         
         # Store scheduler reference in app
         app.state.scheduler = scheduler
@@ -308,4 +485,6 @@ def stop_scheduler(app):
     if hasattr(app.state, 'scheduler') and app.state.scheduler.running:
         logger.info("🛑 Stopping background scheduler...")
         app.state.scheduler.shutdown()
-        logger.info("✅ Background scheduler stopped")
\ No newline at end of file
+        logger.info("✅ Background scheduler stopped")
+    # Let an in-flight send finish so its queue row is marked sent
+    email_executor.shutdown(wait=True, cancel_futures=True)
\ No newline at end of file
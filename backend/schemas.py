@@ -216,6 +216,7 @@ class BulkMessageResponse(BaseModel):
     total_sent: int
     success_count: int
     failed_count: int
+    status: Optional[str] = None  # queued while the campaign is written in the background
     timestamp: datetime
 
 # Advertisement Schemas
@@ -1,30 +1,55 @@
 """
 Advanced email queue with throttling to respect Gmail rate limits
-- Max 100-150 emails/day
-- Space emails 1 every 8-10 minutes
-- Handles retries with exponential backoff
+- Token buckets per SMTP account (default: 140/day, 1 every 9 minutes each)
+- Several accounts send in parallel, so throughput scales with accounts
+- Priority classes: welcome > daily_jobs > promotional
+- Workers claim emails with a lease, so several can drain the queue at once
+- Failed emails are retried with jittered exponential backoff, up to a
+  per-type number of attempts, then dead-lettered
 """
 import logging
+import os
+import socket
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from sqlalchemy import case
 from sqlalchemy.orm import Session
 from models import EmailQueue, EmailMetrics
 from services.smtp_service import SMTPService
+from services.rate_limiter import get_rate_limiter, email_priority
 import random
 
 logger = logging.getLogger(__name__)
 
+# Sending attempts per email type before it is dead-lettered; a stale daily
+# digest isn't worth as many tries as a welcome email
+EMAIL_MAX_ATTEMPTS = {
+    "welcome": 5,
+    "test": 1,
+    "daily_jobs": 3,
+    "promotional": 2,
+}
+DEFAULT_MAX_ATTEMPTS = int(os.getenv("EMAIL_MAX_ATTEMPTS", "3"))
+
 class AdvancedThrottlingQueue:
     """
     Manages email queue with Gmail-compliant rate limiting
     """
     
-    # Gmail limits
-    MAX_EMAILS_PER_DAY = 140  # Conservative limit (100-150 range)
-    SECONDS_BETWEEN_EMAILS = 540  # 9 minutes (8-10 minute range)
-    MAX_RETRIES = 1  # Retry once, then mark as failed (as per requirements)
+    # Per-account daily limits and spacing live in services.rate_limiter
+    # Backoff before retry n: RETRY_BASE_SECONDS * 2^(n-1), capped, then jittered
+    RETRY_BASE_SECONDS = int(os.getenv("EMAIL_RETRY_BASE_SECONDS", "300"))
+    RETRY_MAX_SECONDS = int(os.getenv("EMAIL_RETRY_MAX_SECONDS", "21600"))
+    # Most emails one account sends over one SMTP session per tick
+    MAX_BATCH_SIZE = int(os.getenv("EMAIL_BATCH_SIZE", "10"))
+    # How long a worker may hold claimed emails before others may take them over
+    CLAIM_LEASE_SECONDS = int(os.getenv("EMAIL_CLAIM_LEASE_SECONDS", "600"))
     
     def __init__(self):
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
         self.smtp_service = SMTPService()
+        self.limiter = get_rate_limiter()
+        self.account_services = {account.name: SMTPService(account) for account in self.limiter.accounts}
     
     def add_to_queue(
         self,
@@ -58,7 +83,9 @@ class AdvancedThrottlingQueue:
             html_content=html_content,
             email_type=email_type,
             user_id=user_id,
-            status="pending"
+            status="pending",
+            priority=email_priority(email_type),
+            next_attempt_at=datetime.utcnow()
         )
         
         db.add(queue_entry)
@@ -68,52 +95,103 @@ class AdvancedThrottlingQueue:
         logger.info(f"📧 Email queued: {email_type} to {to} (Queue ID: {queue_entry.id})")
         return queue_entry.id
     
-    def get_pending_emails(self, db: Session, limit: int = 1) -> list:
+    def claim_pending_emails(self, db: Session, limit: int = 1) -> list:
         """
-        Get pending emails that should be sent now
-        Respects rate limiting based on time spacing
+        Claim pending emails that should be sent now, highest priority first
+        Claimed emails are marked "sending" with a lease so no other worker
+        picks them up; claims no more than the sending accounts have budget for
         
         Args:
             db: Database session
-            limit: Number of emails to retrieve
+            limit: Number of emails to claim
             
         Returns:
-            list: Email queue entries ready to send
+            list: Email queue entries claimed by this worker
         """
-        now = datetime.utcnow()
-        
-        # Check if we've hit daily limit
-        today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
-        sent_today = db.query(EmailQueue).filter(
-            EmailQueue.status == "sent",
-            EmailQueue.sent_at >= today_start
-        ).count()
+        self.limiter.sync(db)
         
-        if sent_today >= self.MAX_EMAILS_PER_DAY:
-            logger.warning(f"⚠️  Daily email limit reached: {sent_today}/{self.MAX_EMAILS_PER_DAY}")
+        # Shared token buckets instead of counting today's sent rows every tick
+        capacity = self.limiter.capacity_now()
+        if capacity < 1:
+            wait = self.limiter.seconds_until_available()
+            logger.info(f"⏳ Rate limiting: Wait {wait:.0f}s before next email")
             return []
         
-        # Get last sent email timestamp
-        last_sent = db.query(EmailQueue).filter(
-            EmailQueue.status == "sent"
-        ).order_by(EmailQueue.sent_at.desc()).first()
+        self.release_expired_claims(db)
         
-        if last_sent and last_sent.sent_at:
-            time_since_last = (now - last_sent.sent_at).total_seconds()
-            
-            if time_since_last < self.SECONDS_BETWEEN_EMAILS:
-                time_to_wait = self.SECONDS_BETWEEN_EMAILS - time_since_last
-                logger.info(f"⏳ Rate limiting: Wait {time_to_wait:.0f}s before next email")
-                return []
+        # Due emails, highest priority first: per status an ordered range scan of
+        # the (status, priority, next_attempt_at) index that stops after `limit` rows
+        now = datetime.utcnow()
+        limit = min(limit, capacity)
+        lock = db.get_bind().dialect.name == "postgresql"
+        candidates = []
+        for status in ("pending", "retry"):
+            query = db.query(EmailQueue.id, EmailQueue.priority, EmailQueue.next_attempt_at).filter(
+                EmailQueue.status == status,
+                EmailQueue.next_attempt_at <= now
+            ).order_by(
+                EmailQueue.priority,
+                EmailQueue.next_attempt_at
+            ).limit(limit)
+            if lock:
+                # Rows another worker is claiming are skipped instead of waited on
+                query = query.with_for_update(skip_locked=True)
+            candidates.extend(query.all())
+        candidates.sort(key=lambda row: (row.priority, row.next_attempt_at))
+        ids = [row.id for row in candidates[:limit]]
+        if not ids:
+            db.commit()
+            return []
         
-        # Get pending emails (retry once if failed)
-        pending = db.query(EmailQueue).filter(
+        lease_until = now + timedelta(seconds=self.CLAIM_LEASE_SECONDS)
+        # Status re-checked in the UPDATE: without row locks (SQLite) a concurrent
+        # worker may have picked the same candidates, and only one claim matches
+        db.query(EmailQueue).filter(
+            EmailQueue.id.in_(ids),
             EmailQueue.status.in_(["pending", "retry"])
+        ).update({
+            "status": "sending",
+            "claimed_by": self.worker_id,
+            "claimed_until": lease_until
+        }, synchronize_session=False)
+        db.commit()
+        
+        return db.query(EmailQueue).filter(
+            EmailQueue.status == "sending",
+            EmailQueue.claimed_by == self.worker_id,
+            EmailQueue.claimed_until == lease_until
         ).order_by(
-            EmailQueue.created_at.asc()
-        ).limit(limit).all()
+            EmailQueue.priority,
+            EmailQueue.next_attempt_at
+        ).all()
+    
+    def release_expired_claims(self, db: Session) -> int:
+        """
+        Put emails whose claim lease ran out (worker crashed or was stopped
+        mid-send) back in the queue
         
-        return pending
+        Returns:
+            int: Number of emails released
+        """
+        released = db.query(EmailQueue).filter(
+            EmailQueue.status == "sending",
+            EmailQueue.claimed_until < datetime.utcnow()
+        ).update({
+            "status": case((EmailQueue.retry_count > 0, "retry"), else_="pending"),
+            "claimed_by": None,
+            "claimed_until": None
+        }, synchronize_session=False)
+        db.commit()
+        
+        if released:
+            logger.warning(f"⚠️  Released {released} email(s) with expired claims back to the queue")
+        return released
+    
+    def _release_claim(self, queue_entry: EmailQueue):
+        """Return a claimed email to the queue unsent"""
+        queue_entry.status = "retry" if queue_entry.retry_count else "pending"
+        queue_entry.claimed_by = None
+        queue_entry.claimed_until = None
     
     def send_email_from_queue(
         self,
@@ -130,53 +208,127 @@ class AdvancedThrottlingQueue:
         Returns:
             bool: True if successful, False if failed
         """
-        try:
-            # Send via SMTP
-            result = self.smtp_service.send_email(
-                to=queue_entry.to,
-                subject=queue_entry.subject,
-                text_content=queue_entry.text_content,
-                html_content=queue_entry.html_content
-            )
+        return self.send_emails_from_queue(db, [queue_entry])[0] is True
+    
+    def send_emails_from_queue(
+        self,
+        db: Session,
+        queue_entries: list
+    ) -> list:
+        """
+        Send queued emails, each through an account with budget left for its
+        priority; accounts send their share over their own SMTP session in parallel
+        
+        Args:
+            db: Database session
+            queue_entries: EmailQueue entries to send
             
-            if result["success"]:
-                # Mark as sent
-                queue_entry.status = "sent"
-                queue_entry.sent_at = datetime.utcnow()
-                queue_entry.retry_count = 0
-                queue_entry.error_message = None
-                
-                db.commit()
-                logger.info(f"✅ Email sent: {queue_entry.email_type} to {queue_entry.to}")
-                
-                # Update metrics
-                self._update_metrics(db, queue_entry.email_type, success=True)
-                
-                return True
-            else:
-                # Failed - check if retry needed
-                queue_entry.retry_count += 1
-                
-                if queue_entry.retry_count <= self.MAX_RETRIES:
-                    queue_entry.status = "retry"
-                    queue_entry.error_message = result.get("error", "Unknown error")
-                    logger.warning(f"⚠️  Email marked for retry: {queue_entry.to} (Attempt {queue_entry.retry_count})")
-                else:
-                    queue_entry.status = "failed"
-                    queue_entry.error_message = result.get("error", "Max retries exceeded")
-                    logger.error(f"❌ Email failed (max retries): {queue_entry.to}")
-                    self._update_metrics(db, queue_entry.email_type, success=False)
-                
-                db.commit()
-                return False
-        
-        except Exception as e:
-            logger.error(f"❌ Error processing email queue: {str(e)}")
-            queue_entry.status = "failed"
-            queue_entry.error_message = str(e)
+        Returns:
+            list: Per entry True (sent), False (failed) or None (no budget, left queued)
+        """
+        outcomes = [None] * len(queue_entries)
+        by_account = {}
+        accounts = self.limiter.acquire(db, [entry.email_type for entry in queue_entries])
+        for index, (entry, account) in enumerate(zip(queue_entries, accounts)):
+            if account is None:
+                logger.info(f"⏳ No sending budget for {entry.email_type} email to {entry.to}, leaving queued")
+                if entry.status == "sending":
+                    self._release_claim(entry)
+                continue
+            by_account.setdefault(account.name, []).append(index)
+        
+        def send(account_name):
+            indexes = by_account[account_name]
+            try:
+                return self.account_services[account_name].send_emails([
+                    {
+                        "to": queue_entries[i].to,
+                        "subject": queue_entries[i].subject,
+                        "text_content": queue_entries[i].text_content,
+                        "html_content": queue_entries[i].html_content
+                    }
+                    for i in indexes
+                ])
+            except Exception as e:
+                logger.error(f"❌ Error processing email queue: {str(e)}")
+                return [{"success": False, "error": str(e)} for _ in indexes]
+        
+        # Only SMTP runs on the worker threads; the session stays on this thread
+        if len(by_account) > 1:
+            with ThreadPoolExecutor(max_workers=len(by_account), thread_name_prefix="smtp-account") as pool:
+                results = dict(zip(by_account, pool.map(send, by_account)))
+        else:
+            results = {name: send(name) for name in by_account}
+        
+        # Undelivered mail doesn't count against the account's budget
+        self.limiter.refund(db, [
+            account_name
+            for account_name, indexes in by_account.items()
+            for result in results[account_name] if not result["success"]
+        ])
+        for account_name, indexes in by_account.items():
+            for i, result in zip(indexes, results[account_name]):
+                queue_entries[i].sender_account = account_name
+                outcomes[i] = self._record_result(db, queue_entries[i], result)
+        
+        if None in outcomes:
             db.commit()
+        return outcomes
+    
+    def _record_result(self, db: Session, queue_entry: EmailQueue, result: dict) -> bool:
+        """Mark a queue entry sent, retry or failed from an SMTP send result"""
+        queue_entry.claimed_by = None
+        queue_entry.claimed_until = None
+        
+        if result["success"]:
+            # Mark as sent
+            queue_entry.status = "sent"
+            queue_entry.sent_at = datetime.utcnow()
+            queue_entry.retry_count = 0
+            queue_entry.error_message = None
+            
+            db.commit()
+            logger.info(f"✅ Email sent: {queue_entry.email_type} to {queue_entry.to}")
+            
+            # Update metrics
+            self._update_metrics(db, queue_entry.email_type, success=True)
+            
+            return True
+        
+        # Failed - retry later unless out of attempts or rejected for good
+        queue_entry.retry_count = (queue_entry.retry_count or 0) + 1
+        queue_entry.error_message = result.get("error", "Unknown error")
+        max_attempts = self.max_attempts(queue_entry.email_type)
+        
+        if not result.get("permanent") and queue_entry.retry_count < max_attempts:
+            delay = self.retry_delay_seconds(queue_entry.retry_count)
+            queue_entry.status = "retry"
+            queue_entry.next_attempt_at = datetime.utcnow() + timedelta(seconds=delay)
+            logger.warning(
+                f"⚠️  Email marked for retry: {queue_entry.to} "
+                f"(Attempt {queue_entry.retry_count}/{max_attempts}, next in {delay:.0f}s)"
+            )
+        else:
+            queue_entry.status = "dead_letter"
+            reason = "rejected permanently" if result.get("permanent") else "max attempts"
+            logger.error(f"❌ Email dead-lettered ({reason}): {queue_entry.to}")
             self._update_metrics(db, queue_entry.email_type, success=False)
-            return False
+        
+        db.commit()
+        return False
+    
+    def max_attempts(self, email_type: str) -> int:
+        """Sending attempts allowed for an email type"""
+        return EMAIL_MAX_ATTEMPTS.get(email_type, DEFAULT_MAX_ATTEMPTS)
+    
+    def retry_delay_seconds(self, retry_count: int) -> float:
+        """
+        Backoff before the next attempt after `retry_count` failures
+        Equal jitter: at least half the exponential delay, so retries of a
+        failed batch spread out instead of hitting the provider together
+        """
+        delay = min(self.RETRY_MAX_SECONDS, self.RETRY_BASE_SECONDS * 2 ** max(0, retry_count - 1))
+        return delay / 2 + random.uniform(0, delay / 2)
     
     def get_queue_status(self, db: Session) -> dict:
         """
@@ -196,37 +348,45 @@ class AdvancedThrottlingQueue:
             EmailQueue.status == "retry"
         ).count()
         
+        total_sending = db.query(EmailQueue).filter(
+            EmailQueue.status == "sending"
+        ).count()
+        
         sent_today = db.query(EmailQueue).filter(
             EmailQueue.status == "sent",
             EmailQueue.sent_at >= today_start
         ).count()
         
         failed_today = db.query(EmailQueue).filter(
-            EmailQueue.status == "failed",
+            EmailQueue.status == "dead_letter",
             EmailQueue.created_at >= today_start
         ).count()
         
-        # Calculate time until next email can be sent
-        next_send_time = None
-        last_sent = db.query(EmailQueue).filter(
-            EmailQueue.status == "sent"
-        ).order_by(EmailQueue.sent_at.desc()).first()
+        total_dead_letter = db.query(EmailQueue).filter(
+            EmailQueue.status == "dead_letter"
+        ).count()
         
-        if last_sent and last_sent.sent_at:
-            time_since_last = (now - last_sent.sent_at).total_seconds()
-            if time_since_last < self.SECONDS_BETWEEN_EMAILS:
-                seconds_to_wait = self.SECONDS_BETWEEN_EMAILS - time_since_last
-                next_send_time = (now + timedelta(seconds=seconds_to_wait)).isoformat()
+        # Time until the next email can be sent, from the rate limiter's buckets
+        self.limiter.sync(db)
+        accounts = self.limiter.status()
+        next_send_time = None
+        seconds_to_wait = self.limiter.seconds_until_available()
+        if 0 < seconds_to_wait < float("inf"):
+            next_send_time = (now + timedelta(seconds=seconds_to_wait)).isoformat()
         
+        daily_limit = sum(account["daily_limit"] for account in accounts)
         return {
             "pending": total_pending,
             "retry": total_retry,
+            "sending": total_sending,
             "sent_today": sent_today,
             "failed_today": failed_today,
-            "daily_limit": self.MAX_EMAILS_PER_DAY,
-            "rate_limit_seconds": self.SECONDS_BETWEEN_EMAILS,
-            "remaining_today": max(0, self.MAX_EMAILS_PER_DAY - sent_today),
+            "dead_letter": total_dead_letter,
+            "daily_limit": daily_limit,
+            "rate_limit_seconds": min(account["min_interval_seconds"] for account in accounts),
+            "remaining_today": int(sum(account["daily_tokens"] for account in accounts)),
             "next_send_time": next_send_time,
+            "accounts": accounts,
             "smtp_enabled": self.smtp_service.is_enabled()
         }
     
@@ -239,7 +399,15 @@ class AdvancedThrottlingQueue:
         ).first()
         
         if not metrics:
-            metrics = EmailMetrics(date=today)
+            # Column defaults only apply at INSERT, so start the counters explicitly
+            metrics = EmailMetrics(
+                date=today,
+                total_sent=0,
+                total_welcome=0,
+                total_job_recommendations=0,
+                total_ads_shown=0,
+                total_failed=0
+            )
             db.add(metrics)
         
         if success:
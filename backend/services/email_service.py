@@ -149,7 +149,7 @@ class EmailService:
     
     def process_queue(self, db: Session) -> dict:
         """
-        Process one email from queue
+        Process the next email(s) from queue
         Called by background scheduler
         
         Args:
@@ -158,8 +158,8 @@ class EmailService:
         Returns:
             dict: Processing result
         """
-        # Get next email to send
-        pending_emails = self.queue.get_pending_emails(db, limit=1)
+        # Claim the next emails to send (more than one only when throttling allows)
+        pending_emails = self.queue.claim_pending_emails(db, limit=self.queue.MAX_BATCH_SIZE * len(self.queue.account_services))
         
         if not pending_emails:
             status = self.queue.get_queue_status(db)
@@ -169,13 +169,16 @@ class EmailService:
                 "queue_info": status
             }
         
+        # One SMTP session per sending account for the whole batch
+        results = self.queue.send_emails_from_queue(db, pending_emails)
         queue_entry = pending_emails[0]
-        success = self.queue.send_email_from_queue(db, queue_entry)
         
         return {
-            "processed": 1,
-            "status": "success" if success else "failed",
+            "processed": sum(1 for result in results if result is not None),
+            "sent": sum(1 for result in results if result),
+            "status": "success" if all(result is not False for result in results) else "failed",
             "email_id": queue_entry.id,
+            "email_ids": [entry.id for entry in pending_emails],
             "to": queue_entry.to,
             "type": queue_entry.email_type,
             "queue_info": self.queue.get_queue_status(db)
@@ -0,0 +1,368 @@
+"""
+Email rate limiter - token buckets per sending account
+Every configured SMTP account has a daily bucket (refilled continuously at
+daily_limit per 24 hours) and a spacing bucket (one token per
+min_interval_seconds, holding up to `burst`). Lower-priority email types may
+not spend the share of the daily bucket reserved for higher ones, so welcome
+emails still go out on a day full of promotions. Bucket levels live in
+email_sender_state and are shared by every worker: tokens are taken with a
+compare-and-set UPDATE on the row that was read, so two workers can't spend
+the same token
+"""
+import os
+import json
+import math
+import time
+import logging
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import case
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from models import EmailQueue, EmailSenderState
+
+logger = logging.getLogger(__name__)
+
+# Gmail-friendly defaults for accounts that don't set their own limits
+DEFAULT_DAILY_LIMIT = int(os.getenv("EMAIL_DAILY_LIMIT", "140"))  # Conservative limit (100-150 range)
+DEFAULT_MIN_INTERVAL_SECONDS = float(os.getenv("EMAIL_SECONDS_BETWEEN", "540"))  # 9 minutes (8-10 minute range)
+DEFAULT_BURST = int(os.getenv("EMAIL_BURST", "1"))
+# Compare-and-set rounds before giving up on a contended acquire; emails stay queued
+MAX_ACQUIRE_ATTEMPTS = 5
+
+# Lower number = higher priority; unknown types get the middle class
+EMAIL_PRIORITIES = {
+    "welcome": 0,
+    "test": 0,
+    "daily_jobs": 1,
+    "promotional": 2,
+}
+DEFAULT_PRIORITY = 1
+# Share of each account's daily capacity a priority class must leave unspent
+PRIORITY_RESERVE = {0: 0.0, 1: 0.1, 2: 0.3}
+
+
+def email_priority(email_type: Optional[str]) -> int:
+    return EMAIL_PRIORITIES.get(email_type, DEFAULT_PRIORITY)
+
+
+@dataclass
+class SenderAccount:
+    """One SMTP account (or provider) emails can go out through."""
+    name: str
+    host: str
+    port: int
+    username: Optional[str]
+    password: Optional[str]
+    from_addr: Optional[str]
+    starttls: bool = True
+    daily_limit: int = DEFAULT_DAILY_LIMIT
+    min_interval_seconds: float = DEFAULT_MIN_INTERVAL_SECONDS
+    burst: int = DEFAULT_BURST
+
+
+def load_sender_accounts() -> List[SenderAccount]:
+    """
+    Accounts from SMTP_ACCOUNTS, a JSON list of objects with name, host, port,
+    username, password, from, starttls, daily_limit, min_interval_seconds and
+    burst; missing fields fall back to the SMTP_* settings. Without it, the
+    single SMTP_* account is used.
+    """
+    base = {
+        "host": os.getenv("SMTP_HOST", "smtp.gmail.com"),
+        "port": int(os.getenv("SMTP_PORT", 587)),
+        "username": os.getenv("SMTP_USERNAME"),
+        "password": os.getenv("SMTP_PASSWORD"),
+        "from": os.getenv("SMTP_FROM"),
+        "starttls": os.getenv("SMTP_STARTTLS", "true").lower() == "true",
+    }
+    raw = os.getenv("SMTP_ACCOUNTS", "").strip()
+    configs = [{"name": "default"}]
+    if raw:
+        try:
+            configs = json.loads(raw)
+        except ValueError as e:
+            logger.error(f"❌ Invalid SMTP_ACCOUNTS JSON, using SMTP_* settings only: {e}")
+
+    accounts = []
+    for index, config in enumerate(configs):
+        merged = {**base, **config}
+        accounts.append(SenderAccount(
+            name=str(merged.get("name") or f"account_{index + 1}"),
+            host=merged["host"],
+            port=int(merged["port"]),
+            username=merged.get("username"),
+            password=merged.get("password"),
+            from_addr=merged.get("from"),
+            starttls=bool(merged.get("starttls", True)),
+            daily_limit=int(merged.get("daily_limit", DEFAULT_DAILY_LIMIT)),
+            min_interval_seconds=float(merged.get("min_interval_seconds", DEFAULT_MIN_INTERVAL_SECONDS)),
+            burst=int(merged.get("burst", DEFAULT_BURST)),
+        ))
+    return accounts
+
+
+@dataclass
+class TokenBucket:
+    """Bucket refilled continuously; `updated_at` is wall-clock so it survives restarts."""
+    capacity: float
+    refill_per_second: float
+    tokens: float
+    updated_at: float = field(default_factory=time.time)
+
+    def refill(self, now: float):
+        if math.isinf(self.refill_per_second):
+            self.tokens = self.capacity
+        else:
+            elapsed = max(0.0, now - self.updated_at)
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.refill_per_second)
+        self.updated_at = now
+
+    def seconds_until(self, amount: float, now: float) -> float:
+        self.refill(now)
+        missing = amount - self.tokens
+        if missing <= 0:
+            return 0.0
+        if self.refill_per_second <= 0:
+            return math.inf
+        return missing / self.refill_per_second
+
+
+class SenderLimiter:
+    """Daily and spacing buckets for one account."""
+
+    def __init__(self, account: SenderAccount):
+        self.account = account
+        self.daily = TokenBucket(
+            capacity=account.daily_limit,
+            refill_per_second=account.daily_limit / 86400,
+            tokens=account.daily_limit
+        )
+        # No spacing configured: the spacing bucket is always full and as big
+        # as the daily one, so only the daily budget limits the account
+        interval = account.min_interval_seconds
+        burst = max(1, account.burst) if interval > 0 else max(1, account.daily_limit)
+        self.spacing = TokenBucket(
+            capacity=burst,
+            refill_per_second=(1 / interval) if interval > 0 else math.inf,
+            tokens=burst
+        )
+        self.sent = 0
+
+    def _reserve(self, priority: int) -> float:
+        return PRIORITY_RESERVE.get(priority, 0.0) * self.daily.capacity
+
+    def available(self, priority: int, now: float) -> int:
+        """Emails of this priority that could go out right now."""
+        self.daily.refill(now)
+        self.spacing.refill(now)
+        return max(0, int(min(self.daily.tokens - self._reserve(priority), self.spacing.tokens) + 1e-9))
+
+    def try_acquire(self, priority: int, now: float) -> bool:
+        if self.available(priority, now) < 1:
+            return False
+        self.daily.tokens -= 1
+        self.spacing.tokens -= 1
+        return True
+
+    def restore(self, daily_tokens: float, spacing_tokens: float, updated_at: float):
+        """Set bucket levels from email_sender_state."""
+        self.daily.tokens = min(self.daily.capacity, daily_tokens)
+        self.spacing.tokens = min(self.spacing.capacity, spacing_tokens)
+        self.daily.updated_at = self.spacing.updated_at = updated_at
+
+    def seconds_until_available(self, priority: int, now: float) -> float:
+        return max(
+            self.daily.seconds_until(1 + self._reserve(priority), now),
+            self.spacing.seconds_until(1, now)
+        )
+
+
+class EmailRateLimiter:
+    """
+    Picks an account for each outgoing email and keeps per-account budgets.
+    The buckets here are a cache of email_sender_state, refreshed by sync();
+    acquire() and refund() change the rows themselves.
+    """
+
+    def __init__(self, accounts: Optional[List[SenderAccount]] = None):
+        self._lock = threading.Lock()
+        self.senders: Dict[str, SenderLimiter] = {
+            account.name: SenderLimiter(account) for account in (accounts or load_sender_accounts())
+        }
+
+    @property
+    def accounts(self) -> List[SenderAccount]:
+        return [sender.account for sender in self.senders.values()]
+
+    def capacity_now(self, priority: int = 0, now: Optional[float] = None) -> int:
+        """Emails of the given priority that could go out right now across all accounts."""
+        now = time.time() if now is None else now
+        with self._lock:
+            return sum(sender.available(priority, now) for sender in self.senders.values())
+
+    def acquire(self, db: Session, email_types: List[Optional[str]], now: Optional[float] = None) -> List[Optional[SenderAccount]]:
+        """
+        Take a token for each email, from the account with the most daily budget left.
+        Re-reads the shared bucket levels and writes the new ones only if no
+        other worker changed them in between, retrying when one did.
+
+        Returns:
+            Per email, the account to send through, or None if none may send this type now
+        """
+        requested_now = now
+        for _ in range(MAX_ACQUIRE_ATTEMPTS):
+            states = self.sync(db)
+            now = time.time() if requested_now is None else requested_now
+            accounts = []
+            with self._lock:
+                for email_type in email_types:
+                    priority = email_priority(email_type)
+                    candidates = [sender for sender in self.senders.values() if sender.available(priority, now) >= 1]
+                    if not candidates:
+                        accounts.append(None)
+                        continue
+                    sender = max(candidates, key=lambda candidate: candidate.daily.tokens)
+                    sender.try_acquire(priority, now)
+                    accounts.append(sender.account)
+                levels = {
+                    account.name: (self.senders[account.name].daily.tokens, self.senders[account.name].spacing.tokens)
+                    for account in accounts if account is not None
+                }
+
+            written = True
+            for name, (daily_tokens, spacing_tokens) in levels.items():
+                daily_read, spacing_read, updated_read = states[name]
+                # Only matches if the row still holds what this worker read
+                updated = db.query(EmailSenderState).filter(
+                    EmailSenderState.sender == name,
+                    EmailSenderState.daily_tokens == daily_read,
+                    EmailSenderState.spacing_tokens == spacing_read,
+                    EmailSenderState.bucket_updated_at == updated_read
+                ).update({
+                    "daily_tokens": daily_tokens,
+                    "spacing_tokens": spacing_tokens,
+                    "bucket_updated_at": now,
+                    "updated_at": datetime.utcnow()
+                }, synchronize_session=False)
+                if not updated:
+                    written = False
+                    break
+            if written:
+                db.commit()
+                with self._lock:
+                    for account in accounts:
+                        if account is not None:
+                            self.senders[account.name].sent += 1
+                return accounts
+            # Another worker took tokens meanwhile: start over from its levels
+            db.rollback()
+
+        logger.warning(f"⚠️  Rate limiter state contended, leaving {len(email_types)} email(s) queued")
+        return [None] * len(email_types)
+
+    def refund(self, db: Session, account_names: List[str]):
+        """Give back the tokens of emails that were not delivered."""
+        refunds: Dict[str, int] = {}
+        for name in account_names:
+            if name in self.senders:
+                refunds[name] = refunds.get(name, 0) + 1
+        for name, count in refunds.items():
+            sender = self.senders[name]
+            # Added in SQL so a concurrent acquire elsewhere is not overwritten
+            daily = EmailSenderState.daily_tokens + count
+            spacing = EmailSenderState.spacing_tokens + count
+            db.query(EmailSenderState).filter(EmailSenderState.sender == name).update({
+                "daily_tokens": case((daily > sender.daily.capacity, sender.daily.capacity), else_=daily),
+                "spacing_tokens": case((spacing > sender.spacing.capacity, sender.spacing.capacity), else_=spacing),
+                "updated_at": datetime.utcnow()
+            }, synchronize_session=False)
+            with self._lock:
+                sender.sent = max(0, sender.sent - count)
+        if refunds:
+            db.commit()
+
+    def seconds_until_available(self, priority: int = 0, now: Optional[float] = None) -> float:
+        now = time.time() if now is None else now
+        with self._lock:
+            return min(sender.seconds_until_available(priority, now) for sender in self.senders.values())
+
+    def status(self, now: Optional[float] = None) -> List[dict]:
+        now = time.time() if now is None else now
+        with self._lock:
+            return [
+                {
+                    "name": name,
+                    "daily_limit": sender.account.daily_limit,
+                    "min_interval_seconds": sender.account.min_interval_seconds,
+                    "available": sender.available(0, now),
+                    "daily_tokens": round(sender.daily.tokens, 2),
+                    "sent_since_start": sender.sent,
+                }
+                for name, sender in self.senders.items()
+            ]
+
+    def sync(self, db: Session) -> Dict[str, tuple]:
+        """
+        Refresh bucket levels from email_sender_state. Accounts with no row yet
+        get one, starting from what was sent in the last 24 hours.
+
+        Returns:
+            Per account, the (daily_tokens, spacing_tokens, bucket_updated_at) read
+        """
+        states = {
+            row.sender: (row.daily_tokens, row.spacing_tokens, row.bucket_updated_at)
+            for row in db.query(
+                EmailSenderState.sender,
+                EmailSenderState.daily_tokens,
+                EmailSenderState.spacing_tokens,
+                EmailSenderState.bucket_updated_at
+            ).filter(EmailSenderState.sender.in_(list(self.senders))).all()
+        }
+        missing = [name for name in self.senders if name not in states]
+        if missing:
+            sent_last_day = db.query(EmailQueue).filter(
+                EmailQueue.status == "sent",
+                EmailQueue.sent_at >= datetime.utcnow() - timedelta(days=1)
+            ).count()
+            now = time.time()
+            for name in missing:
+                sender = self.senders[name]
+                # Unknown history per account: spread the recent sends evenly
+                daily_tokens = max(0.0, sender.daily.capacity - sent_last_day / len(self.senders))
+                db.add(EmailSenderState(
+                    sender=name,
+                    daily_tokens=daily_tokens,
+                    spacing_tokens=sender.spacing.capacity,
+                    bucket_updated_at=now
+                ))
+                states[name] = (daily_tokens, sender.spacing.capacity, now)
+            try:
+                db.commit()
+            except IntegrityError:
+                # Another worker created them first
+                db.rollback()
+                return self.sync(db)
+
+        with self._lock:
+            for name, (daily_tokens, spacing_tokens, updated_at) in states.items():
+                self.senders[name].restore(daily_tokens, spacing_tokens, updated_at)
+        return states
+
+
+_limiter: Optional[EmailRateLimiter] = None
+_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter() -> EmailRateLimiter:
+    """Get the process-wide email rate limiter."""
+    global _limiter
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                _limiter = EmailRateLimiter()
+    return _limiter
@@ -0,0 +1,294 @@
+"""
+SMTP connection pool
+Keeps a few authenticated SMTP sessions open so queued emails don't each pay
+for a TCP connect, STARTTLS handshake and AUTH. Idle sessions are checked with
+NOOP before reuse, and a send that hits a dropped session reconnects once
+"""
+import os
+import time
+import smtplib
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SMTP_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", "2"))
+# Sessions idle longer than this are closed instead of reused (Gmail drops them after a few minutes)
+SMTP_IDLE_TIMEOUT_SECONDS = float(os.getenv("SMTP_IDLE_TIMEOUT_SECONDS", "240"))
+# Sessions idle longer than this get a NOOP before reuse
+SMTP_NOOP_AFTER_SECONDS = float(os.getenv("SMTP_NOOP_AFTER_SECONDS", "30"))
+# Reconnect after this many messages on one session
+SMTP_MAX_MESSAGES_PER_CONNECTION = int(os.getenv("SMTP_MAX_MESSAGES_PER_CONNECTION", "100"))
+SMTP_TIMEOUT_SECONDS = float(os.getenv("SMTP_TIMEOUT_SECONDS", "30"))
+
+
+def is_connection_error(error: BaseException) -> bool:
+    """True if the session itself is unusable, as opposed to the server rejecting one message."""
+    if isinstance(error, smtplib.SMTPServerDisconnected):
+        return True
+    if isinstance(error, smtplib.SMTPResponseException):
+        # 421: service not available, closing transmission channel
+        return error.smtp_code == 421
+    # SMTPException subclasses OSError; plain OSErrors are socket failures
+    return isinstance(error, OSError) and not isinstance(error, smtplib.SMTPException)
+
+
+class PooledConnection:
+    """An authenticated SMTP session and its usage counters."""
+
+    def __init__(self, smtp: smtplib.SMTP):
+        self.smtp = smtp
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.sent = 0
+
+    def close(self):
+        try:
+            self.smtp.quit()
+        except Exception:
+            try:
+                self.smtp.close()
+            except Exception:
+                pass
+
+
+class SMTPConnectionPool:
+    """
+    Thread-safe pool of SMTP sessions to one server/account.
+
+    Args:
+        host: SMTP server host
+        port: SMTP server port
+        username: Login user; None skips AUTH (local relays, test servers)
+        password: Login password
+        starttls: Upgrade the session with STARTTLS before AUTH
+        size: Maximum open sessions
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        starttls: bool = True,
+        size: int = SMTP_POOL_SIZE,
+        idle_timeout: float = SMTP_IDLE_TIMEOUT_SECONDS,
+        noop_after: float = SMTP_NOOP_AFTER_SECONDS,
+        max_messages: int = SMTP_MAX_MESSAGES_PER_CONNECTION,
+        timeout: float = SMTP_TIMEOUT_SECONDS
+    ):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.size = max(1, size)
+        self.idle_timeout = idle_timeout
+        self.noop_after = noop_after
+        self.max_messages = max_messages
+        self.timeout = timeout
+
+        self._idle: deque = deque()
+        self._open = 0
+        self._condition = threading.Condition()
+        self.stats = {"connects": 0, "reuses": 0, "noops": 0, "reconnects": 0, "sent": 0}
+
+    def _connect(self) -> PooledConnection:
+        smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            smtp.ehlo()
+            if self.starttls:
+                smtp.starttls()
+                smtp.ehlo()
+            if self.username:
+                smtp.login(self.username, self.password)
+        except Exception:
+            smtp.close()
+            raise
+        self.stats["connects"] += 1
+        logger.info(f"🔌 SMTP session opened to {self.host}:{self.port}")
+        return PooledConnection(smtp)
+
+    def _is_alive(self, conn: PooledConnection) -> bool:
+        """NOOP a session that has been idle for a while; fresh ones are trusted."""
+        if time.monotonic() - conn.last_used < self.noop_after:
+            return True
+        self.stats["noops"] += 1
+        try:
+            return conn.smtp.noop()[0] == 250
+        except Exception:
+            return False
+
+    def _checkout(self) -> PooledConnection:
+        deadline = time.monotonic() + self.timeout
+        expired = []
+        conn = None
+        with self._condition:
+            while True:
+                # Most recently used first, so spare sessions age out
+                while self._idle and conn is None:
+                    candidate = self._idle.pop()
+                    if time.monotonic() - candidate.last_used > self.idle_timeout:
+                        self._open -= 1
+                        expired.append(candidate)
+                    else:
+                        conn = candidate
+                if conn is not None:
+                    break
+                if self._open < self.size:
+                    self._open += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError("Timed out waiting for a free SMTP connection")
+                self._condition.wait(remaining)
+        for stale in expired:
+            stale.close()
+
+        if conn is not None:
+            if self._is_alive(conn):
+                self.stats["reuses"] += 1
+                return conn
+            conn.close()
+            self.stats["reconnects"] += 1
+        try:
+            return self._connect()
+        except Exception:
+            self._discard()
+            raise
+
+    def _discard(self):
+        with self._condition:
+            self._open -= 1
+            self._condition.notify()
+
+    def _checkin(self, conn: PooledConnection, broken: bool = False):
+        if broken or conn.sent >= self.max_messages:
+            conn.close()
+            self._discard()
+            return
+        conn.last_used = time.monotonic()
+        with self._condition:
+            self._idle.append(conn)
+            self._condition.notify()
+
+    @contextmanager
+    def connection(self):
+        """Borrow a session; it is closed instead of returned if the block fails with a connection error."""
+        conn = self._checkout()
+        broken = False
+        try:
+            yield conn
+        except BaseException as e:
+            broken = is_connection_error(e)
+            raise
+        finally:
+            self._checkin(conn, broken=broken)
+
+    def _sendmail(self, conn: PooledConnection, from_addr: str, to_addrs, message: str):
+        conn.sent += 1
+        conn.smtp.sendmail(from_addr, to_addrs, message)
+        self.stats["sent"] += 1
+
+    def send(self, from_addr: str, to_addrs, message: str):
+        """
+        Send one message, reconnecting once if the pooled session was dropped.
+
+        Raises:
+            smtplib.SMTPException: If the server rejects the message
+        """
+        for attempt in (1, 2):
+            try:
+                with self.connection() as conn:
+                    self._sendmail(conn, from_addr, to_addrs, message)
+                    return
+            except Exception as e:
+                if attempt == 2 or not is_connection_error(e):
+                    raise
+                self.stats["reconnects"] += 1
+                logger.warning(f"⚠️  SMTP session lost ({e}), reconnecting")
+
+    def send_many(self, messages: Iterable[Tuple[str, object, str]]) -> List[Optional[Exception]]:
+        """
+        Send several messages over as few sessions as possible.
+
+        Args:
+            messages: (from_addr, to_addrs, message) tuples
+
+        Returns:
+            One entry per message: None if sent, otherwise the exception
+        """
+        results: List[Optional[Exception]] = []
+        pending = deque(messages)
+        retried = False
+        while pending:
+            try:
+                conn = self._checkout()
+            except Exception as e:
+                logger.error(f"❌ Cannot open SMTP session: {e}")
+                results.extend(e for _ in pending)
+                break
+
+            broken = False
+            try:
+                while pending and conn.sent < self.max_messages:
+                    from_addr, to_addrs, message = pending[0]
+                    try:
+                        self._sendmail(conn, from_addr, to_addrs, message)
+                        results.append(None)
+                    except Exception as e:
+                        if is_connection_error(e):
+                            raise
+                        # Rejected message; smtplib has already RSET the session
+                        results.append(e)
+                    pending.popleft()
+                    retried = False
+            except Exception as e:
+                broken = True
+                if retried:
+                    # Failed on a fresh session too: give up on this message only
+                    results.append(e)
+                    pending.popleft()
+                    retried = False
+                else:
+                    retried = True
+                    self.stats["reconnects"] += 1
+                    logger.warning(f"⚠️  SMTP session lost mid-batch ({e}), reconnecting")
+            finally:
+                self._checkin(conn, broken=broken)
+        return results
+
+    def close_all(self):
+        """Close idle sessions (on shutdown or after a config change)."""
+        with self._condition:
+            while self._idle:
+                self._idle.pop().close()
+                self._open -= 1
+            self._condition.notify_all()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_smtp_pool(host: str, port: int, username: Optional[str], password: Optional[str], starttls: bool = True) -> SMTPConnectionPool:
+    """Process-wide pool for an SMTP server/account, shared by every SMTPService."""
+    key = (host, port, username, starttls)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None or pool.password != password:
+            if pool is not None:
+                pool.close_all()
+            pool = SMTPConnectionPool(host, port, username, password, starttls=starttls)
+            _pools[key] = pool
+        return pool
+
+
+def close_smtp_pools():
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close_all()
@@ -1,6 +1,7 @@
 """
 SMTP Service for Gmail email delivery
 Handles low-level SMTP operations with error handling
+Messages go over pooled, already-authenticated sessions (see smtp_pool)
 """
 import smtplib
 from email.mime.text import MIMEText
@@ -8,6 +9,7 @@ from email.mime.multipart import MIMEMultipart
 import os
 from dotenv import load_dotenv
 import logging
+from services.smtp_pool import get_smtp_pool
 
 load_dotenv()
 
@@ -16,13 +18,88 @@ logger = logging.getLogger(__name__)
 class SMTPService:
     """Handles direct SMTP communication with Gmail"""
     
-    def __init__(self):
+    def __init__(self, account=None):
+        """
+        Args:
+            account: Optional rate_limiter.SenderAccount to send through
+                     instead of the SMTP_* settings
+        """
         self.smtp_host = os.getenv("SMTP_HOST", "smtp.gmail.com")
         self.smtp_port = int(os.getenv("SMTP_PORT", 587))
         self.smtp_username = os.getenv("SMTP_USERNAME")
         self.smtp_password = os.getenv("SMTP_PASSWORD")
         self.smtp_from = os.getenv("SMTP_FROM")
         self.smtp_enabled = os.getenv("SMTP_ENABLED", "false").lower() == "true"
+        self.smtp_starttls = os.getenv("SMTP_STARTTLS", "true").lower() == "true"
+        if account is not None:
+            self.smtp_host = account.host
+            self.smtp_port = account.port
+            self.smtp_username = account.username
+            self.smtp_password = account.password
+            self.smtp_from = account.from_addr
+            self.smtp_starttls = account.starttls
+    
+    def _pool(self):
+        return get_smtp_pool(self.smtp_host, self.smtp_port, self.smtp_username, self.smtp_password, self.smtp_starttls)
+    
+    def _build_message(self, to: str, subject: str, text_content: str, html_content: str | None = None):
+        """MIME message - HTML-only if HTML content is provided, otherwise plain text"""
+        if html_content:
+            # HTML-only email to avoid raw HTML display issues
+            msg = MIMEMultipart("alternative")
+            msg["Subject"] = subject
+            msg["From"] = self.smtp_from
+            msg["To"] = to
+            
+            # Add plain text alternative (empty for HTML-only)
+            text_part = MIMEText("", "plain", _charset="utf-8")
+            msg.attach(text_part)
+            
+            # Add HTML part with proper content type
+            html_part = MIMEText(html_content, "html", _charset="utf-8")
+            msg.attach(html_part)
+        else:
+            # Plain text email only
+            msg = MIMEText(text_content, "plain", _charset="utf-8")
+            msg["Subject"] = subject
+            msg["From"] = self.smtp_from
+            msg["To"] = to
+        return msg
+    
+    def _disabled_result(self) -> dict:
+        logger.warning("⚠️  SMTP is not enabled or not properly configured")
+        return {
+            "success": False,
+            "message": "SMTP not enabled",
+            "error": "SMTP_ENABLED=false or missing credentials"
+        }
+    
+    def _error_result(self, error: Exception) -> dict:
+        if isinstance(error, smtplib.SMTPAuthenticationError):
+            error_msg = f"SMTP Authentication failed: {str(error)}"
+            message = "Authentication error"
+        elif isinstance(error, smtplib.SMTPException):
+            error_msg = f"SMTP error: {str(error)}"
+            message = "SMTP error"
+        else:
+            error_msg = f"Unexpected error: {str(error)}"
+            message = "Unexpected error"
+        logger.error(f"❌ {error_msg}")
+        return {
+            "success": False,
+            "message": message,
+            "error": error_msg,
+            "permanent": self._is_permanent(error)
+        }
+    
+    @staticmethod
+    def _is_permanent(error: Exception) -> bool:
+        """True if the server rejected this message for good (5xx), so resending it can't succeed"""
+        if isinstance(error, smtplib.SMTPRecipientsRefused):
+            return all(code >= 500 for code, _ in error.recipients.values())
+        if isinstance(error, smtplib.SMTPDataError):
+            return 500 <= error.smtp_code < 600
+        return False
     
     def is_enabled(self):
         """Check if SMTP is properly configured and enabled"""
@@ -49,48 +126,17 @@ class SMTPService:
             dict: {"success": bool, "message": str, "error": str or None}
         """
         if not self.is_enabled():
-            logger.warning("⚠️  SMTP is not enabled or not properly configured")
-            return {
-                "success": False,
-                "message": "SMTP not enabled",
-                "error": "SMTP_ENABLED=false or missing credentials"
-            }
+            return self._disabled_result()
         
         try:
             # Validate required fields
             if not self.smtp_username or not self.smtp_password or not self.smtp_from:
                 raise ValueError("SMTP credentials not properly configured")
             
-            # Create message - HTML-only if HTML content is provided, otherwise plain text
-            if html_content:
-                # HTML-only email to avoid raw HTML display issues
-                msg = MIMEMultipart("alternative")
-                msg["Subject"] = subject
-                msg["From"] = self.smtp_from
-                msg["To"] = to
-                
-                # Add plain text alternative (empty for HTML-only)
-                text_part = MIMEText("", "plain", _charset="utf-8")
-                msg.attach(text_part)
-                
-                # Add HTML part with proper content type
-                html_part = MIMEText(html_content, "html", _charset="utf-8")
-                msg.attach(html_part)
-            else:
-                # Plain text email only
-                msg = MIMEText(text_content, "plain", _charset="utf-8")
-                msg["Subject"] = subject
-                msg["From"] = self.smtp_from
-                msg["To"] = to
-            
-            # Connect to Gmail SMTP server
-            server = smtplib.SMTP(self.smtp_host, self.smtp_port)
-            server.starttls()  # Start TLS encryption
-            server.login(self.smtp_username, self.smtp_password)
+            msg = self._build_message(to, subject, text_content, html_content)
             
-            # Send email
-            server.sendmail(self.smtp_from, to, msg.as_string())
-            server.quit()
+            # Send over a pooled Gmail session (connects and logs in only when needed)
+            self._pool().send(self.smtp_from, to, msg.as_string())
             
             logger.info(f"✅ Email sent successfully to {to}")
             return {
@@ -99,32 +145,39 @@ class SMTPService:
                 "error": None
             }
             
-        except smtplib.SMTPAuthenticationError as e:
-            error_msg = f"SMTP Authentication failed: {str(e)}"
-            logger.error(f"❌ {error_msg}")
-            return {
-                "success": False,
-                "message": "Authentication error",
-                "error": error_msg
-            }
+        except Exception as e:
+            return self._error_result(e)
+    
+    def send_emails(self, emails: list[dict]) -> list[dict]:
+        """
+        Send several emails over one authenticated session
         
-        except smtplib.SMTPException as e:
-            error_msg = f"SMTP error: {str(e)}"
-            logger.error(f"❌ {error_msg}")
-            return {
-                "success": False,
-                "message": "SMTP error",
-                "error": error_msg
-            }
+        Args:
+            emails: Dicts with to, subject, text_content and optional html_content
+            
+        Returns:
+            list: One send_email-style result dict per email, in order
+        """
+        if not self.is_enabled():
+            return [self._disabled_result() for _ in emails]
         
-        except Exception as e:
-            error_msg = f"Unexpected error: {str(e)}"
-            logger.error(f"❌ {error_msg}")
-            return {
-                "success": False,
-                "message": "Unexpected error",
-                "error": error_msg
-            }
+        messages = []
+        for email in emails:
+            msg = self._build_message(email["to"], email["subject"], email.get("text_content") or "", email.get("html_content"))
+            messages.append((self.smtp_from, email["to"], msg.as_string()))
+        
+        results = []
+        for email, error in zip(emails, self._pool().send_many(messages)):
+            if error is None:
+                logger.info(f"✅ Email sent successfully to {email['to']}")
+                results.append({
+                    "success": True,
+                    "message": f"Email sent to {email['to']}",
+                    "error": None
+                })
+            else:
+                results.append(self._error_result(error))
+        return results
     
     def test_connection(self) -> dict:
         """Test SMTP connection without sending an email"""
@@ -139,8 +192,10 @@ class SMTPService:
             if not self.smtp_username or not self.smtp_password:
                 raise ValueError("SMTP credentials not properly configured")
             
+            # Fresh connection rather than a pooled one, so this really tests connecting
             server = smtplib.SMTP(self.smtp_host, self.smtp_port)
-            server.starttls()
+            if self.smtp_starttls:
+                server.starttls()
             server.login(self.smtp_username, self.smtp_password)
             server.quit()
             
@@ -0,0 +1,175 @@
+"""
+Socket Manager - cross-process pub/sub for Socket.IO emits
+With a message queue configured, every `sio.emit` is published to all API
+workers, so a user in room `user_{id}` gets events no matter which worker
+holds their connection. Without one, rooms stay in this process's memory,
+which only works with a single worker.
+Several workers also mean WebSocket only: a long-polling session is a series
+of HTTP requests that must all reach the worker holding it, and neither
+uvicorn --workers nor a non-sticky load balancer guarantees that
+"""
+
+import os
+import asyncio
+import logging
+import threading
+from typing import List, Optional
+from urllib.parse import urlparse
+
+import socketio
+from socketio.async_pubsub_manager import AsyncPubSubManager
+
+logger = logging.getLogger(__name__)
+
+# redis://, rediss:// or unix:// (Redis/Valkey), postgresql:// (LISTEN/NOTIFY),
+# amqp://, or "database" to reuse DATABASE_URL when it points at Postgres
+SOCKETIO_MESSAGE_QUEUE = os.getenv("SOCKETIO_MESSAGE_QUEUE", "")
+SOCKETIO_CHANNEL = os.getenv("SOCKETIO_CHANNEL", "prolinq_socketio")
+
+# Postgres rejects NOTIFY payloads of 8000 bytes or more
+PG_NOTIFY_MAX_BYTES = 7999
+
+
+class AsyncPostgresManager(AsyncPubSubManager):
+    """
+    Socket.IO client manager over Postgres LISTEN/NOTIFY, for deployments
+    that already have Postgres but no Redis. Uses psycopg2 (already a
+    dependency): the listening connection's socket is watched by the event
+    loop, publishes run on a worker thread.
+    """
+    name = 'postgres'
+
+    def __init__(self, url: str, channel: str = 'socketio', write_only: bool = False, logger=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        # SQLAlchemy URLs may name a driver, e.g. postgresql+psycopg2://
+        scheme, _, rest = url.partition("://")
+        self.dsn = f"{scheme.split('+', 1)[0]}://{rest}"
+        self._publish_conn = None
+        self._publish_lock = threading.Lock()
+
+    def _connect(self):
+        import psycopg2
+        import psycopg2.extensions
+
+        conn = psycopg2.connect(self.dsn)
+        conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        return conn
+
+    def _notify(self, payload: str):
+        with self._publish_lock:
+            if self._publish_conn is None or self._publish_conn.closed:
+                self._publish_conn = self._connect()
+            try:
+                with self._publish_conn.cursor() as cursor:
+                    cursor.execute("SELECT pg_notify(%s, %s)", (self.channel, payload))
+            except Exception:
+                self._publish_conn.close()
+                self._publish_conn = None
+                raise
+
+    async def _publish(self, data):
+        payload = self.json.dumps(data)
+        if len(payload.encode("utf-8")) > PG_NOTIFY_MAX_BYTES:
+            self._get_logger().error(
+                f"Socket.IO {data.get('method')} to room {data.get('room')} too large for NOTIFY, not published"
+            )
+            return
+        for retries_left in (1, 0):
+            try:
+                return await asyncio.to_thread(self._notify, payload)
+            except Exception as e:
+                self._get_logger().error(
+                    f"Cannot publish to postgres{'... retrying' if retries_left else '... giving up'}: {e}"
+                )
+
+    async def _listen(self):
+        from psycopg2 import sql
+
+        loop = asyncio.get_running_loop()
+        retry_sleep = 1
+        while True:
+            try:
+                conn = await asyncio.to_thread(self._connect)
+            except Exception as e:
+                self._get_logger().error(f"Cannot connect to postgres for LISTEN, retrying in {retry_sleep}s: {e}")
+                await asyncio.sleep(retry_sleep)
+                retry_sleep = min(retry_sleep * 2, 60)
+                continue
+
+            queue: asyncio.Queue = asyncio.Queue()
+
+            def on_readable():
+                try:
+                    conn.poll()
+                except Exception as e:
+                    self._get_logger().error(f"Postgres LISTEN connection lost: {e}")
+                    queue.put_nowait(None)
+                    return
+                while conn.notifies:
+                    notify = conn.notifies.pop(0)
+                    if notify.channel == self.channel:
+                        queue.put_nowait(notify.payload)
+
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute(sql.SQL("LISTEN {}").format(sql.Identifier(self.channel)))
+                loop.add_reader(conn.fileno(), on_readable)
+                retry_sleep = 1
+                while True:
+                    payload = await queue.get()
+                    if payload is None:
+                        break
+                    yield payload
+            finally:
+                try:
+                    loop.remove_reader(conn.fileno())
+                except Exception:
+                    pass
+                conn.close()
+            await asyncio.sleep(retry_sleep)
+
+
+def create_client_manager(url: Optional[str] = None, channel: str = SOCKETIO_CHANNEL) -> Optional[socketio.AsyncManager]:
+    """
+    Client manager for the configured message queue, or None for the default
+    in-memory manager.
+
+    Raises:
+        ValueError: If the queue URL's scheme is not supported
+    """
+    url = SOCKETIO_MESSAGE_QUEUE if url is None else url
+    if url == "database":
+        url = os.getenv("DATABASE_URL", "")
+        if not url.startswith("postgres"):
+            logger.warning("SOCKETIO_MESSAGE_QUEUE=database needs a Postgres DATABASE_URL; using in-memory rooms")
+            return None
+    if not url:
+        return None
+
+    scheme = urlparse(url).scheme.split("+", 1)[0].lower()
+    if scheme in ("redis", "rediss", "unix", "valkey", "valkeys"):
+        return socketio.AsyncRedisManager(url, channel=channel)
+    if scheme in ("postgres", "postgresql"):
+        return AsyncPostgresManager(url, channel=channel)
+    if scheme in ("amqp", "amqps"):
+        return socketio.AsyncAioPikaManager(url, channel=channel)
+    raise ValueError(f"Unsupported SOCKETIO_MESSAGE_QUEUE scheme: {scheme}")
+
+
+def socketio_transports(manager: Optional[socketio.AsyncManager]) -> Optional[List[str]]:
+    """
+    Engine.IO transports the server accepts. With a message queue (several
+    workers or instances) polling handshakes and upgrades would land on
+    different processes and fail with "Invalid session", so clients must
+    connect with transports: ['websocket']. None keeps the defaults.
+    """
+    if manager is None:
+        return None
+    return ["websocket"]
+
+
+def describe_message_queue(manager: Optional[socketio.AsyncManager]) -> str:
+    """Backend name for startup logs, without credentials."""
+    if manager is None:
+        return "in-memory (single worker)"
+    return getattr(manager, "name", type(manager).__name__)
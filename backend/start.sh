@@ -23,8 +23,21 @@ fi
 echo "🚀 Starting FastAPI application on port: $PORT"
 echo "🌐 Healthcheck will be available at: http://0.0.0.0:$PORT/"
 
+# Worker processes; more than one needs SOCKETIO_MESSAGE_QUEUE so Socket.IO
+# rooms are shared between workers. uvicorn spreads connections without
+# sticky sessions, so with a message queue the server accepts WebSocket only
+# and the frontend must be built with VITE_SOCKET_TRANSPORTS=websocket (polling would
+# fail with "Invalid session"). To keep polling, run one worker per instance
+# behind a sticky load balancer instead.
+WORKERS=${WEB_CONCURRENCY:-1}
+if [ "$WORKERS" -gt 1 ] && [ -z "$SOCKETIO_MESSAGE_QUEUE" ]; then
+    echo "⚠️  WEB_CONCURRENCY=$WORKERS without SOCKETIO_MESSAGE_QUEUE, falling back to 1 worker"
+    WORKERS=1
+fi
+echo "👷 Starting $WORKERS worker(s)"
+
 # Activate virtual environment
 source /opt/venv/bin/activate
 
 # Start the application with explicit host binding
-exec uvicorn main:socket_app --host 0.0.0.0 --port $PORT --log-level debug --workers 1
+exec uvicorn main:socket_app --host 0.0.0.0 --port $PORT --log-level debug --workers $WORKERS
@@ -5,6 +5,7 @@ import { useState, useEffect, useRef } from 'react'
 import { jobsAPI, notificationsAPI } from '../services/api'
 import toast from 'react-hot-toast'
 import { io } from 'socket.io-client'
+import { socketTransports } from '../utils/socketTransports'
 
 const TopNav = ({ onMenuToggle }) => {
   const { user, logout } = useAuth()
@@ -58,7 +59,9 @@ const TopNav = ({ onMenuToggle }) => {
     const socket = io(import.meta.env.VITE_ADMIN_API_URL || 'https://prolinq-production.up.railway.app', {
       auth: {
         user_id: user.id
-      }
+      },
+      // WebSocket only where the backend runs several workers (VITE_SOCKET_TRANSPORTS)
+      transports: socketTransports()
     })
 
     socket.on('connect', () => {
@@ -1,6 +1,7 @@
 import { createContext, useContext, useEffect, useState } from 'react'
 import { io } from 'socket.io-client'
 import { useAuth } from './AuthContext'
+import { socketTransports } from '../utils/socketTransports'
 
 const SocketContext = createContext()
 
@@ -22,7 +23,8 @@ export const SocketProvider = ({ children }) => {
         auth: {
           user_id: user.id
         },
-        transports: ['websocket', 'polling'],
+        // WebSocket only where the backend runs several workers (VITE_SOCKET_TRANSPORTS)
+        transports: socketTransports(),
         reconnection: true,
         reconnectionDelay: 1000,
         reconnectionAttempts: 5,
@@ -0,0 +1,17 @@
+/**
+ * Socket.IO Transports
+ * Transports the client may use, from VITE_SOCKET_TRANSPORTS (comma-separated,
+ * e.g. "websocket"). Defaults to long-polling with an upgrade to WebSocket;
+ * set it to "websocket" when the backend runs several workers with
+ * SOCKETIO_MESSAGE_QUEUE, since the server then refuses polling.
+ */
+
+const DEFAULT_TRANSPORTS = ['polling', 'websocket']
+
+export const socketTransports = () => {
+  const configured = (import.meta.env.VITE_SOCKET_TRANSPORTS || '')
+    .split(',')
+    .map(transport => transport.trim())
+    .filter(Boolean)
+  return configured.length ? configured : DEFAULT_TRANSPORTS
+}